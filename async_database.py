@@ -0,0 +1,307 @@
+"""
+Async counterpart of ``database.py`` for ``async def`` handlers.
+
+Connections come from ``AsyncPool``: at most ``DB_POOL_SIZE`` are checked
+out at once, callers beyond that wait in a bounded queue
+(``DB_POOL_MAX_WAITERS``) for at most ``DB_POOL_TIMEOUT`` seconds, idle
+connections are pinged before reuse and recycled after
+``DB_POOL_RECYCLE`` seconds.  ``pool_metrics()`` reports wait times and
+occupancy; statements and checkouts are also timed for /metrics, and
+slow statements go to ``utils.slow_query_log``.
+
+Reads are routed like ``database.query_all``: to a replica from
+``database.replicas`` (each with its own ``AsyncPool``) that satisfies the
+request's consistency floor, else to the primary.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+import aiomysql
+
+import database
+from database import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+from middleware.metrics import DB_POOL_WAIT_SECONDS, observe_statement
+from utils.slow_query_log import slow_query_log
+
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_MAX_WAITERS = int(os.getenv("DB_POOL_MAX_WAITERS", "1000"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Idle connections older than this are pinged before being handed out.
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolTimeout(PoolError):
+    """Waited ``timeout`` seconds without getting a connection."""
+
+
+class PoolExhausted(PoolError):
+    """The wait queue is full; the caller is rejected without waiting."""
+
+
+class AsyncPool:
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[Any]],
+        size: int = DB_POOL_SIZE,
+        max_waiters: int = DB_POOL_MAX_WAITERS,
+        timeout: float = DB_POOL_TIMEOUT,
+        recycle: float = DB_POOL_RECYCLE,
+        ping_after: float = DB_POOL_PING_AFTER,
+    ):
+        self._connect = connect
+        self.size = size
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._slots = asyncio.Semaphore(size)
+        # (connection, created_at, last_used_at)
+        self._idle: Deque[Tuple[Any, float, float]] = deque()
+        self._born: Dict[int, float] = {}
+        self.in_use = 0
+        self.waiting = 0
+        self.stats = {
+            "acquired": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "created": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "discarded": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    async def acquire(self) -> Any:
+        t0 = time.monotonic()
+        if self._slots.locked():
+            if self.waiting >= self.max_waiters:
+                self.stats["rejected"] += 1
+                raise PoolExhausted(f"{self.waiting} callers already waiting")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise PoolTimeout(f"no connection within {self.timeout}s")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        try:
+            conn = await self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+        waited = time.monotonic() - t0
+        DB_POOL_WAIT_SECONDS.observe(waited, ("async",))
+        self.stats["acquired"] += 1
+        self.stats["wait_seconds_total"] += waited
+        self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+        self.in_use += 1
+        return conn
+
+    async def _checkout(self) -> Any:
+        now = time.monotonic()
+        while self._idle:
+            conn, born, last_used = self._idle.pop()
+            if now - born > self.recycle:
+                self.stats["recycled"] += 1
+                self._close(conn)
+                continue
+            if now - last_used > self.ping_after:
+                try:
+                    await conn.ping(reconnect=False)
+                except Exception:
+                    self.stats["ping_failures"] += 1
+                    self._close(conn)
+                    continue
+            self._born[id(conn)] = born
+            return conn
+        conn = await self._connect()
+        self.stats["created"] += 1
+        self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        born = self._born.pop(id(conn), time.monotonic())
+        self.in_use -= 1
+        if discard:
+            self.stats["discarded"] += 1
+            self._close(conn)
+        else:
+            self._idle.append((conn, born, time.monotonic()))
+        self._slots.release()
+
+    @staticmethod
+    def _close(conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await self.acquire()
+        discard = False
+        try:
+            yield conn
+        except (aiomysql.OperationalError, aiomysql.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard)
+
+    def metrics(self) -> Dict[str, Any]:
+        acquired = self.stats["acquired"]
+        return {
+            "size": self.size,
+            "in_use": self.in_use,
+            "idle": len(self._idle),
+            "waiting": self.waiting,
+            **self.stats,
+            "wait_seconds_avg": self.stats["wait_seconds_total"] / acquired if acquired else 0.0,
+        }
+
+
+async def _connect_mysql(host: str = DB_HOST, port: int = DB_PORT):
+    kwargs = dict(user=DB_USER, password=DB_PASSWORD, db=DB_NAME, autocommit=False)
+    if host and host.startswith("/cloudsql/"):
+        return await aiomysql.connect(unix_socket=host, **kwargs)
+    return await aiomysql.connect(host=host, port=port, **kwargs)
+
+
+_pool: Optional[AsyncPool] = None
+_replica_pools: Dict[str, AsyncPool] = {}
+
+
+def _get_pool() -> AsyncPool:
+    # Created lazily so the semaphore binds to the server's event loop.
+    global _pool
+    if _pool is None:
+        _pool = AsyncPool(_connect_mysql)
+    return _pool
+
+
+def _replica_pool(replica: database.Replica) -> AsyncPool:
+    pool = _replica_pools.get(replica.name)
+    if pool is None:
+        pool = _replica_pools[replica.name] = AsyncPool(
+            lambda: _connect_mysql(replica.host, replica.port)
+        )
+    return pool
+
+
+def pool_metrics() -> Dict[str, Any]:
+    return _get_pool().metrics()
+
+
+def replica_pool_metrics() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.metrics() for name, pool in _replica_pools.items()}
+
+
+class _TimedCursor:
+    """Cursor proxy recording each statement's latency for /metrics (and
+    slow statements in the slow-query log)."""
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    async def execute(self, sql: str, params: Optional[Iterable[Any]] = None) -> None:
+        started = time.perf_counter()
+        try:
+            await self._cur.execute(sql, params)
+        except Exception:
+            observe_statement("async", sql, started, failed=True)
+            raise
+        elapsed = observe_statement("async", sql, started)
+        if elapsed >= slow_query_log.threshold:
+            # EXPLAIN runs later on the slow-query log's own thread.
+            slow_query_log.record(sql, params, elapsed)
+
+    async def executemany(self, sql: str, seq: Iterable[Iterable[Any]]) -> None:
+        seq = list(seq)
+        started = time.perf_counter()
+        try:
+            await self._cur.executemany(sql, seq)
+        except Exception:
+            observe_statement("async", sql, started, failed=True)
+            raise
+        elapsed = observe_statement("async", sql, started)
+        if elapsed >= slow_query_log.threshold:
+            # Timed as one batch; the first row's parameters stand in for
+            # the rest (and for EXPLAIN).
+            slow_query_log.record(sql, seq[0] if seq else None, elapsed)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cur, name)
+
+
+async def _query_all(pool: AsyncPool, sql: str, params: Optional[Iterable[Any]]) -> List[Dict[str, Any]]:
+    async with pool.connection() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            await _TimedCursor(cur).execute(sql, tuple(params or ()))
+            rows = await cur.fetchall()
+        # End the implicit read transaction so the next query sees fresh data.
+        await conn.rollback()
+        return list(rows)
+
+
+async def query_all(sql: str, params: Optional[Iterable[Any]] = None) -> List[Dict[str, Any]]:
+    replica = database.replicas.choose(database.read_floor())
+    if replica is not None:
+        try:
+            rows = await _query_all(_replica_pool(replica), sql, params)
+            database.note_read_position(replica.caught_up_to)
+            return rows
+        except (aiomysql.OperationalError, aiomysql.InterfaceError) as e:
+            database.replicas.mark_down(replica, e)
+        except PoolError:
+            # All of this replica's connections are busy; the primary may not be.
+            pass
+    rows = await _query_all(_get_pool(), sql, params)
+    database.note_read_position(math.inf)
+    return rows
+
+
+async def query_one(sql: str, params: Optional[Iterable[Any]] = None) -> Optional[Dict[str, Any]]:
+    rows = await query_all(sql, params)
+    return rows[0] if rows else None
+
+
+async def execute(sql: str, params: Optional[Iterable[Any]] = None) -> int:
+    async with _get_pool().connection() as conn:
+        async with conn.cursor() as cur:
+            await _TimedCursor(cur).execute(sql, tuple(params or ()))
+            rowcount = cur.rowcount
+        await conn.commit()
+        database.record_write()
+        return rowcount
+
+
+@asynccontextmanager
+async def transaction():
+    """Async ``database.transaction``: one connection, commit or rollback."""
+    async with _get_pool().connection() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            try:
+                yield _TimedCursor(cur)
+                await conn.commit()
+                database.record_write()
+            except BaseException:
+                await conn.rollback()
+                raise
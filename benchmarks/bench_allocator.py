@@ -0,0 +1,119 @@
+"""
+Unit allocator replay: how many bookings fit with first fit vs best fit.
+
+    python -m benchmarks.bench_allocator [--log bookings.ndjson] [--units 5]
+
+Replays a booking log in arrival order.  Each line of ``--log`` is
+``{"sku": ..., "booked_on": "YYYY-MM-DD", "start_date": ..., "end_date": ...}``;
+without a log a synthetic year of lead-time / duration mixes is generated.
+Three strategies are compared:
+
+* first fit – the first unit whose calendar is free
+* best fit  – ``services.allocator.best_fit``
+* best fit + nightly re-pack – bookings that have not started yet count as
+  held-but-unallocated and are re-assigned with ``allocator.repack`` once a day
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Tuple
+
+from services import allocator
+from services.availability import day_index
+
+
+Booking = Tuple[int, int, int]  # (booked_on, lo, hi) as day indexes
+
+
+def synthetic_log(n_skus: int, days: int, per_day: float, seed: int) -> Dict[str, List[Booking]]:
+    rnd = random.Random(seed)
+    log: Dict[str, List[Booking]] = defaultdict(list)
+    for s in range(n_skus):
+        for t in range(days):
+            n = int(per_day) + (rnd.random() < per_day - int(per_day))
+            for _ in range(n):
+                lo = t + rnd.randint(1, 60)
+                log[f"SKU-{s}"].append((t, lo, lo + rnd.choice([2, 3, 4, 4, 6, 7, 9, 13])))
+    return log
+
+
+def load_log(path: str) -> Dict[str, List[Booking]]:
+    log: Dict[str, List[Booking]] = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            r = json.loads(line)
+            log[r["sku"]].append((
+                day_index(date.fromisoformat(r["booked_on"])),
+                day_index(date.fromisoformat(r["start_date"])),
+                day_index(date.fromisoformat(r["end_date"])),
+            ))
+    for bookings in log.values():
+        bookings.sort()
+    return log
+
+
+def replay(bookings: List[Booking], n_units: int, strategy: str) -> int:
+    calendars = {f"u{i}": 0 for i in range(n_units)}
+    movable: Dict[int, Tuple[str, int, int]] = {}
+    accepted = 0
+    today = None
+    for n, (booked_on, lo, hi) in enumerate(bookings):
+        if strategy == "repack" and booked_on != today:
+            today = booked_on
+            movable = {k: v for k, v in movable.items() if v[1] > today}
+            _repack(calendars, movable, today)
+
+        choose = allocator.first_fit if strategy == "first" else allocator.best_fit
+        unit_id = choose(calendars.items(), lo, hi, booked_on)
+        if unit_id is None:
+            continue
+        calendars[unit_id] |= ((1 << (hi - lo + 1)) - 1) << lo
+        movable[n] = (unit_id, lo, hi)
+        accepted += 1
+    return accepted
+
+
+def _repack(calendars: Dict[str, int], movable: Dict[int, Tuple[str, int, int]], today: int) -> None:
+    fixed = dict(calendars)
+    for unit_id, lo, hi in movable.values():
+        fixed[unit_id] &= ~(((1 << (hi - lo + 1)) - 1) << lo)
+    plan = allocator.repack(fixed, [(k, lo, hi) for k, (_, lo, hi) in movable.items()], today)
+    if plan is None:
+        return
+    for k, (_, lo, hi) in list(movable.items()):
+        fixed[plan[k]] |= ((1 << (hi - lo + 1)) - 1) << lo
+        movable[k] = (plan[k], lo, hi)
+    calendars.update(fixed)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--log", help="NDJSON booking log to replay")
+    ap.add_argument("--skus", type=int, default=100)
+    ap.add_argument("--units", type=int, default=5)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--per-day", type=float, default=1.0, help="synthetic requests per SKU per day")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    log = load_log(args.log) if args.log else synthetic_log(args.skus, args.days, args.per_day, args.seed)
+    requested = sum(len(b) for b in log.values())
+
+    results = {}
+    for strategy in ("first", "best", "repack"):
+        results[strategy] = sum(replay(b, args.units, strategy) for b in log.values())
+
+    base = results["first"]
+    print(f"{requested} booking requests over {len(log)} SKUs x {args.units} units")
+    for strategy, label in (("first", "first fit"), ("best", "best fit"), ("repack", "best fit + re-pack")):
+        n = results[strategy]
+        print(f"  {label:<20} accepted={n:>7}  ({n / requested:.1%} of requests, "
+              f"{n - base:+d} / {(n - base) / base:+.2%} vs first fit)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Sync handler + mysql.connector-style pool vs async handler + AsyncPool.
+
+    python -m benchmarks.bench_async_pool [--clients 500] [--requests 10] [--latency 0.005]
+
+Both variants serve GET /catalog/items/{id} in-process (httpx ASGI
+transport) against the SQLite stand-in with the same per-query latency and
+the same number of connections:
+
+* sync  – the pre-async handler (``def``, runs on the threadpool, pool of
+  ``--pool`` connections that fails fast when exhausted)
+* async – ``main.get_catalog_item`` on ``async_database`` (``--pool``
+  connections, callers queue with a timeout)
+
+The item cache is disabled so every request reaches the database.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+import async_database
+import database
+import main as app_main
+from benchmarks.local_db import LocalDB, install
+from models.item import Item
+
+
+def seed(db: LocalDB, n: int) -> list:
+    ids = [f"it-{i:08x}" for i in range(n)]
+    db.executemany(
+        "INSERT INTO catalog_items (id, sku, name, brand, category, description, photos_json, "
+        "rent_price_cents, deposit_cents, attrs_json, status) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)",
+        [
+            (i, f"SKU-{k}", f"Item {k}", "Prada", "handbag", "A bag.", '["https://img/1.jpg"]',
+             1000 + k, 50000, '{"color": "black"}', "active")
+            for k, i in enumerate(ids)
+        ],
+    )
+    return ids
+
+
+def legacy_app() -> FastAPI:
+    legacy = FastAPI()
+
+    @legacy.get("/catalog/items/{id}", response_model=Item)
+    def get_catalog_item(id: str):
+        try:
+            row = database.query_one("SELECT * FROM catalog_items WHERE id=%s", (id,))
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        if not row:
+            raise HTTPException(status_code=404, detail="Item not found")
+        return app_main._row_to_item(row)
+
+    return legacy
+
+
+async def drive(app, ids, clients: int, per_client: int):
+    latencies, errors = [], 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one_client(seed: int):
+            nonlocal errors
+            rnd = random.Random(seed)
+            for _ in range(per_client):
+                t = time.perf_counter()
+                r = await client.get(f"/catalog/items/{rnd.choice(ids)}")
+                latencies.append(time.perf_counter() - t)
+                if r.status_code != 200:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one_client(i) for i in range(clients)))
+        elapsed = time.perf_counter() - t0
+    return elapsed, latencies, errors
+
+
+def report(label, elapsed, latencies, errors):
+    latencies.sort()
+    ok = len(latencies) - errors
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(
+        f"{label:<6} ok/s={ok / elapsed:8.0f}  errors={errors:>6}  "
+        f"p50={p(0.5):7.1f}ms  p99={p(0.99):7.1f}ms  mean={statistics.fmean(latencies) * 1000:7.1f}ms"
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=500)
+    ap.add_argument("--requests", type=int, default=10, help="requests per client")
+    ap.add_argument("--latency", type=float, default=0.005, help="seconds per query")
+    ap.add_argument("--pool", type=int, default=5)
+    ap.add_argument("--items", type=int, default=10_000)
+    args = ap.parse_args()
+
+    app_main.item_cache.max_size = 0
+    db = LocalDB(latency=args.latency, pool_size=args.pool)
+    install(db, async_pool_size=args.pool)
+    ids = seed(db, args.items)
+
+    print(f"{args.clients} clients x {args.requests} requests, {args.latency * 1000:.1f}ms/query, "
+          f"{args.pool} connections")
+    report("sync", *asyncio.run(drive(legacy_app(), ids, args.clients, args.requests)))
+    report("async", *asyncio.run(drive(app_main.app, ids, args.clients, args.requests)))
+    m = async_database.pool_metrics()
+    print(f"async pool: acquired={m['acquired']} timeouts={m['timeouts']} rejected={m['rejected']} "
+          f"wait avg={m['wait_seconds_avg'] * 1000:.1f}ms max={m['wait_seconds_max'] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
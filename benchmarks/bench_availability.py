@@ -0,0 +1,144 @@
+"""
+Availability index benchmark: 10k SKUs, 1M reservations.
+
+    python -m benchmarks.bench_availability [--skus 10000] [--reservations 1000000]
+
+Seeds the SQLite stand-in, builds the index the same way the app does at
+startup, then times random ``available_count`` lookups, and 100-window
+``available_counts`` batches against looping ``available_count`` over the
+same windows (``--window-days`` sets the longest batch window).  A few
+hundred equivalent SQL lookups are timed as a baseline.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from benchmarks.local_db import LocalDB
+from services.availability import AvailabilityIndex
+
+
+HORIZON_DAYS = 730
+
+
+def seed(db: LocalDB, n_skus: int, n_reservations: int, rnd: random.Random) -> None:
+    units = []
+    for s in range(n_skus):
+        for u in range(rnd.randint(2, 8)):
+            units.append((f"pi-{s}-{u}", f"SKU-{s:05d}", "M", "A", "available"))
+    db.executemany(
+        "INSERT INTO physical_items (id, sku, size, condition, status) VALUES (%s,%s,%s,%s,%s)",
+        units,
+    )
+
+    # Spread bookings evenly over units; each unit's bookings are laid out
+    # back to back with random gaps so they never overlap.
+    per_unit = max(1, n_reservations // len(units))
+    today = date.today()
+    rows = []
+    rid = 0
+    for unit_id, sku, *_ in units:
+        day = rnd.randint(0, 10)
+        for _ in range(per_unit):
+            if rid >= n_reservations:
+                break
+            length = rnd.randint(2, 10)
+            start = today + timedelta(days=day)
+            end = start + timedelta(days=length - 1)
+            rows.append((f"r-{rid}", sku, unit_id, start, end, "allocated"))
+            rid += 1
+            day += length + rnd.randint(0, 20)
+        if len(rows) >= 100_000:
+            _insert_reservations(db, rows)
+            rows = []
+    _insert_reservations(db, rows)
+
+
+def _insert_reservations(db: LocalDB, rows) -> None:
+    if rows:
+        db.executemany(
+            "INSERT INTO reservations (id, sku, item_id, start_date, end_date, status) "
+            "VALUES (%s,%s,%s,%s,%s,%s)",
+            rows,
+        )
+
+
+def _windows(n: int, n_skus: int, rnd: random.Random, max_days: int = 14):
+    today = date.today()
+    for _ in range(n):
+        start = today + timedelta(days=rnd.randint(0, HORIZON_DAYS // 2))
+        yield f"SKU-{rnd.randrange(n_skus):05d}", start, start + timedelta(days=rnd.randint(1, max_days))
+
+
+def _report(label: str, samples_us) -> None:
+    samples_us = sorted(samples_us)
+    p = lambda q: samples_us[min(len(samples_us) - 1, int(q * len(samples_us)))]
+    print(
+        f"{label:<22} n={len(samples_us):>7}  mean={statistics.fmean(samples_us):8.2f}us  "
+        f"p50={p(0.50):8.2f}us  p99={p(0.99):8.2f}us"
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--skus", type=int, default=10_000)
+    ap.add_argument("--reservations", type=int, default=1_000_000)
+    ap.add_argument("--queries", type=int, default=100_000)
+    ap.add_argument("--sql-queries", type=int, default=500)
+    ap.add_argument("--batches", type=int, default=1000)
+    ap.add_argument("--batch-size", type=int, default=100)
+    ap.add_argument("--window-days", type=int, default=14)
+    args = ap.parse_args()
+    rnd = random.Random(42)
+
+    db = LocalDB()
+    t0 = time.perf_counter()
+    seed(db, args.skus, args.reservations, rnd)
+    print(f"seeded {args.skus} SKUs / {args.reservations} reservations in {time.perf_counter() - t0:.1f}s")
+
+    index = AvailabilityIndex()
+    t0 = time.perf_counter()
+    index.load(db.query_all)
+    print(f"index load: {time.perf_counter() - t0:.2f}s")
+
+    samples = []
+    for sku, start, end in _windows(args.queries, args.skus, rnd):
+        t = time.perf_counter()
+        index.available_count(sku, start, end)
+        samples.append((time.perf_counter() - t) * 1e6)
+    _report("index available_count", samples)
+
+    batched, looped = [], []
+    for _ in range(args.batches):
+        batch = list(_windows(args.batch_size, args.skus, rnd, args.window_days))
+        t = time.perf_counter()
+        counts = index.available_counts(batch)
+        batched.append((time.perf_counter() - t) * 1e6)
+        t = time.perf_counter()
+        expected = [index.available_count(*q) for q in batch]
+        looped.append((time.perf_counter() - t) * 1e6)
+        assert counts == expected
+    _report(f"batch of {args.batch_size}", batched)
+    _report(f"loop of {args.batch_size}", looped)
+    print(f"batch vs loop: {statistics.fmean(looped) / statistics.fmean(batched):.2f}x")
+
+    # Baseline: what an endpoint scanning reservation rows would pay.
+    sql = (
+        "SELECT COUNT(*) AS n FROM physical_items p WHERE p.sku = %s "
+        "AND p.status NOT IN ('repair','lost','retired') AND NOT EXISTS ("
+        " SELECT 1 FROM reservations r WHERE r.item_id = p.id "
+        " AND r.status IN ('held','allocated') AND r.start_date <= %s AND r.end_date >= %s)"
+    )
+    samples = []
+    for sku, start, end in _windows(args.sql_queries, args.skus, rnd):
+        t = time.perf_counter()
+        db.query_one(sql, (sku, end, start))
+        samples.append((time.perf_counter() - t) * 1e6)
+    _report("sql scan baseline", samples)
+
+
+if __name__ == "__main__":
+    main()
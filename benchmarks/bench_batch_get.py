@@ -0,0 +1,88 @@
+"""
+A cart's worth of items: N x GET /catalog/items/{id} vs one batch-get.
+
+    python -m benchmarks.bench_batch_get [--items 10000] [--cart 30] [--latency-ms 1]
+
+Runs against the SQLite stand-in with ``--latency-ms`` per statement (a
+Cloud SQL round trip) and counts statements.  Each case runs cold (empty
+item cache) and warm.  Before timing, the batch response is checked
+against the single GETs: same items, request order, misses reported.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.local_db import LocalDB, install
+from services.item_cache import item_cache
+
+
+def seed(db: LocalDB, n: int) -> None:
+    db.executemany(
+        "INSERT INTO catalog_items (id, sku, name, brand, category, description, photos_json, "
+        "rent_price_cents, deposit_cents, attrs_json, status) "
+        "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)",
+        [
+            (f"it-{k:08x}", f"SKU-{k}", f"Item {k}", "Prada", "handbag", "A bag",
+             '["https://img/1.jpg"]', 1000 + k, 50000, '{"color": "black"}', "active")
+            for k in range(n)
+        ],
+    )
+
+
+def main_() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=10_000)
+    ap.add_argument("--cart", type=int, default=30)
+    ap.add_argument("--latency-ms", type=float, default=1.0)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+
+    db = LocalDB(latency=args.latency_ms / 1000)
+    install(db)
+    seed(db, args.items)
+    rnd = random.Random(1)
+    carts = [[f"it-{k:08x}" for k in rnd.sample(range(args.items), args.cart)]
+             for _ in range(args.repeat)]
+
+    with TestClient(main.app) as client:
+        ids = carts[0] + ["it-missing"]
+        batch = client.post("/catalog/items/batch-get", json={"ids": ids}).json()
+        singles = [client.get(f"/catalog/items/{i}").json() for i in carts[0]]
+        assert batch["items"] == singles, "batch-get differs from single GETs"
+        assert batch["missing_ids"] == ["it-missing"], batch["missing_ids"]
+        by_sku = client.post("/catalog/items/batch-get",
+                             json={"skus": [s["sku"] for s in reversed(singles)]}).json()
+        assert by_sku["items"] == singles[::-1]
+
+        def singles_case(cart):
+            for i in cart:
+                client.get(f"/catalog/items/{i}")
+
+        def batch_case(cart):
+            client.post("/catalog/items/batch-get", json={"ids": cart})
+
+        for name, fn in (("single GETs", singles_case), ("batch-get", batch_case)):
+            for warm in (False, True):
+                item_cache.clear()
+                if warm:
+                    for cart in carts:
+                        fn(cart)
+                before = db.statements
+                t0 = time.perf_counter()
+                for cart in carts:
+                    fn(cart)
+                per_cart = (time.perf_counter() - t0) / len(carts)
+                statements = (db.statements - before) / len(carts)
+                print(f"{name:<12} {'warm' if warm else 'cold'}: {per_cart * 1000:7.2f} ms/cart  "
+                      f"{statements:5.1f} statements/cart  ({args.cart} items)")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,72 @@
+"""
+10k single POST /catalog/items vs one POST /catalog/items/bulk.
+
+    python -m benchmarks.bench_bulk_write [--items 10000] [--latency 0.001]
+
+Runs in-process against the SQLite stand-in with a per-statement latency
+to stand in for the Cloud SQL round trip.  Both paths write their events
+to the outbox; the relay is stopped so it does not compete for the
+stand-in's single connection.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.local_db import LocalDB, install
+
+
+def body(prefix: str, k: int) -> dict:
+    return {
+        "sku": f"{prefix}-{k:06d}",
+        "name": f"Item {k}",
+        "brand": "Prada",
+        "category": "handbag",
+        "description": "Seasonal upload.",
+        "photos": [f"https://img.example/{k}.jpg"],
+        "rent_price_cents": 1000 + k % 5000,
+        "deposit_cents": 50000,
+        "attrs": {"color": "black", "size": "M"},
+    }
+
+
+def main_() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=10_000)
+    ap.add_argument("--latency", type=float, default=0.001, help="seconds per statement")
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+
+    main.BULK_MAX_ITEMS = max(main.BULK_MAX_ITEMS, args.items)
+    db = LocalDB(latency=args.latency)
+    install(db)
+
+    with TestClient(main.app) as client:
+        main.outbox_relay.stop()
+        before = db.counters()
+        t0 = time.perf_counter()
+        for k in range(args.items):
+            assert client.post("/catalog/items", json=body("SINGLE", k)).status_code == 201
+        single = time.perf_counter() - t0
+        single_stmts = db.counters()["statements"] - before["statements"]
+
+        payload = {"items": [body("BULK", k) for k in range(args.items)]}
+        before = db.counters()
+        t0 = time.perf_counter()
+        r = client.post("/catalog/items/bulk", json=payload)
+        bulk = time.perf_counter() - t0
+        bulk_stmts = db.counters()["statements"] - before["statements"]
+        assert r.status_code == 200 and r.json()["created"] == args.items, r.text[:500]
+
+    print(f"{args.items} items, {args.latency * 1000:.1f}ms per statement")
+    print(f"  single POSTs: {single:7.2f}s  {args.items / single:8.0f} items/s  statements={single_stmts}")
+    print(f"  one bulk call:{bulk:7.2f}s  {args.items / bulk:8.0f} items/s  statements={bulk_stmts}")
+    print(f"  speed-up: {single / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,123 @@
+"""
+Deep pages of GET /catalog/items: keyset cursors vs LIMIT/OFFSET.
+
+    python -m benchmarks.bench_keyset [--items 1000000] [--pages 1,1000,5000,9000]
+
+Seeds the SQLite stand-in (same composite indexes as schema.sql), then for
+each sort option and filter fetches page N two ways:
+
+* keyset – ``GET /catalog/items?sort=...&nextPageToken=...`` through the app,
+  with the token of page N-1's last row
+* offset – the same ORDER BY with ``LIMIT 100 OFFSET (N-1)*100`` as a bare
+  query (no HTTP or serialization, so the comparison flatters OFFSET)
+
+and checks both return the same ids.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.local_db import LocalDB, install
+
+PAGE = 100
+BRANDS = ["Prada", "Gucci", "Chanel", "Dior", "Fendi", "Celine", "Loewe", "Bottega"]
+CATEGORIES = ["handbag", "dress", "shoes", "jewelry", "coat"]
+
+
+def seed(db: LocalDB, n: int) -> None:
+    rnd = random.Random(7)
+    base = datetime(2024, 1, 1)
+    batch = []
+    for k in range(n):
+        batch.append((
+            f"it-{k:08x}", f"SKU-{k}", f"Item {k}", rnd.choice(BRANDS), rnd.choice(CATEGORIES),
+            None, "[]", rnd.randrange(1000, 50000, 100), 50000, "{}", "active",
+            base + timedelta(seconds=rnd.randrange(0, 86400 * 600)),
+        ))
+        if len(batch) == 50_000:
+            _insert(db, batch)
+            batch = []
+    if batch:
+        _insert(db, batch)
+    db.conn.execute("ANALYZE")
+
+
+def _insert(db: LocalDB, rows) -> None:
+    db.executemany(
+        "INSERT INTO catalog_items (id, sku, name, brand, category, description, photos_json, "
+        "rent_price_cents, deposit_cents, attrs_json, status, created_at) "
+        "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)",
+        rows,
+    )
+
+
+def timed(fn, repeat: int = 3):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+
+def main_() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=1_000_000)
+    ap.add_argument("--pages", default="1,1000,5000,9000")
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+    pages = [int(p) for p in args.pages.split(",")]
+
+    db = LocalDB()
+    install(db)
+    t0 = time.perf_counter()
+    seed(db, args.items)
+    print(f"seeded {args.items} items in {time.perf_counter() - t0:.1f}s; page size {PAGE}")
+
+    cases = [(sort, None) for sort in main.SORT_OPTIONS] + [
+        ("price_asc", ("category", "handbag")),
+        ("newest", ("brand", "Prada")),
+    ]
+    with TestClient(main.app) as client:
+        for sort, flt in cases:
+            where, params, query = "", [], {"sort": sort, "pageSize": PAGE}
+            if flt:
+                where, params = f"WHERE {flt[0]} = %s", [flt[1]]
+                query[flt[0]] = flt[1]
+            order = main._sort_order(sort)
+            column = main.SORT_OPTIONS[sort][0]
+            label = f"sort={sort}" + (f" {flt[0]}={flt[1]}" if flt else "")
+            print(label)
+            ratios = []
+            for page in pages:
+                offset = (page - 1) * PAGE
+                offset_sql = f"SELECT * FROM catalog_items {where} {order} LIMIT %s OFFSET %s"
+                t_off, rows = timed(lambda: db.query_all(offset_sql, params + [PAGE, offset]))
+                if not rows:
+                    print(f"  page {page:>6}: past the end")
+                    continue
+
+                token = None
+                if offset:
+                    prev = db.query_one(offset_sql, params + [1, offset - 1])
+                    token = main._encode_token(prev["id"], sort, prev[column])
+                q = dict(query, nextPageToken=token) if token else query
+                t_key, r = timed(lambda: client.get("/catalog/items", params=q))
+                assert r.status_code == 200, r.text
+                assert [i["id"] for i in r.json()["items"]] == [row["id"] for row in rows], label
+                ratios.append(t_off / t_key)
+                print(f"  page {page:>6}: keyset {t_key * 1000:7.2f}ms   offset {t_off * 1000:8.2f}ms")
+            if ratios:
+                print(f"  offset/keyset at depth: {statistics.fmean(ratios[1:] or ratios):.0f}x")
+
+
+if __name__ == "__main__":
+    main_()
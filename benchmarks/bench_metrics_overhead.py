@@ -0,0 +1,80 @@
+"""
+Per-call cost of the /metrics instrumentation.
+
+    python -m benchmarks.bench_metrics_overhead [--n 200000]
+
+* histogram observe       – one labelled ``Histogram.observe``
+* normalize_sql (cached)  – statement label lookup for a repeated statement
+* statement timing        – ``observe_statement`` (both of the above + clock)
+* middleware              – a trivial ASGI app called directly vs wrapped
+  in ``MetricsMiddleware``; the difference is the per-request overhead
+* render                  – one scrape with the series the run created
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+from middleware.metrics import (
+    REGISTRY,
+    REQUEST_SECONDS,
+    MetricsMiddleware,
+    normalize_sql,
+    observe_statement,
+)
+
+SQL = "SELECT id, updated_at, created_at FROM catalog_items WHERE id IN (%s,%s,%s) ORDER BY id LIMIT %s"
+
+
+def per_call(fn, n: int) -> float:
+    t = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t) / n
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def requests(asgi, n: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/x"}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    t = time.perf_counter()
+    for _ in range(n):
+        await asgi(dict(scope), receive, send)
+    return (time.perf_counter() - t) / n
+
+
+def main_() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200_000)
+    args = ap.parse_args()
+    n = args.n
+
+    labels = ("GET", "/catalog/items/{id}", "200")
+    print(f"histogram observe       {per_call(lambda: REQUEST_SECONDS.observe(0.003, labels), n) * 1e6:6.2f} us")
+    normalize_sql(SQL)
+    print(f"normalize_sql (cached)  {per_call(lambda: normalize_sql(SQL), n) * 1e6:6.2f} us")
+    started = time.perf_counter()
+    print(f"statement timing        {per_call(lambda: observe_statement('async', SQL, started), n) * 1e6:6.2f} us")
+
+    bare = asyncio.run(requests(app, n))
+    wrapped = asyncio.run(requests(MetricsMiddleware(app), n))
+    print(f"middleware              {(wrapped - bare) * 1e6:6.2f} us/request "
+          f"(bare {bare * 1e6:.2f} us, wrapped {wrapped * 1e6:.2f} us)")
+    t = time.perf_counter()
+    body = REGISTRY.render()
+    print(f"render                  {(time.perf_counter() - t) * 1e3:6.2f} ms for {len(body.splitlines())} lines")
+
+
+if __name__ == "__main__":
+    main_()
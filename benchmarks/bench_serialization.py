@@ -0,0 +1,133 @@
+"""
+Row -> Item -> JSON bytes: validated path vs the dict/pydantic-core path.
+
+    python -m benchmarks.bench_serialization [--rows 100] [--repeat 200]
+
+Cases, each timed per call:
+
+* row_to_item       – ``main._row_to_item`` (validating)
+* item_document     – ``main._item_document`` (trusted rows, plain dict)
+* page / fastapi    – 100 validated Items through FastAPI's own
+  ``serialize_response`` + ``JSONResponse``, i.e. what ``response_model``
+  did for GET /catalog/items
+* page / fast path  – ``_item_document`` + ``_json_response``, as the
+  handler now does
+* item / fastapi, item / fast path – a single validated Item rendered by
+  FastAPI vs ``_json_response`` (GET /catalog/items/{id})
+
+Before timing, the fast path's bytes are compared with FastAPI's for every
+row (unicode, escapes, NULL columns, timestamps) and the run aborts on any
+difference.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+import main
+from models.item import Item, PagedItems
+
+
+def rows(n: int):
+    base = datetime(2025, 3, 1, 12, 30, 5)
+    out = []
+    for k in range(n):
+        out.append({
+            "id": f"it-{k:08x}",
+            "sku": f"SKU-{k}",
+            "name": ["Re-Edition 2005", "Sac à main “Noir”", "バッグ \U0001f45c",
+                     'Quote " back\\slash \t tab \x01 ctl'][k % 4],
+            "brand": "Prada",
+            "category": "handbag",
+            "description": None if k % 3 == 0 else "Structured leather shoulder bag. " * 8,
+            "photos_json": json.dumps([f"https://img.example/{k}/{j}.jpg" for j in range(k % 5)]),
+            "rent_price_cents": 1000 + k,
+            "deposit_cents": 90000,
+            "attrs_json": None if k % 4 == 0 else json.dumps({"color": "black", "size": "M", "material": "näppa"}),
+            "status": "active" if k % 7 else "inactive",
+            "created_at": base + timedelta(seconds=k),
+            "updated_at": None if k % 2 else base + timedelta(days=1, seconds=k),
+        })
+    return out
+
+
+PAGE_FIELD = create_model_field("Response_list", PagedItems, mode="serialization")
+ITEM_FIELD = create_model_field("Response_item", Item, mode="serialization")
+
+
+def fastapi_bytes(field, content) -> bytes:
+    # What FastAPI does with a handler's return value and response_model.
+    encoded = asyncio.run(serialize_response(field=field, response_content=content, is_coroutine=True))
+    return JSONResponse(encoded).body
+
+
+def page_slow(batch) -> bytes:
+    page = PagedItems(items=[main._row_to_item(r) for r in batch], nextPageToken="eyJ9", page_size=len(batch))
+    return fastapi_bytes(PAGE_FIELD, page)
+
+
+def page_fast(batch) -> bytes:
+    page = {
+        "items": [main._item_document(r) for r in batch],
+        "nextPageToken": "eyJ9", "page": 1, "page_size": len(batch), "total": None,
+        "total_approximate": False,
+    }
+    return main._json_response(page).body
+
+
+def check(batch) -> None:
+    for r in batch:
+        slow = fastapi_bytes(ITEM_FIELD, main._row_to_item(r))
+        for fast in (main._json_response(main._row_to_item(r)).body,
+                     main._json_response(main._item_document(r)).body):
+            assert slow == fast, f"item {r['id']} differs:\n{slow!r}\n{fast!r}"
+    assert page_slow(batch) == page_fast(batch), "page bytes differ"
+
+
+def bench(label: str, fn, repeat: int, per: int = 1) -> float:
+    fn()
+    t = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    us = (time.perf_counter() - t) / repeat * 1e6
+    print(f"  {label:<22} {us:10.1f} us/call" + (f"  {us / per:7.2f} us/row" if per > 1 else ""))
+    return us
+
+
+def main_() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    batch = rows(args.rows)
+    check(batch)
+    print(f"output byte-identical for {len(batch)} rows and the page")
+
+    n = args.repeat
+    print("per row")
+    a = bench("row_to_item", lambda: [main._row_to_item(r) for r in batch], n, len(batch))
+    b = bench("item_document", lambda: [main._item_document(r) for r in batch], n, len(batch))
+    print(f"  -> {a / b:.1f}x")
+
+    print(f"page of {len(batch)}")
+    a = bench("fastapi", lambda: page_slow(batch), n)
+    b = bench("fast path", lambda: page_fast(batch), n)
+    print(f"  -> {a / b:.1f}x")
+
+    print("single item")
+    r = batch[1]
+    a = bench("fastapi", lambda: fastapi_bytes(ITEM_FIELD, main._row_to_item(r)), n * 20)
+    b = bench("fast path", lambda: main._json_response(main._row_to_item(r)).body, n * 20)
+    print(f"  -> {a / b:.1f}x")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,78 @@
+"""
+Bad-line handling of ``POST /catalog/items/import``.
+
+    python -m benchmarks.check_import
+
+Imports an NDJSON body mixing good lines with malformed ones (a SKU that
+is not a string, a missing field, broken JSON, a repeated SKU) against the
+SQLite stand-in, plain and gzip-compressed, and fails unless every bad
+line is reported and skipped while the good ones are written.  Also checks
+that an over-long line is a 400 for the body as a whole.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import sys
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.local_db import LocalDB, install
+
+
+def item(sku, **extra):
+    return {
+        "sku": sku, "name": "Re-Edition 2005", "brand": "Prada", "category": "handbag",
+        "rent_price_cents": 12000, "deposit_cents": 90000, **extra,
+    }
+
+
+def body(prefix: str) -> bytes:
+    lines = [
+        json.dumps(item(f"{prefix}-1")),
+        json.dumps(item(1)),                                    # sku is not a string
+        json.dumps({"sku": f"{prefix}-x", "name": "no price"}),  # missing fields
+        '{"sku": "broken"',                                     # not JSON
+        json.dumps(item(f"{prefix}-2")),
+        json.dumps(item(f"{prefix}-1")),                        # duplicate of line 1
+        json.dumps(item(f"{prefix}-3")),
+    ]
+    return "\n".join(lines).encode("utf-8")
+
+
+def main_() -> int:
+    db = LocalDB()
+    install(db)
+    failures = []
+    with TestClient(main.app) as client:
+        main.outbox_relay.stop()
+        for label, content, headers in (
+            ("plain", body("PLAIN"), {}),
+            ("gzip", gzip.compress(body("GZIP")), {"Content-Encoding": "gzip"}),
+        ):
+            r = client.post("/catalog/items/import?mode=create", content=content, headers=headers)
+            result = r.json() if r.status_code == 200 else {}
+            reported = {p["line"]: p["sku"] for p in result.get("problems", [])}
+            ok = (
+                r.status_code == 200
+                and (result["created"], result["invalid"], result["conflicts"]) == (3, 3, 1)
+                and reported == {2: "1", 3: f"{label.upper()}-x", 4: None, 6: f"{label.upper()}-1"}
+            )
+            print(f"{label:<6} status={r.status_code} "
+                  f"created={result.get('created')} invalid={result.get('invalid')} "
+                  f"conflicts={result.get('conflicts')}  {'ok' if ok else 'FAILED'}")
+            if not ok:
+                failures.append(label)
+
+        long_line = b'{"sku": "' + b"x" * (2 << 20) + b'"}\n' + json.dumps(item("AFTER")).encode()
+        r = client.post("/catalog/items/import", content=long_line)
+        ok = r.status_code == 400
+        print(f"{'long':<6} status={r.status_code}  {'ok' if ok else 'FAILED'}")
+        if not ok:
+            failures.append("long")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,116 @@
+"""
+End-to-end check of the catalog outbox and relay against a fake publisher.
+
+    python -m benchmarks.check_outbox [--items 2000] [--fail-rate 0.1] [--lost-ack-rate 0.02]
+
+Runs creates, updates, deletes and a bulk upload through the app on the
+SQLite stand-in while the relay publishes to ``FakePublisher`` with
+injected failures, then a relay "crash" between publish and mark.  Fails
+unless every committed outbox event was delivered at least once and
+dedupe by eventId leaves exactly one copy of each.  Prints relay metrics
+and throughput.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.fake_pubsub import FakePublisher
+from benchmarks.local_db import LocalDB, install
+from services.outbox import OutboxRelay
+
+
+def body(k: int) -> dict:
+    return {
+        "sku": f"OUTBOX-{k:06d}", "name": f"Item {k}", "brand": "Prada", "category": "handbag",
+        "rent_price_cents": 1000 + k, "deposit_cents": 50000,
+    }
+
+
+def main_() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=2000)
+    ap.add_argument("--fail-rate", type=float, default=0.1)
+    ap.add_argument("--lost-ack-rate", type=float, default=0.02)
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+
+    db = LocalDB()
+    install(db)
+    fake = FakePublisher(latency=0.001, fail_rate=args.fail_rate, lost_ack_rate=args.lost_ack_rate)
+    failures = []
+
+    with TestClient(main.app) as client:
+        main.outbox_relay.stop()
+        # Fast retries so failed publishes come round again within the run.
+        relay = OutboxRelay(fake.publish, batch_size=100, linger=0.005, max_in_flight=300,
+                            poll_interval=0.05, max_backoff=1)
+        relay._backoff = lambda attempts: 0
+        main.outbox_relay = relay
+        relay.start()
+
+        t0 = time.perf_counter()
+        single = max(args.items // 10, 1)
+        ids = [client.post("/catalog/items", json=body(k)).json()["id"] for k in range(single)]
+        for item_id in ids[: single // 2]:
+            client.put(f"/catalog/items/{item_id}", json={"name": "Renamed"})
+        for item_id in ids[single // 2:]:
+            client.delete(f"/catalog/items/{item_id}")
+        r = client.post("/catalog/items/bulk", json={"items": [body(k) for k in range(single, args.items)]})
+        assert r.status_code == 200, r.text
+        written = time.perf_counter() - t0
+
+        relay.stop()
+        drained = relay.drain(timeout=120)
+        relayed = time.perf_counter() - t0
+        if not drained:
+            failures.append("relay did not drain the outbox")
+
+        # Crash between publish and mark: claim and publish, never settle.
+        client.post("/catalog/items", json=body(args.items))
+        crashed = OutboxRelay(fake.publish, lease=1)
+        for message in crashed._claim(10):
+            crashed.publish(message).result()
+        time.sleep(2.1)  # lease lapses (TIMESTAMP resolution is 1s)
+        survivor = OutboxRelay(fake.publish, poll_interval=0.05)
+        survivor._backoff = lambda attempts: 0
+        if not survivor.drain(timeout=30):
+            failures.append("re-claim after crash did not drain")
+
+    outbox = {r["event_id"]: r for r in db.query_all("SELECT * FROM catalog_outbox")}
+    delivered = fake.delivered_ids()
+    missing = [e for e in outbox if e not in delivered]
+    unknown = [e for e in delivered if e not in outbox]
+    unpublished = [e for e, r in outbox.items() if r["published_at"] is None]
+    duplicates = sum(n - 1 for n in delivered.values())
+    expected = args.items + 1 + single  # creates + crash create + one update/delete per single item
+    if len(outbox) != expected:
+        failures.append(f"{len(outbox)} outbox events, expected {expected}")
+    if missing:
+        failures.append(f"{len(missing)} events never delivered")
+    if unknown:
+        failures.append(f"{len(unknown)} delivered events not in the outbox")
+    if unpublished:
+        failures.append(f"{len(unpublished)} events not marked published")
+
+    m = relay.metrics()
+    print(f"{len(outbox)} events committed in {written:.2f}s; relayed by {relayed:.2f}s "
+          f"({len(outbox) / relayed:.0f} events/s)")
+    print(f"relay: batches={m['batches']} claimed={m['claimed']} published={m['published']} "
+          f"failed={m['failed']} backpressure_waits={m['backpressure_waits']} "
+          f"publish_seconds_max={m['publish_seconds_max']:.3f}")
+    print(f"delivered {sum(delivered.values())} messages, {duplicates} duplicates, "
+          f"{len(delivered)} unique after dedupe by eventId")
+    fake.close()
+    for f in failures:
+        print("FAIL:", f)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
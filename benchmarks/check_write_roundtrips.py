@@ -0,0 +1,78 @@
+"""
+Query-count budget for the catalog write handlers.
+
+    python -m benchmarks.check_write_roundtrips
+
+Runs create / update / delete through the app against the SQLite stand-in
+and fails if a handler checks out more connections or sends more
+statements than its budget.  Re-run after touching the write path.
+"""
+from __future__ import annotations
+
+import sys
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.local_db import LocalDB, install
+
+
+# route -> (connection checkouts, statements); every write also inserts its
+# event into catalog_outbox in the same transaction.
+BUDGET = {
+    "create": (1, 2),   # INSERT + outbox INSERT
+    "update": (1, 3),   # SELECT ... FOR UPDATE + UPDATE + outbox INSERT
+    "delete": (1, 3),   # tombstone REPLACE ... SELECT (rowcount decides) + DELETE + outbox INSERT
+}
+
+BODY = {
+    "sku": "BAG-PRADA-001",
+    "name": "Re-Edition 2005",
+    "brand": "Prada",
+    "category": "handbag",
+    "photos": ["https://img.example/1.jpg"],
+    "rent_price_cents": 12000,
+    "deposit_cents": 90000,
+    "attrs": {"color": "black"},
+}
+
+
+def measure(db: LocalDB, call):
+    before = db.counters()
+    response = call()
+    after = db.counters()
+    return response, (after["checkouts"] - before["checkouts"], after["statements"] - before["statements"])
+
+
+def main_() -> int:
+    db = LocalDB()
+    install(db)
+    failures = []
+    with TestClient(main.app) as client:
+        # The relay's own statements would be counted against the handlers.
+        main.outbox_relay.stop()
+        created, used = measure(db, lambda: client.post("/catalog/items", json=BODY))
+        assert created.status_code == 201, created.text
+        results = {"create": used}
+        item_id = created.json()["id"]
+
+        updated, used = measure(db, lambda: client.put(f"/catalog/items/{item_id}", json={"name": "Re-Edition"}))
+        assert updated.status_code == 200 and updated.json()["name"] == "Re-Edition", updated.text
+        assert updated.json()["updated_at"] is not None
+        results["update"] = used
+
+        deleted, used = measure(db, lambda: client.delete(f"/catalog/items/{item_id}"))
+        assert deleted.status_code == 204
+        results["delete"] = used
+
+    for route, used in results.items():
+        over = any(u > b for u, b in zip(used, BUDGET[route]))
+        print(f"{route:<7} checkouts={used[0]} statements={used[1]} budget={BUDGET[route]}  "
+              f"{'OVER BUDGET' if over else 'ok'}")
+        if over:
+            failures.append(route)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,55 @@
+"""
+In-process stand-in for the Pub/Sub publisher, for outbox relay runs.
+
+    fake = FakePublisher(latency=0.002, fail_rate=0.1, lost_ack_rate=0.02)
+    relay = OutboxRelay(fake.publish)
+
+``publish`` returns a ``concurrent.futures.Future`` like the real client.
+``fail_rate`` rejects a message (nothing delivered); ``lost_ack_rate``
+delivers it but fails the future, as when the publish RPC succeeds and
+the response is lost, so the relay retries and the message arrives twice.
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import Counter
+from concurrent import futures
+from typing import Dict, List, Tuple
+
+
+class FakePublisher:
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0,
+                 lost_ack_rate: float = 0.0, workers: int = 8, seed: int = 0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.lost_ack_rate = lost_ack_rate
+        self._rnd = random.Random(seed)
+        self._pool = futures.ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        # (event id, event type, payload) in delivery order, duplicates included.
+        self.delivered: List[Tuple[str, str, Dict]] = []
+
+    def publish(self, message) -> futures.Future:
+        with self._lock:
+            roll = self._rnd.random()
+        return self._pool.submit(self._send, message, roll)
+
+    def _send(self, message, roll: float) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        if roll < self.fail_rate:
+            raise RuntimeError("fake publish rejected")
+        with self._lock:
+            self.delivered.append((message.event_id, message.event_type, message.payload))
+        if roll < self.fail_rate + self.lost_ack_rate:
+            raise TimeoutError("fake publish ack lost")
+        return message.event_id
+
+    def delivered_ids(self) -> Counter:
+        with self._lock:
+            return Counter(event_id for event_id, _, _ in self.delivered)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
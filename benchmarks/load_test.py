@@ -0,0 +1,356 @@
+"""
+Mixed-workload load test of the whole app against the SQLite stand-in.
+
+    python -m benchmarks.load_test [--items 1000000] [--db-file /tmp/catalog-1m.db]
+        [--concurrency 64] [--duration 30] [--mix list=70,get=25,create=3,update=2]
+        [--latency-ms 1] [--save NEW.json] [--compare benchmarks/baselines/load-1m.json]
+
+Seeds ``--items`` synthetic catalog items (deterministic for ``--seed``;
+with ``--db-file`` the seeded database is saved and copied in by later
+runs),
+starts the app in-process with its startup hooks, and has ``--concurrency``
+clients loop over the httpx ASGI transport for ``--duration`` seconds
+after ``--warmup``:
+
+* list   – GET /catalog/items with a random filter / sort combination,
+  following nextPageToken for a second page about a third of the time
+* get    – GET /catalog/items/{id} of a random seeded or created item
+* create – POST /catalog/items
+* update – PUT /catalog/items/{id} (price and attrs)
+
+Reports requests/s and p50/p95/p99 latency per operation and overall.
+``--save`` writes them as a JSON baseline with the commit and settings;
+``--compare`` reads one and exits 1 when throughput drops or p95 / p99
+rise by more than ``--tolerance`` (only meaningful on the same machine
+and settings).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+import main
+from benchmarks.local_db import LocalDB, install
+
+BRANDS = ["Prada", "Gucci", "Chanel", "Dior", "Fendi", "Celine", "Loewe", "Bottega",
+          "Hermes", "Valentino", "Balenciaga", "Saint Laurent"]
+CATEGORIES = ["handbag", "dress", "shoes", "jewelry", "coat", "scarf", "watch"]
+COLORS = ["black", "white", "red", "beige", "green", "blue", "pink", "gold"]
+MATERIALS = ["leather", "silk", "cotton", "wool", "canvas", "suede"]
+SIZES = ["XS", "S", "M", "L", "XL"]
+SORTS = ["id", "price_asc", "price_desc", "newest", "brand"]
+OPS = ("list", "get", "create", "update")
+
+
+# -- seeding -----------------------------------------------------------------
+
+
+def _item_row(rnd: random.Random, k: int, base: datetime) -> tuple:
+    category = rnd.choice(CATEGORIES)
+    attrs = {"color": rnd.choice(COLORS), "material": rnd.choice(MATERIALS)}
+    if category in ("dress", "coat", "shoes"):
+        attrs["size"] = rnd.choice(SIZES)
+    return (
+        f"it-{k:08x}", f"SKU-{k:07d}", f"Item {k}", rnd.choice(BRANDS), category,
+        None, json.dumps([f"https://img.example/{k}.jpg"]),
+        rnd.randrange(1000, 50000, 100), rnd.randrange(10000, 200000, 1000),
+        json.dumps(attrs), "active" if rnd.random() < 0.9 else "inactive",
+        base + timedelta(seconds=rnd.randrange(0, 86400 * 600)),
+    )
+
+
+def seed(db: LocalDB, n: int, seed_value: int) -> None:
+    rnd = random.Random(seed_value)
+    base = datetime(2024, 1, 1)
+    sql = (
+        "INSERT INTO catalog_items (id, sku, name, brand, category, description, photos_json, "
+        "rent_price_cents, deposit_cents, attrs_json, status, created_at) "
+        "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
+    )
+    for start in range(0, n, 50_000):
+        db.executemany(sql, [_item_row(rnd, k, base) for k in range(start, min(n, start + 50_000))])
+    db.conn.execute("ANALYZE")
+    db.conn.commit()
+
+
+def open_db(args) -> LocalDB:
+    """
+    An in-memory LocalDB holding the seeded items.  With ``--db-file`` the
+    freshly seeded database is saved there, and later runs with the same
+    ``--items`` and ``--seed`` copy it in instead of seeding again; each run
+    starts from the same rows because writes never reach the file.
+    """
+    db = LocalDB(latency=args.latency_ms / 1000)
+    if args.db_file and os.path.exists(args.db_file):
+        saved = sqlite3.connect(args.db_file)
+        try:
+            meta = dict(saved.execute("SELECT key, value FROM load_test_meta").fetchall())
+        except sqlite3.Error:
+            meta = {}
+        if meta == {"items": str(args.items), "seed": str(args.seed)}:
+            saved.backup(db.conn)
+            saved.close()
+            return db
+        saved.close()
+    t = time.perf_counter()
+    seed(db, args.items, args.seed)
+    print(f"seeded {args.items} items in {time.perf_counter() - t:.1f}s", file=sys.stderr)
+    if args.db_file:
+        db.conn.execute("CREATE TABLE load_test_meta (key TEXT PRIMARY KEY, value TEXT)")
+        db.conn.executemany("INSERT INTO load_test_meta VALUES (?, ?)",
+                            [("items", str(args.items)), ("seed", str(args.seed))])
+        db.conn.commit()
+        if os.path.exists(args.db_file):
+            os.remove(args.db_file)
+        saved = sqlite3.connect(args.db_file)
+        db.conn.backup(saved)
+        saved.close()
+    return db
+
+
+# -- workload ----------------------------------------------------------------
+
+
+class Workload:
+    def __init__(self, client: int, items: int, rnd: random.Random):
+        self.client = client
+        self.items = items
+        self.rnd = rnd
+        self.created: List[str] = []
+        self.next_sku = 0
+
+    def item_id(self) -> str:
+        if self.created and self.rnd.random() < 0.1:
+            return self.rnd.choice(self.created)
+        return f"it-{self.rnd.randrange(self.items):08x}"
+
+    def list_params(self) -> Dict[str, str]:
+        rnd = self.rnd
+        params = {"sort": rnd.choice(SORTS), "pageSize": str(rnd.choice((10, 20, 50)))}
+        if rnd.random() < 0.5:
+            params["category"] = rnd.choice(CATEGORIES)
+        if rnd.random() < 0.4:
+            params["brand"] = rnd.choice(BRANDS)
+        if rnd.random() < 0.25:
+            low = rnd.randrange(1000, 40000, 1000)
+            params["minPrice"] = str(low)
+            params["maxPrice"] = str(low + rnd.randrange(2000, 20000, 1000))
+        if rnd.random() < 0.15:
+            params["attr.color"] = rnd.choice(COLORS)
+        return params
+
+    def create_body(self) -> Dict:
+        rnd = self.rnd
+        self.next_sku += 1
+        return {
+            "sku": f"LOAD-{self.client}-{self.next_sku}",
+            "name": f"Load item {self.next_sku}",
+            "brand": rnd.choice(BRANDS),
+            "category": rnd.choice(CATEGORIES),
+            "photos": ["https://img.example/load.jpg"],
+            "rent_price_cents": rnd.randrange(1000, 50000, 100),
+            "deposit_cents": 50000,
+            "attrs": {"color": rnd.choice(COLORS)},
+        }
+
+    def update_body(self) -> Dict:
+        return {"rent_price_cents": self.rnd.randrange(1000, 50000, 100),
+                "attrs": {"color": self.rnd.choice(COLORS)}}
+
+
+async def run_op(client: httpx.AsyncClient, op: str, w: Workload) -> None:
+    if op == "list":
+        params = w.list_params()
+        r = await client.get("/catalog/items", params=params)
+        r.raise_for_status()
+        token = r.json().get("nextPageToken")
+        if token and w.rnd.random() < 0.33:
+            r = await client.get("/catalog/items", params={**params, "nextPageToken": token})
+    elif op == "get":
+        r = await client.get(f"/catalog/items/{w.item_id()}")
+    elif op == "create":
+        r = await client.post("/catalog/items", json=w.create_body())
+        if r.status_code == 201:
+            w.created.append(r.json()["id"])
+    else:
+        r = await client.put(f"/catalog/items/{w.item_id()}", json=w.update_body())
+    # 404 is an expected answer (e.g. an id not seeded); anything else is an error.
+    if r.status_code >= 500 or r.status_code in (400, 409, 422):
+        raise RuntimeError(f"{op}: {r.status_code} {r.text[:200]}")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))]
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / seconds, 1),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+async def drive(args, mix: Dict[str, int]) -> Dict[str, Dict[str, float]]:
+    ops, weights = zip(*mix.items())
+    latencies: Dict[str, List[float]] = {op: [] for op in ops}
+    errors: Dict[str, int] = {op: 0 for op in ops}
+    rnd = random.Random(args.seed)
+    workloads = [Workload(i, args.items, random.Random(rnd.random())) for i in range(args.concurrency)]
+    warm_until = stop_at = 0.0
+    first_error: List[str] = []
+
+    async def client_loop(w: Workload, client: httpx.AsyncClient) -> None:
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                return
+            op = w.rnd.choices(ops, weights)[0]
+            failed = False
+            try:
+                await run_op(client, op, w)
+            except Exception as e:
+                failed = True
+                if not first_error:
+                    first_error.append(str(e))
+            if started >= warm_until:
+                if failed:
+                    errors[op] += 1
+                else:
+                    latencies[op].append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=main.app)
+    t = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        # Startup loads the in-process indexes from every seeded row.
+        print(f"app started in {time.perf_counter() - t:.1f}s", file=sys.stderr)
+        warm_until = time.perf_counter() + args.warmup
+        stop_at = warm_until + args.duration
+        async with httpx.AsyncClient(transport=transport, base_url="http://load") as client:
+            await asyncio.gather(*(client_loop(w, client) for w in workloads))
+
+    if first_error:
+        print(f"first error: {first_error[0]}", file=sys.stderr)
+    results = {op: summarize(latencies[op], errors[op], args.duration) for op in ops}
+    results["all"] = summarize([v for op in ops for v in latencies[op]], sum(errors.values()), args.duration)
+    return results
+
+
+# -- baselines ---------------------------------------------------------------
+
+
+def _commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(baseline: Dict, results: Dict, tolerance: float) -> List[str]:
+    """Regressions of ``results`` against ``baseline["results"]``."""
+    regressions = []
+    for op, now in results.items():
+        before = baseline["results"].get(op)
+        if not before or not before["requests"]:
+            continue
+        if now["errors"] > before["errors"]:
+            regressions.append(f"{op}: errors {before['errors']} -> {now['errors']}")
+        if now["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{op}: rps {before['rps']} -> {now['rps']}")
+        for key in ("p95_ms", "p99_ms"):
+            if now[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{op}: {key} {before[key]} -> {now[key]}")
+    return regressions
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op not in OPS:
+            raise SystemExit(f"unknown operation in --mix: {op!r} (expected one of {', '.join(OPS)})")
+        mix[op] = int(weight)
+    return {op: w for op, w in mix.items() if w > 0}
+
+
+def main_() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=1_000_000)
+    ap.add_argument("--db-file", default=None, help="keep the seeded SQLite database here and reuse it")
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--warmup", type=float, default=5.0)
+    ap.add_argument("--mix", default="list=70,get=25,create=3,update=2")
+    ap.add_argument("--latency-ms", type=float, default=1.0, help="per-statement round trip")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--save", default=None, help="write results as a JSON baseline")
+    ap.add_argument("--compare", default=None, help="baseline JSON to check against")
+    ap.add_argument("--tolerance", type=float, default=0.15)
+    args = ap.parse_args()
+    mix = parse_mix(args.mix)
+    logging.disable(logging.WARNING)
+
+    db = open_db(args)
+    install(db)
+    results = asyncio.run(drive(args, mix))
+
+    print(f"{'op':<8}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for op, r in results.items():
+        print(f"{op:<8}{r['requests']:>10}{r['errors']:>8}{r['rps']:>10}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+    settings = {k: v for k, v in vars(args).items() if k not in ("save", "compare", "tolerance", "db_file")}
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({
+                "commit": _commit(),
+                "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "settings": settings,
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"saved {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != settings:
+            print(f"warning: baseline {args.compare} ran with different settings", file=sys.stderr)
+        regressions = compare(baseline, results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"no regressions vs {args.compare} (commit {baseline.get('commit')}, tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,327 @@
+"""
+SQLite-backed stand-in for ``database.query_all/query_one/execute``.
+
+Benchmarks run against this instead of Cloud SQL so numbers are reproducible
+on a laptop.  SQL is written for MySQL (``%s`` placeholders); the adapter
+rewrites placeholders and converts dates so the same statements run here.
+
+    db = LocalDB()
+    install(db)          # patch database.* and every module that imported them,
+                         # and back async_database's pool with ``db``
+
+``latency`` adds a per-statement delay (outside the lock, so it overlaps
+across callers like network round trips do).  ``pool_size`` makes the sync
+helpers fail when that many calls are already in flight, the way
+mysql.connector's pool raises when it is exhausted.
+"""
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import database
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_items (
+  id               TEXT PRIMARY KEY,
+  sku              TEXT NOT NULL UNIQUE,
+  name             TEXT NOT NULL,
+  brand            TEXT NOT NULL,
+  category         TEXT NOT NULL,
+  description      TEXT,
+  photos_json      TEXT,
+  rent_price_cents INTEGER NOT NULL,
+  deposit_cents    INTEGER NOT NULL,
+  attrs_json       TEXT,
+  status           TEXT NOT NULL DEFAULT 'active',
+  created_at       TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  updated_at       TIMESTAMP,
+  changed_at       TIMESTAMP GENERATED ALWAYS AS (coalesce(updated_at, created_at)) STORED,
+  attr_color       TEXT GENERATED ALWAYS AS (lower(attrs_json->>'$.color')) VIRTUAL,
+  attr_material    TEXT GENERATED ALWAYS AS (lower(attrs_json->>'$.material')) VIRTUAL,
+  attr_size        TEXT GENERATED ALWAYS AS (lower(attrs_json->>'$.size')) VIRTUAL
+);
+-- SQLite appends the rowid, not id, to secondary indexes, so the (col, id)
+-- keyset order InnoDB gets for free is spelled out here.
+CREATE INDEX IF NOT EXISTS idx_catalog_items_brand ON catalog_items (brand, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_category ON catalog_items (category);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_price ON catalog_items (rent_price_cents, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_status ON catalog_items (status);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_created ON catalog_items (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_category_price ON catalog_items (category, rent_price_cents, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_category_created ON catalog_items (category, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_category_brand ON catalog_items (category, brand, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_brand_price ON catalog_items (brand, rent_price_cents, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_brand_created ON catalog_items (brand, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_changed ON catalog_items (changed_at, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_attr_color ON catalog_items (attr_color, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_attr_material ON catalog_items (attr_material, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_items_attr_size ON catalog_items (attr_size, id);
+
+CREATE TABLE IF NOT EXISTS catalog_item_tombstones (
+  id         TEXT PRIMARY KEY,
+  sku        TEXT NOT NULL,
+  deleted_at TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_catalog_item_tombstones_deleted ON catalog_item_tombstones (deleted_at, id);
+
+CREATE TABLE IF NOT EXISTS physical_items (
+  id          TEXT PRIMARY KEY,
+  sku         TEXT NOT NULL,
+  size        TEXT NOT NULL,
+  condition   TEXT NOT NULL,
+  status      TEXT NOT NULL DEFAULT 'available',
+  version     INTEGER NOT NULL DEFAULT 0,
+  created_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_physical_items_sku ON physical_items (sku);
+
+CREATE TABLE IF NOT EXISTS reservations (
+  id          TEXT PRIMARY KEY,
+  sku         TEXT NOT NULL,
+  item_id     TEXT NOT NULL,
+  start_date  DATE NOT NULL,
+  end_date    DATE NOT NULL,
+  status      TEXT NOT NULL DEFAULT 'held',
+  expires_at  TIMESTAMP,
+  note        TEXT,
+  created_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_status_end ON reservations (status, end_date);
+CREATE INDEX IF NOT EXISTS idx_reservations_item_dates ON reservations (item_id, start_date);
+
+CREATE TABLE IF NOT EXISTS catalog_outbox (
+  id           INTEGER PRIMARY KEY AUTOINCREMENT,
+  event_id     TEXT NOT NULL UNIQUE,
+  event_type   TEXT NOT NULL,
+  payload_json TEXT NOT NULL,
+  origin       TEXT,
+  created_at   TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  attempts     INTEGER NOT NULL DEFAULT 0,
+  last_error   TEXT,
+  published_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_catalog_outbox_pending ON catalog_outbox (published_at, id);
+"""
+
+
+def _convert(params: Optional[Iterable[Any]]) -> Sequence[Any]:
+    out = []
+    for p in params or ():
+        if isinstance(p, (date, datetime)):
+            p = p.isoformat(sep=" ") if isinstance(p, datetime) else p.isoformat()
+        out.append(p)
+    return out
+
+
+def _translate(sql: str) -> str:
+    if sql.startswith("EXPLAIN "):
+        # The plan, not VDBE bytecode; utils.slow_query_log reads either dialect.
+        sql = "EXPLAIN QUERY PLAN " + sql[len("EXPLAIN "):]
+    # SQLite locks the whole database for a write transaction anyway.
+    return sql.replace("%s", "?").replace(" FOR UPDATE", "").replace(" SKIP LOCKED", "")
+
+
+class _Cursor:
+    """The slice of a mysql.connector dictionary cursor the app uses."""
+
+    def __init__(self, db: "LocalDB"):
+        self._db = db
+        self._cur: Optional[sqlite3.Cursor] = None
+
+    def execute(self, sql: str, params: Optional[Iterable[Any]] = None) -> None:
+        self._db.statements += 1
+        self._cur = self._db.conn.execute(_translate(sql), _convert(params))
+
+    def executemany(self, sql: str, seq: Iterable[Iterable[Any]]) -> None:
+        self._db.statements += 1
+        self._cur = self._db.conn.executemany(_translate(sql), (_convert(p) for p in seq))
+
+    def fetchone(self) -> Optional[Dict[str, Any]]:
+        row = self._cur.fetchone()
+        return dict(row) if row is not None else None
+
+    def fetchall(self) -> List[Dict[str, Any]]:
+        return [dict(r) for r in self._cur.fetchall()]
+
+    @property
+    def rowcount(self) -> int:
+        return self._cur.rowcount
+
+    def close(self) -> None:
+        pass
+
+
+class _AsyncCursor:
+    def __init__(self, db: "LocalDB"):
+        self._db = db
+        self._rows: List[Dict[str, Any]] = []
+        self.rowcount = -1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql: str, params: Optional[Iterable[Any]] = None) -> None:
+        if self._db.latency:
+            await asyncio.sleep(self._db.latency)
+        self._rows, self.rowcount = self._db._run(sql, params)
+
+    async def fetchall(self) -> List[Dict[str, Any]]:
+        return self._rows
+
+    async def fetchone(self) -> Optional[Dict[str, Any]]:
+        return self._rows[0] if self._rows else None
+
+
+class _AsyncConn:
+    """Enough of an aiomysql connection for ``async_database``.  Every
+    statement commits on its own; there are no multi-statement transactions."""
+
+    def __init__(self, db: "LocalDB"):
+        self._db = db
+
+    def cursor(self, cursor_class=None) -> _AsyncCursor:
+        return _AsyncCursor(self._db)
+
+    async def commit(self) -> None:
+        pass
+
+    async def rollback(self) -> None:
+        pass
+
+    async def ping(self, reconnect: bool = False) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class LocalDB:
+    """One shared SQLite connection guarded by a lock (like a 1-slot pool)."""
+
+    def __init__(self, path: str = ":memory:", latency: float = 0.0,
+                 pool_size: Optional[int] = None):
+        self.latency = latency
+        self._slots = threading.BoundedSemaphore(pool_size) if pool_size else None
+        # Round-trip accounting: connection checkouts and statements sent.
+        self.checkouts = 0
+        self.statements = 0
+        # DATE / TIMESTAMP columns come back as date / datetime, as from MySQL.
+        self.conn = sqlite3.connect(
+            path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def _run(self, sql: str, params: Optional[Iterable[Any]]):
+        with self.lock:
+            self.statements += 1
+            cur = self.conn.execute(_translate(sql), _convert(params))
+            rows = [dict(r) for r in cur.fetchall()] if cur.description else []
+            self.conn.commit()
+            rowcount = cur.rowcount
+            cur.close()
+            return rows, rowcount
+
+    @contextmanager
+    def _checkout(self):
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            raise RuntimeError("Failed getting connection; pool exhausted")
+        self.checkouts += 1
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    async def async_connect(self) -> _AsyncConn:
+        return _AsyncConn(self)
+
+    def counters(self) -> Dict[str, int]:
+        return {"checkouts": self.checkouts, "statements": self.statements}
+
+    def query_all(self, sql: str, params: Optional[Iterable[Any]] = None) -> List[Dict[str, Any]]:
+        with self._checkout():
+            return self._run(sql, params)[0]
+
+    def query_one(self, sql: str, params: Optional[Iterable[Any]] = None) -> Optional[Dict[str, Any]]:
+        rows = self.query_all(sql, params)
+        return rows[0] if rows else None
+
+    def execute(self, sql: str, params: Optional[Iterable[Any]] = None) -> int:
+        with self._checkout():
+            rowcount = self._run(sql, params)[1]
+        database.record_write()
+        return rowcount
+
+    def executemany(self, sql: str, seq: Iterable[Iterable[Any]]) -> int:
+        with self.lock:
+            cur = self.conn.executemany(_translate(sql), (_convert(p) for p in seq))
+            self.conn.commit()
+            rowcount = cur.rowcount
+            cur.close()
+            return rowcount
+
+    def stream_rows(self, sql: str, params: Optional[Iterable[Any]] = None,
+                    batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        with self._checkout():
+            with self.lock:
+                self.statements += 1
+                cur = self.conn.execute(_translate(sql), _convert(params))
+            try:
+                while True:
+                    with self.lock:
+                        rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for r in rows:
+                        yield dict(r)
+            finally:
+                cur.close()
+
+    @contextmanager
+    def transaction(self):
+        with self._checkout(), self.lock:
+            cur = _Cursor(self)
+            try:
+                yield cur
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        database.record_write()
+
+
+PATCHED = ("query_all", "query_one", "execute", "transaction", "stream_rows")
+
+
+def install(db: LocalDB, async_pool_size: Optional[int] = None) -> None:
+    """
+    Point ``database`` at ``db``, and every already-imported module that did
+    ``from database import ...`` as well.  Import the app (``main``) first.
+    """
+    import async_database
+
+    async_database._pool = async_database.AsyncPool(
+        db.async_connect, size=async_pool_size or async_database.DB_POOL_SIZE
+    )
+
+    originals = {name: getattr(database, name) for name in PATCHED}
+    for mod in list(sys.modules.values()):
+        for name, fn in originals.items():
+            if getattr(mod, name, None) is fn:
+                setattr(mod, name, getattr(db, name))
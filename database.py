@@ -1,71 +1,415 @@
+"""
+MySQL access for sync code: a primary pool plus optional read replicas.
+
+``query_all`` / ``query_one`` go to a healthy replica (weighted random)
+when ``DB_REPLICAS`` is set; ``execute``, ``transaction`` and
+``stream_rows`` always use the primary.
+
+mysql.connector's pool raises as soon as every connection is checked
+out, so ``get_conn`` gates each pool with a semaphore of its size: callers
+beyond that wait up to ``DB_SYNC_POOL_TIMEOUT`` seconds and then get a
+``PoolError`` (a 503 in ``main``).
+
+Read-your-writes is time based.  A background check reads each replica's
+``Seconds_Behind_Source`` and derives the wall time up to which it has
+applied everything (``Replica.caught_up_to``).  A commit in a request
+records its time; ``middleware.consistency`` returns it to the client as a
+consistency token, and a request that presents the token only reads from
+replicas caught up past it, otherwise from the primary.  ``read_after``
+sets the same floor explicitly, ``on_primary`` pins reads to the primary.
+"""
+import logging
+import math
 import os
+import random
+import threading
+import time
 from contextlib import contextmanager
-from typing import Any, Dict, Iterable, List, Optional
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 
 import mysql.connector
 from mysql.connector import pooling
 
+from middleware.metrics import DB_POOL_WAIT_SECONDS, observe_statement
+from utils.slow_query_log import slow_query_log
+
 
 DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
 DB_PORT = int(os.getenv("DB_PORT", "3306"))
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_NAME = os.getenv("DB_NAME", "catalog_db")
+# mysql.connector caps pool_size at 32; async handlers use async_database.
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", "5"))
+DB_SYNC_POOL_TIMEOUT = float(os.getenv("DB_SYNC_POOL_TIMEOUT", "5"))
+# Comma-separated "host[:port][*weight]" (or "/cloudsql/...[*weight]").
+DB_REPLICAS = os.getenv("DB_REPLICAS", "")
+# Replicas further behind than this, or not checked for this long, get no reads.
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "30"))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "2"))
+
+PoolError = mysql.connector.errors.PoolError
 
 _pool: Optional[pooling.MySQLConnectionPool] = None
+# pool name -> free connection slots (see get_conn).
+_slots: Dict[str, threading.BoundedSemaphore] = {}
+# Connections currently checked out (exported by the /metrics collector).
+in_use = 0
+_in_use_lock = threading.Lock()
 
 
-def _get_pool() -> pooling.MySQLConnectionPool:
+def _make_pool(name: str, host: str, port: int) -> pooling.MySQLConnectionPool:
     """
     Create a MySQL connection pool.
     Supports both Unix socket (Cloud Run with Cloud SQL) and TCP (local development).
     """
+    _slots[name] = threading.BoundedSemaphore(DB_SYNC_POOL_SIZE)
+    # Check if using Unix socket (Cloud Run with Cloud SQL)
+    if host and host.startswith('/cloudsql/'):
+        # Use Unix socket connection for Cloud Run
+        return pooling.MySQLConnectionPool(
+            pool_name=name,
+            pool_size=DB_SYNC_POOL_SIZE,
+            unix_socket=host,  # Use unix_socket parameter, not host
+            user=DB_USER,
+            password=DB_PASSWORD,
+            database=DB_NAME,
+        )
+    # Use TCP connection for local development
+    return pooling.MySQLConnectionPool(
+        pool_name=name,
+        pool_size=DB_SYNC_POOL_SIZE,
+        host=host,
+        port=port,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+    )
+
+
+def _get_pool() -> pooling.MySQLConnectionPool:
     global _pool
     if _pool is None:
-        # Check if using Unix socket (Cloud Run with Cloud SQL)
-        if DB_HOST and DB_HOST.startswith('/cloudsql/'):
-            # Use Unix socket connection for Cloud Run
-            _pool = pooling.MySQLConnectionPool(
-                pool_name="catalog_pool",
-                pool_size=5,
-                unix_socket=DB_HOST,  # Use unix_socket parameter, not host
-                user=DB_USER,
-                password=DB_PASSWORD,
-                database=DB_NAME,
-            )
-        else:
-            # Use TCP connection for local development
-            _pool = pooling.MySQLConnectionPool(
-                pool_name="catalog_pool",
-                pool_size=5,
-                host=DB_HOST,
-                port=DB_PORT,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                database=DB_NAME,
-            )
+        _pool = _make_pool("catalog_pool", DB_HOST, DB_PORT)
     return _pool
 
 
 @contextmanager
-def get_conn():
-    pool = _get_pool()
-    conn = pool.get_connection()
+def get_conn(pool: Optional[pooling.MySQLConnectionPool] = None):
+    global in_use
+    pool = pool or _get_pool()
+    slots = _slots[pool.pool_name]
+    started = time.perf_counter()
+    if not slots.acquire(timeout=DB_SYNC_POOL_TIMEOUT):
+        raise PoolError(f"no connection within {DB_SYNC_POOL_TIMEOUT}s")
+    try:
+        conn = pool.get_connection()
+    except BaseException:
+        slots.release()
+        raise
+    DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started, ("sync",))
+    with _in_use_lock:
+        in_use += 1
     try:
         yield conn
     finally:
-        conn.close()
+        with _in_use_lock:
+            in_use -= 1
+        try:
+            conn.close()
+        finally:
+            slots.release()
 
 
-def query_all(sql: str, params: Optional[Iterable[Any]] = None) -> List[Dict[str, Any]]:
-    with get_conn() as conn:
+# -- read-your-writes ---------------------------------------------------------
+
+# Reads must see every commit made before this wall time.
+_read_floor: ContextVar[float] = ContextVar("db_read_floor", default=0.0)
+# Per-request holder of the last commit time, set up by begin_request.
+_writes: ContextVar[Optional[List[float]]] = ContextVar("db_writes", default=None)
+# Commits the last read is known to reflect (inf: read on the primary).
+_read_position: ContextVar[float] = ContextVar("db_read_position", default=math.inf)
+
+CONSISTENCY_HEADER = "X-Consistency-Token"
+
+
+def encode_token(committed_at: float) -> str:
+    return f"1.{int(committed_at * 1000) + 1}"
+
+
+def decode_token(token: str) -> float:
+    """Commit time a token stands for; an unreadable one pins reads to the primary."""
+    version, _, millis = token.partition(".")
+    if version != "1" or not millis.isdigit():
+        return math.inf
+    return int(millis) / 1000
+
+
+def begin_request(token: Optional[str]) -> List[float]:
+    """Start a request's consistency scope; returns the holder of its last commit time."""
+    writes = [0.0]
+    _writes.set(writes)
+    _read_floor.set(decode_token(token) if token else 0.0)
+    return writes
+
+
+def record_write() -> None:
+    """Called after a commit: later reads in this request (and with its token) see it."""
+    now = time.time()
+    writes = _writes.get()
+    if writes is not None:
+        writes[0] = now
+    else:
+        _read_floor.set(max(_read_floor.get(), now))
+
+
+def read_floor() -> float:
+    writes = _writes.get()
+    floor = _read_floor.get()
+    return max(floor, writes[0]) if writes else floor
+
+
+def note_read_position(position: float) -> None:
+    _read_position.set(position)
+
+
+def last_read_position() -> float:
+    """Wall time up to which the last read in this context saw every commit."""
+    return _read_position.get()
+
+
+@contextmanager
+def read_after(committed_at: float):
+    """Reads inside see everything committed before ``committed_at``."""
+    token = _read_floor.set(max(_read_floor.get(), committed_at))
+    try:
+        yield
+    finally:
+        _read_floor.reset(token)
+
+
+def on_primary():
+    """Reads inside go to the primary (read-modify-write paths, index loads)."""
+    return read_after(math.inf)
+
+
+# -- replicas -------------------------------------------------------------------
+
+
+class Replica:
+    def __init__(self, name: str, host: str, port: int = DB_PORT, weight: float = 1.0):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.weight = weight
+        self.healthy = False
+        self.lag: Optional[float] = None
+        # Every commit before this wall time has been applied here.
+        self.caught_up_to = 0.0
+        self.checked_at = 0.0
+        self.error: Optional[str] = None
+        self.reads = 0
+        self._pool: Optional[pooling.MySQLConnectionPool] = None
+
+    def pool(self) -> pooling.MySQLConnectionPool:
+        if self._pool is None:
+            self._pool = _make_pool(f"catalog_{self.name}", self.host, self.port)
+        return self._pool
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "host": self.host,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "caught_up_to": self.caught_up_to,
+            "checked_at": self.checked_at,
+            "error": self.error,
+            "reads": self.reads,
+        }
+
+
+def parse_replicas(spec: str) -> List[Replica]:
+    replicas = []
+    for i, entry in enumerate(e.strip() for e in spec.split(",")):
+        if not entry:
+            continue
+        address, _, weight = entry.partition("*")
+        host, port = address, DB_PORT
+        if not address.startswith("/") and ":" in address:
+            host, _, port_text = address.rpartition(":")
+            port = int(port_text)
+        replicas.append(Replica(f"replica{i}", host, port, float(weight or 1)))
+    return replicas
+
+
+def _replication_lag(replica: Replica) -> float:
+    with get_conn(replica.pool()) as conn:
         cur = conn.cursor(dictionary=True)
+        cur.execute("SHOW REPLICA STATUS")
+        rows = cur.fetchall()
+        cur.close()
+    if not rows:
+        # Not replicating (e.g. DB_REPLICAS pointing at the primary itself).
+        return 0.0
+    lag = rows[0].get("Seconds_Behind_Source")
+    if lag is None:
+        raise RuntimeError("replication is not running")
+    return float(lag)
+
+
+class ReplicaSet:
+    def __init__(
+        self,
+        replicas: List[Replica],
+        probe: Callable[[Replica], float] = _replication_lag,
+        max_lag: float = DB_REPLICA_MAX_LAG_SECONDS,
+        interval: float = DB_REPLICA_CHECK_SECONDS,
+    ):
+        self.replicas = replicas
+        self.probe = probe
+        self.max_lag = max_lag
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"replica_reads": 0, "primary_reads": 0, "failovers": 0}
+
+    def choose(self, floor: float) -> Optional[Replica]:
+        """A replica that has applied everything before ``floor``, or None (use the primary)."""
+        if not self.replicas:
+            return None
+        floor = max(floor, time.time() - self.max_lag)
+        candidates = [r for r in self.replicas if r.healthy and r.caught_up_to >= floor]
+        if not candidates:
+            self.stats["primary_reads"] += 1
+            return None
+        replica = random.choices(candidates, [r.weight for r in candidates])[0]
+        replica.reads += 1
+        self.stats["replica_reads"] += 1
+        return replica
+
+    def mark_down(self, replica: Replica, error: BaseException) -> None:
+        """A read failed on ``replica``: no more reads until the next good check."""
+        replica.healthy = False
+        replica.error = str(error)[:200]
+        self.stats["failovers"] += 1
+        logging.warning(f"Read replica {replica.name} failed, reading from primary: {error}")
+
+    def check(self) -> None:
+        for replica in self.replicas:
+            # Taken before the probe: the lag it reports is at least this old.
+            checked_at = time.time()
+            try:
+                lag = float(self.probe(replica))
+            except Exception as e:
+                if replica.healthy or replica.error is None:
+                    logging.warning(f"Read replica {replica.name} check failed: {e}")
+                replica.healthy = False
+                replica.error = str(e)[:200]
+                continue
+            replica.lag = lag
+            replica.error = None
+            replica.checked_at = checked_at
+            # Seconds_Behind_Source is whole seconds, hence the extra second.
+            replica.caught_up_to = max(replica.caught_up_to, checked_at - lag - 1.0)
+            replica.healthy = lag <= self.max_lag
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if not self.replicas or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-check", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "max_lag_seconds": self.max_lag,
+            **self.stats,
+            "replicas": [r.status() for r in self.replicas],
+        }
+
+
+replicas = ReplicaSet(parse_replicas(DB_REPLICAS))
+
+
+class _TimedCursor:
+    """
+    Cursor proxy recording each statement's latency for /metrics, and
+    handing statements over ``DB_SLOW_QUERY_MS`` to the slow-query log.
+    """
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def execute(self, sql: str, params: Optional[Iterable[Any]] = None) -> None:
+        started = time.perf_counter()
+        try:
+            self._cur.execute(sql, params)
+        except Exception:
+            observe_statement("sync", sql, started, failed=True)
+            raise
+        elapsed = observe_statement("sync", sql, started)
+        if elapsed >= slow_query_log.threshold:
+            slow_query_log.record(sql, params, elapsed)
+
+    def executemany(self, sql: str, seq: Iterable[Iterable[Any]]) -> None:
+        seq = list(seq)
+        started = time.perf_counter()
+        try:
+            self._cur.executemany(sql, seq)
+        except Exception:
+            observe_statement("sync", sql, started, failed=True)
+            raise
+        elapsed = observe_statement("sync", sql, started)
+        if elapsed >= slow_query_log.threshold:
+            # Timed as one batch; the first row's parameters stand in for
+            # the rest (and for EXPLAIN).
+            slow_query_log.record(sql, seq[0] if seq else None, elapsed)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cur, name)
+
+
+def _query_all(pool: Optional[pooling.MySQLConnectionPool], sql: str,
+               params: Optional[Iterable[Any]]) -> List[Dict[str, Any]]:
+    with get_conn(pool) as conn:
+        cur = _TimedCursor(conn.cursor(dictionary=True))
         cur.execute(sql, params or [])
         rows = cur.fetchall()
         cur.close()
         return rows
 
 
+def query_all(sql: str, params: Optional[Iterable[Any]] = None) -> List[Dict[str, Any]]:
+    replica = replicas.choose(read_floor())
+    if replica is not None:
+        try:
+            rows = _query_all(replica.pool(), sql, params)
+            note_read_position(replica.caught_up_to)
+            return rows
+        except (mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError) as e:
+            replicas.mark_down(replica, e)
+        except PoolError:
+            # All of this replica's connections are busy; the primary may not be.
+            pass
+    rows = _query_all(None, sql, params)
+    note_read_position(math.inf)
+    return rows
+
+
 def query_one(sql: str, params: Optional[Iterable[Any]] = None) -> Optional[Dict[str, Any]]:
     rows = query_all(sql, params)
     return rows[0] if rows else None
@@ -73,9 +417,62 @@ def query_one(sql: str, params: Optional[Iterable[Any]] = None) -> Optional[Dict
 
 def execute(sql: str, params: Optional[Iterable[Any]] = None) -> int:
     with get_conn() as conn:
-        cur = conn.cursor()
+        cur = _TimedCursor(conn.cursor())
         cur.execute(sql, params or [])
         conn.commit()
+        record_write()
         rowcount = cur.rowcount
         cur.close()
         return rowcount
+
+
+@contextmanager
+def transaction():
+    """
+    Run several statements on one connection as a single transaction.
+    Yields a dictionary cursor; commits on success, rolls back on error.
+    Always on the primary.
+    """
+    with get_conn() as conn:
+        cur = _TimedCursor(conn.cursor(dictionary=True))
+        try:
+            yield cur
+            conn.commit()
+            record_write()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+def stream_rows(sql: str, params: Optional[Iterable[Any]] = None,
+                batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """
+    Yield rows one by one from an unbuffered cursor, fetching ``batch_size``
+    at a time, so a full-table read never sits in memory.  The connection
+    stays checked out until the generator is exhausted or closed.
+    """
+    with get_conn() as conn:
+        cur = _TimedCursor(conn.cursor(dictionary=True, buffered=False))
+        try:
+            # Times the query to its first rows, not the whole stream.
+            cur.execute(sql, params or [])
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            # An unread result set would poison the pooled connection.
+            if conn.unread_result:
+                conn.consume_results()
+            cur.close()
+
+
+def _explain(sql: str, params: Optional[Iterable[Any]] = None) -> List[Dict[str, Any]]:
+    # Looked up at call time, so a patched ``query_all`` is used too.
+    return query_all("EXPLAIN " + sql, params)
+
+
+slow_query_log.explain = _explain
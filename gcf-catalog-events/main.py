@@ -1,24 +1,129 @@
 import base64
 import json
 import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+import mysql.connector
+
+from projector import MySQLStore, Projector
+
+
+DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
+DB_PORT = int(os.getenv("DB_PORT", "3306"))
+DB_USER = os.getenv("DB_USER", "root")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "")
+DB_NAME = os.getenv("DB_NAME", "catalog_db")
+
+PROJECT_ID = os.getenv("PUBSUB_PROJECT_ID")
+# Pull subscription drained by pull_catalog_events (batch mode).
+PROJECTOR_SUBSCRIPTION = os.getenv("PROJECTOR_SUBSCRIPTION_ID")
+PULL_MAX_MESSAGES = int(os.getenv("PROJECTOR_PULL_MAX_MESSAGES", "1000"))
+PULL_MAX_SECONDS = float(os.getenv("PROJECTOR_PULL_MAX_SECONDS", "50"))
+
+
+def _connect():
+    if DB_HOST.startswith("/cloudsql/"):
+        return mysql.connector.connect(
+            unix_socket=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME
+        )
+    return mysql.connector.connect(
+        host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, database=DB_NAME
+    )
+
+
+# Module level so a warm instance keeps its connection and recent event ids.
+projector = Projector(MySQLStore(_connect))
+
+
+def decode_message(data, attributes: Optional[Dict[str, str]] = None) -> Optional[Dict]:
+    """
+    Pub/Sub message data (base64 str or raw bytes) -> event dict, or None if
+    it cannot be decoded.  eventId/version fall back to the attributes.
+    """
+    try:
+        raw = base64.b64decode(data) if isinstance(data, str) else data
+        message = json.loads(raw.decode("utf-8"))
+    except Exception as e:
+        logging.error(f"Failed to decode message: {e}")
+        return None
+    attributes = attributes or {}
+    message.setdefault("eventId", attributes.get("eventId"))
+    if message.get("version") is None and attributes.get("version"):
+        message["version"] = int(attributes["version"])
+    return message
 
 
 def handle_catalog_event(event, context):
     """
     Pub/Sub 触发的 Cloud Function 入口。
     event["data"] 是 base64 编码的 JSON 字符串。
+
+    Projects one event.  A store error propagates so Pub/Sub redelivers
+    (deploy with --retry); undecodable messages are logged and dropped.
     """
     if "data" not in event:
         logging.warning("No data field in Pub/Sub message")
         return
 
-    try:
-        decoded = base64.b64decode(event["data"]).decode("utf-8")
-        message = json.loads(decoded)
-    except Exception as e:
-        logging.error(f"Failed to decode message: {e}")
+    message = decode_message(event["data"], event.get("attributes"))
+    if message is None:
         logging.error(f"Raw event: {event}")
         return
 
-    logging.info(f"Received catalog event: {json.dumps(message)}")
+    result = projector.project([message])
+    logging.info(f"Projected catalog event {message.get('eventId')}: {result}")
+
+
+def handle_catalog_events(events: Iterable[Dict]) -> Dict[str, int]:
+    """
+    Project a batch of Pub/Sub-style events (``{"data", "attributes"}``)
+    in one store transaction.
+    """
+    messages = []
+    for event in events:
+        message = decode_message(event.get("data", ""), event.get("attributes"))
+        if message is not None:
+            messages.append(message)
+    return projector.project(messages)
+
+
+def pull_catalog_events(request):
+    """
+    HTTP entry point (e.g. Cloud Scheduler): pull batches from
+    PROJECTOR_SUBSCRIPTION_ID and project each in one transaction, acking
+    only after it commits, until the subscription is empty or
+    PROJECTOR_PULL_MAX_SECONDS has passed.
+    """
+    # Imported here so the push function's cold start does not pay for it.
+    from google.cloud import pubsub_v1
+
+    if not PROJECT_ID or not PROJECTOR_SUBSCRIPTION:
+        return ("PUBSUB_PROJECT_ID or PROJECTOR_SUBSCRIPTION_ID not set", 500)
 
+    subscriber = pubsub_v1.SubscriberClient()
+    path = subscriber.subscription_path(PROJECT_ID, PROJECTOR_SUBSCRIPTION)
+    deadline = time.monotonic() + PULL_MAX_SECONDS
+    totals: Dict[str, int] = {}
+    with subscriber:
+        while time.monotonic() < deadline:
+            response = subscriber.pull(
+                request={"subscription": path, "max_messages": PULL_MAX_MESSAGES}, timeout=10
+            )
+            received = response.received_messages
+            if not received:
+                break
+            messages: List[Dict] = []
+            for r in received:
+                message = decode_message(r.message.data, dict(r.message.attributes))
+                if message is not None:
+                    messages.append(message)
+            result = projector.project(messages)
+            subscriber.acknowledge(
+                request={"subscription": path, "ack_ids": [r.ack_id for r in received]}
+            )
+            for k, v in result.items():
+                totals[k] = totals.get(k, 0) + v
+    logging.info(f"Projected pulled catalog events: {totals}")
+    return (json.dumps(totals), 200, {"Content-Type": "application/json"})
@@ -0,0 +1,242 @@
+"""
+Projects catalog events into a denormalized read model.
+
+Events are what the service's outbox relay publishes::
+
+    {"eventId": "...", "eventType": "CatalogItemUpdated", "version": 1234,
+     "payload": {"itemId": "...", "brand": "...", ...}}
+
+``version`` increases with every change to an item, so the projection is
+idempotent and order-insensitive: an item's row only moves forward to a
+higher version.  Redeliveries are dropped by ``eventId`` (within a batch
+and against the ids recently committed by this instance) and, when they
+get past that, by the version check.  Deletes leave a tombstone so an
+older event arriving late cannot resurrect the item.
+
+The read model is one document per item plus per (brand, category)
+counts.  ``Projector.project`` handles any number of events with one
+bulk read and one bulk write in a single store transaction.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+HANDLED_EVENTS = ("CatalogItemCreated", "CatalogItemUpdated", "CatalogItemDeleted")
+# Event ids remembered per instance to skip redeliveries without a store read.
+SEEN_EVENT_CAPACITY = int(os.getenv("PROJECTOR_SEEN_EVENTS", "100000"))
+
+_Key = Tuple[str, str]
+
+
+class ReadItem(NamedTuple):
+    item_id: str
+    version: int
+    deleted: bool
+    brand: Optional[str]
+    category: Optional[str]
+    status: Optional[str]
+    doc: Optional[Dict]
+
+
+def _read_item(item_id: str, version: int, event_type: str, payload: Dict) -> ReadItem:
+    if event_type == "CatalogItemDeleted":
+        return ReadItem(item_id, version, True, None, None, None, None)
+    return ReadItem(
+        item_id, version, False, payload.get("brand"), payload.get("category"),
+        payload.get("status") or "active", payload,
+    )
+
+
+def _count(deltas: Dict[_Key, List[int]], item: Optional[ReadItem], sign: int) -> None:
+    if item is None or item.deleted:
+        return
+    d = deltas.setdefault((item.brand, item.category), [0, 0])
+    d[0] += sign
+    if item.status == "active":
+        d[1] += sign
+
+
+class Projector:
+    def __init__(self, store, seen_capacity: int = SEEN_EVENT_CAPACITY):
+        self.store = store
+        self.seen_capacity = seen_capacity
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._seen_lock = threading.Lock()
+        self.stats = {
+            "received": 0, "applied": 0, "duplicates": 0, "collapsed": 0,
+            "stale": 0, "skipped": 0, "batches": 0,
+        }
+
+    def project(self, events: Iterable[Dict]) -> Dict[str, int]:
+        """
+        Apply decoded events; returns this call's counters.  Raises if the
+        store write fails, in which case nothing was applied and the
+        messages should be redelivered.
+        """
+        counts = dict.fromkeys(self.stats, 0)
+        latest: Dict[str, Tuple[int, str, Dict]] = {}
+        batch_ids = set()
+        seen = self._seen
+        for event in events:
+            counts["received"] += 1
+            event_id = event.get("eventId")
+            # Racy read of the shared LRU is fine: a miss falls through to
+            # the version check.
+            if event_id is not None and (event_id in batch_ids or event_id in seen):
+                counts["duplicates"] += 1
+                continue
+            event_type = event.get("eventType")
+            payload = event.get("payload") or {}
+            item_id = payload.get("itemId")
+            version = event.get("version")
+            if event_type not in HANDLED_EVENTS or not item_id or version is None:
+                counts["skipped"] += 1
+                continue
+            if event_id is not None:
+                batch_ids.add(event_id)
+            version = int(version)
+            current = latest.get(item_id)
+            if current is not None:
+                counts["collapsed"] += 1
+                if current[0] >= version:
+                    continue
+            latest[item_id] = (version, event_type, payload)
+
+        if latest:
+            with self.store.batch() as tx:
+                stored = tx.current(list(latest))
+                rows: List[ReadItem] = []
+                deltas: Dict[_Key, List[int]] = {}
+                for item_id, (version, event_type, payload) in latest.items():
+                    old = stored.get(item_id)
+                    if old is not None and old.version >= version:
+                        counts["stale"] += 1
+                        continue
+                    new = _read_item(item_id, version, event_type, payload)
+                    _count(deltas, old, -1)
+                    _count(deltas, new, +1)
+                    rows.append(new)
+                tx.write(rows, {k: d for k, d in deltas.items() if d != [0, 0]})
+            counts["applied"] = len(rows)
+            counts["batches"] = 1
+        self._remember(batch_ids)
+
+        for k, v in counts.items():
+            self.stats[k] += v
+        return counts
+
+    def _remember(self, event_ids: Iterable[str]) -> None:
+        with self._seen_lock:
+            for event_id in event_ids:
+                self._seen[event_id] = None
+            while len(self._seen) > self.seen_capacity:
+                self._seen.popitem(last=False)
+
+
+class MemoryStore:
+    """Read model in process memory (replay harness, local runs)."""
+
+    def __init__(self):
+        self.items: Dict[str, ReadItem] = {}
+        self.counts: Dict[_Key, List[int]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def batch(self) -> Iterator["MemoryStore"]:
+        with self._lock:
+            yield self
+
+    def current(self, item_ids: List[str]) -> Dict[str, ReadItem]:
+        items = self.items
+        return {i: items[i] for i in item_ids if i in items}
+
+    def write(self, rows: List[ReadItem], deltas: Dict[_Key, List[int]]) -> None:
+        for row in rows:
+            self.items[row.item_id] = row
+        for key, (n, active) in deltas.items():
+            c = self.counts.setdefault(key, [0, 0])
+            c[0] += n
+            c[1] += active
+            if c == [0, 0]:
+                del self.counts[key]
+
+
+class MySQLStore:
+    """
+    Read model in ``catalog_read_items`` / ``catalog_read_counts`` (see the
+    service's schema.sql).  One connection per function instance, reused
+    across invocations and reopened after errors.
+    """
+
+    def __init__(self, connect: Callable[[], object]):
+        self._connect = connect
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def batch(self) -> Iterator["_MySQLBatch"]:
+        with self._lock:
+            if self._conn is None or not self._conn.is_connected():
+                self._conn = self._connect()
+            conn = self._conn
+            cur = conn.cursor(dictionary=True)
+            try:
+                conn.start_transaction()
+                yield _MySQLBatch(cur)
+                conn.commit()
+            except BaseException:
+                try:
+                    conn.rollback()
+                except Exception:
+                    self._conn = None
+                raise
+            finally:
+                cur.close()
+
+
+class _MySQLBatch:
+    def __init__(self, cur):
+        self.cur = cur
+
+    def current(self, item_ids: List[str]) -> Dict[str, ReadItem]:
+        # Locks the rows (and gaps of new ids) so concurrent instances
+        # serialize per item and count deltas stay exact.
+        self.cur.execute(
+            "SELECT item_id, version, deleted, brand, category, status FROM catalog_read_items "
+            f"WHERE item_id IN ({','.join(['%s'] * len(item_ids))}) FOR UPDATE",
+            item_ids,
+        )
+        return {
+            r["item_id"]: ReadItem(r["item_id"], r["version"], bool(r["deleted"]),
+                                   r["brand"], r["category"], r["status"], None)
+            for r in self.cur.fetchall()
+        }
+
+    def write(self, rows: List[ReadItem], deltas: Dict[_Key, List[int]]) -> None:
+        if rows:
+            self.cur.executemany(
+                "INSERT INTO catalog_read_items "
+                "(item_id, version, deleted, brand, category, status, doc_json) "
+                "VALUES (%s,%s,%s,%s,%s,%s,%s) "
+                "ON DUPLICATE KEY UPDATE version=VALUES(version), deleted=VALUES(deleted), "
+                "brand=VALUES(brand), category=VALUES(category), status=VALUES(status), "
+                "doc_json=VALUES(doc_json), projected_at=CURRENT_TIMESTAMP",
+                [
+                    (r.item_id, r.version, int(r.deleted), r.brand, r.category, r.status,
+                     json.dumps(r.doc) if r.doc is not None else None)
+                    for r in rows
+                ],
+            )
+        if deltas:
+            # Sorted so concurrent batches lock count rows in the same order.
+            self.cur.executemany(
+                "INSERT INTO catalog_read_counts (brand, category, items, active) "
+                "VALUES (%s,%s,%s,%s) "
+                "ON DUPLICATE KEY UPDATE items=items+VALUES(items), active=active+VALUES(active)",
+                [(brand, category, n, active) for (brand, category), (n, active) in sorted(deltas.items())],
+            )
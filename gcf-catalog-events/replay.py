@@ -0,0 +1,204 @@
+"""
+Local replay harness for the catalog event projector.
+
+    python gcf-catalog-events/replay.py [--events 100000] [--batch 500]
+        [--record events.ndjson | --save events.ndjson] [--store memory|mysql] [--rtt-ms 0.5]
+
+Pushes recorded events (NDJSON, one published message body per line) or a
+generated stream through the function entry points, once message by
+message (``handle_catalog_event``) and once in batches
+(``handle_catalog_events``), and reports events/sec for each.  The
+generated stream redelivers a share of events and shuffles delivery
+order within a window, like Pub/Sub does; the final read model is checked
+against the newest version of every item.  ``--store mysql`` projects
+into the DB_* database (empty the catalog_read_* tables between runs);
+``--rtt-ms`` adds a simulated round trip per statement to the memory store.
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import logging
+import random
+import sys
+import time
+import uuid
+from typing import Dict, List
+
+import main as function
+from projector import MemoryStore, MySQLStore, Projector
+
+BRANDS = ["Prada", "Gucci", "Dior", "Chanel", "Zara", "Fendi", "Celine", "Loewe"]
+CATEGORIES = ["handbag", "dress", "shoes", "coat", "jewelry"]
+
+
+def generate(n: int, items: int, seed: int) -> List[Dict]:
+    """Events as the outbox relay publishes them, in commit (version) order."""
+    rnd = random.Random(seed)
+    events: List[Dict] = []
+    live: Dict[str, Dict] = {}
+    live_ids: List[str] = []
+    next_id = 0
+    for version in range(1, n + 1):
+        roll = rnd.random()
+        if not live or (len(live) < items and roll < 0.3):
+            item_id = f"it-{next_id:08x}"
+            next_id += 1
+            payload = {
+                "itemId": item_id, "sku": f"SKU-{next_id}", "name": f"Item {next_id}",
+                "brand": rnd.choice(BRANDS), "category": rnd.choice(CATEGORIES), "status": "active",
+                "rent_price_cents": rnd.randint(1000, 200000), "deposit_cents": 50000, "attrs": {},
+            }
+            live[item_id] = payload
+            live_ids.append(item_id)
+            event_type = "CatalogItemCreated"
+        else:
+            k = rnd.randrange(len(live_ids))
+            item_id = live_ids[k]
+            if roll < 0.95:
+                payload = dict(live[item_id], brand=rnd.choice(BRANDS),
+                               status=rnd.choice(("active", "active", "inactive")),
+                               rent_price_cents=rnd.randint(1000, 200000))
+                live[item_id] = payload
+                event_type = "CatalogItemUpdated"
+            else:
+                payload = {"itemId": item_id}
+                del live[item_id]
+                live_ids[k] = live_ids[-1]
+                live_ids.pop()
+                event_type = "CatalogItemDeleted"
+        events.append({"eventId": uuid.UUID(int=rnd.getrandbits(128)).hex,
+                       "eventType": event_type, "version": version, "payload": payload})
+    return events
+
+
+def deliver(events: List[Dict], duplicates: float, window: int, seed: int) -> List[Dict]:
+    """At-least-once, loosely ordered delivery of ``events``."""
+    rnd = random.Random(seed)
+    # Each delivery gets a position near its publish order; redeliveries
+    # land later, as after an ack deadline expires.
+    slots = []
+    for i, e in enumerate(events):
+        slots.append((i + rnd.uniform(0, window), e))
+        if rnd.random() < duplicates:
+            slots.append((i + rnd.uniform(window, 10 * window), e))
+    slots.sort(key=lambda s: s[0])
+    return [e for _, e in slots]
+
+
+def expected_state(events: List[Dict]):
+    items: Dict[str, Dict] = {}
+    for e in sorted(events, key=lambda e: e["version"]):
+        items[e["payload"]["itemId"]] = e
+    counts: Dict = {}
+    for e in items.values():
+        if e["eventType"] == "CatalogItemDeleted":
+            continue
+        p = e["payload"]
+        c = counts.setdefault((p["brand"], p["category"]), [0, 0])
+        c[0] += 1
+        c[1] += p["status"] == "active"
+    return items, counts
+
+
+def verify(store: MemoryStore, events: List[Dict]) -> List[str]:
+    items, counts = expected_state(events)
+    problems = []
+    for item_id, e in items.items():
+        got = store.items.get(item_id)
+        deleted = e["eventType"] == "CatalogItemDeleted"
+        if got is None or got.version != e["version"] or got.deleted != deleted \
+                or (not deleted and got.doc != e["payload"]):
+            problems.append(f"item {item_id}: expected v{e['version']}, got {got and got.version}")
+    if store.counts != counts:
+        problems.append("brand/category counts differ from a recount")
+    return problems
+
+
+class RoundTripStore(MemoryStore):
+    """MemoryStore that sleeps ``rtt`` per statement, like a remote database."""
+
+    def __init__(self, rtt: float):
+        super().__init__()
+        self.rtt = rtt
+
+    def current(self, item_ids):
+        time.sleep(self.rtt)
+        return super().current(item_ids)
+
+    def write(self, rows, deltas):
+        time.sleep(self.rtt * (bool(rows) + bool(deltas) + 1))  # + commit
+        super().write(rows, deltas)
+
+
+def envelope(message: Dict) -> Dict:
+    return {
+        "data": base64.b64encode(json.dumps(message).encode("utf-8")).decode("ascii"),
+        "attributes": {"eventId": message["eventId"], "version": str(message["version"])},
+    }
+
+
+def run(name: str, store, envelopes: List[Dict], batch: int) -> Projector:
+    function.projector = Projector(store)
+    t0 = time.perf_counter()
+    if batch <= 1:
+        for env in envelopes:
+            function.handle_catalog_event(env, None)
+    else:
+        for start in range(0, len(envelopes), batch):
+            function.handle_catalog_events(envelopes[start:start + batch])
+    elapsed = time.perf_counter() - t0
+    stats = function.projector.stats
+    print(f"{name:<10} {len(envelopes):>7} events in {elapsed:6.2f}s = {len(envelopes) / elapsed:>9,.0f} events/s  "
+          f"applied={stats['applied']} duplicates={stats['duplicates']} "
+          f"collapsed={stats['collapsed']} stale={stats['stale']} writes={stats['batches']}")
+    return function.projector
+
+
+def main_() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=100_000)
+    ap.add_argument("--items", type=int, default=20_000)
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--duplicates", type=float, default=0.05)
+    ap.add_argument("--window", type=int, default=200, help="delivery reordering window")
+    ap.add_argument("--record", help="replay this NDJSON file instead of generating")
+    ap.add_argument("--save", help="write the generated events to this NDJSON file")
+    ap.add_argument("--store", choices=("memory", "mysql"), default="memory")
+    ap.add_argument("--rtt-ms", type=float, default=0.0,
+                    help="simulated database round trip for the memory store")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    logging.disable(logging.INFO)
+
+    if args.record:
+        with open(args.record) as f:
+            delivered = [json.loads(line) for line in f if line.strip()]
+        events = list({e["eventId"]: e for e in delivered}.values())
+    else:
+        events = generate(args.events, args.items, args.seed)
+        if args.save:
+            with open(args.save, "w") as f:
+                f.writelines(json.dumps(e) + "\n" for e in events)
+        delivered = deliver(events, args.duplicates, args.window, args.seed)
+    envelopes = [envelope(m) for m in delivered]
+
+    def store():
+        if args.store == "mysql":
+            return MySQLStore(function._connect)
+        return RoundTripStore(args.rtt_ms / 1000) if args.rtt_ms else MemoryStore()
+
+    failures = []
+    for name, batch in (("single", 1), (f"batch={args.batch}", args.batch)):
+        s = store()
+        run(name, s, envelopes, batch)
+        if isinstance(s, MemoryStore):
+            failures += [f"{name}: {p}" for p in verify(s, events)[:5]]
+    for f in failures:
+        print("FAIL:", f)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
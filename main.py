@@ -1,21 +1,52 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import json
+import logging
 import os
+import random
 import socket
-from datetime import datetime, date
-from typing import Dict, List, Optional
-from utils.pubsub_client import publish_event
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, date, timedelta, timezone
+from typing import Dict, List, Literal, Optional, Tuple, Union
+from utils.pubsub_client import (
+    publish_message,
+    subscribe_events,
+    unsubscribe_events,
+)
 
 
-from fastapi import FastAPI, HTTPException, Query, Path, Header, Response
+from fastapi import FastAPI, HTTPException, Query, Path, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 import mysql.connector
-
-from models.item import Item, ItemCreate, ItemUpdate, PagedItems
+import pydantic_core
+from pydantic import BaseModel, ValidationError
+
+from models.item import (
+    BulkItemResult,
+    BulkItemsRequest,
+    BulkItemsResponse,
+    ImportProblem,
+    Item,
+    ItemBatchGetRequest,
+    ItemBatchGetResponse,
+    ItemCreate,
+    ItemFields,
+    ItemImportResponse,
+    ItemUpdate,
+    PagedItemFields,
+    PagedItems,
+    SearchResults,
+)
+from models.changes import CatalogChanges
+from models.facets import CatalogFacets
 from models.physical_item import PagedPhysicalItems
-from models.availability import Availability
+from models.availability import Availability, AvailabilityBatchRequest
 from models.reservation import (
     Reservation,
     ReservationRequest,
@@ -23,7 +54,29 @@ from models.reservation import (
     PagedReservations,
 )
 
-from database import query_all, query_one, execute
+from database import query_all, stream_rows, transaction
+import async_database
+import database
+from async_database import PoolError
+from middleware.consistency import ConsistencyMiddleware
+from middleware.metrics import REGISTRY, MetricsMiddleware
+from services.availability import EPOCH, availability_index
+from services.count_cache import count_cache, scope_of
+from services.attr_index import ATTR_KEY, INDEXED_ATTRS, attr_index
+from services.facets import facet_index
+from services.item_cache import item_cache
+from services.outbox import OutboxRelay, enqueue
+from services.reindexer import Reindexer
+from services.search_index import search_index
+from services.reservations import (
+    RESERVATION_EVENTS,
+    NoUnitAvailable,
+    ReservationConflict,
+    ReservationNotFound,
+    reservation_service,
+)
+from utils.ndjson import gzip_stream, iter_lines
+from utils.slow_query_log import slow_query_log
 
 
 # ---------------------------------------------------------------------------
@@ -32,6 +85,29 @@ from database import query_all, query_one, execute
 
 port = int(os.getenv("PORT", "8000"))
 NOT_IMPL = HTTPException(status_code=501, detail="Not implemented")
+BULK_MAX_ITEMS = int(os.getenv("CATALOG_BULK_MAX_ITEMS", "5000"))
+BULK_CHUNK_SIZE = int(os.getenv("CATALOG_BULK_CHUNK_SIZE", "500"))
+# Re-runs of a bulk transaction InnoDB aborted on a deadlock (1213) or a
+# lock wait timeout (1205), e.g. two bulk creates gap-locking the same SKUs.
+BULK_LOCK_RETRIES = int(os.getenv("CATALOG_BULK_LOCK_RETRIES", "3"))
+_LOCK_ERRNOS = (1213, 1205)
+# Items serialized per chunk written to an export stream.
+EXPORT_CHUNK_ITEMS = int(os.getenv("CATALOG_EXPORT_CHUNK_ITEMS", "500"))
+IMPORT_MAX_PROBLEMS = 100
+# Distinct SKUs an import remembers to report duplicate lines (at least one chunk).
+IMPORT_DEDUPE_SKUS = max(int(os.getenv("CATALOG_IMPORT_DEDUPE_SKUS", "100000")), BULK_CHUNK_SIZE)
+# Keys per IN (...) list in a batch get.
+BATCH_GET_CHUNK_SIZE = int(os.getenv("CATALOG_BATCH_GET_CHUNK_SIZE", "500"))
+# Listing totals: filter sets matching up to this many rows (before
+# attribute filters) are counted exactly in SQL; larger ones are estimated.
+COUNT_EXACT_LIMIT = int(os.getenv("CATALOG_COUNT_EXACT_LIMIT", "10000"))
+# GET /catalog/changes only serves changes at least this old, so a write
+# whose timestamp was taken before a slower transaction committed is not
+# skipped by a cursor that already moved past it.  Covers commit latency
+# and clock skew between instances.
+CHANGES_SETTLE_SECONDS = int(os.getenv("CATALOG_CHANGES_SETTLE_SECONDS", "5"))
+CHANGES_MAX_PAGE_SIZE = 1000
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("CATALOG_TOMBSTONE_RETENTION_DAYS", "30"))
 
 app = FastAPI(
     title="Catalog & Inventory Service (MS2)",
@@ -50,28 +126,451 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"], 
+    expose_headers=[database.CONSISTENCY_HEADER],
 )
+app.add_middleware(ConsistencyMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.on_event("startup")
+def _start_replica_checks():
+    database.replicas.start()
+
+
+@app.on_event("shutdown")
+def _stop_replica_checks():
+    database.replicas.stop()
+
+
+def _primary_query_all(sql: str, params=None) -> List[Dict]:
+    with database.on_primary():
+        return query_all(sql, params)
+
+
+@app.on_event("startup")
+def _load_availability_index():
+    # A missing inventory schema must not take the catalog API down with it;
+    # /availability answers 503 until the index has been loaded (the
+    # reconciler retries).  Bookings are applied incrementally from here on,
+    # from local writes and other instances' reservation events.
+    try:
+        availability_index.load(_primary_query_all)
+    except Exception as e:
+        logging.warning(f"Availability index not loaded: {e}")
+    availability_index.start_reconciler(_primary_query_all)
+
+
+@app.on_event("shutdown")
+def _stop_availability_reconciler():
+    availability_index.stop_reconciler()
+
+
+@app.exception_handler(PoolError)
+@app.exception_handler(database.PoolError)
+async def _pool_error_handler(request, exc: Exception):
+    # Every connection busy and the wait queue full / timed out: shed load.
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Database busy: {exc}"},
+        headers={"Retry-After": "1"},
+    )
+
+
+def _search_rows():
+    return stream_rows("SELECT * FROM catalog_items")
+
+
+def _attr_rows():
+    return stream_rows("SELECT id, attrs_json FROM catalog_items")
+
+
+@app.on_event("startup")
+def _load_search_index():
+    # Streamed so a large catalog is never held in memory as one result set;
+    # /catalog/search answers 503 until this has run (or the reconciler has).
+    try:
+        n = search_index.load(_search_rows())
+        logging.info(f"Search index loaded: {n} items")
+    except Exception as e:
+        logging.warning(f"Search index not loaded: {e}")
+    search_index.start_reconciler(_search_rows)
+
+
+@app.on_event("startup")
+def _load_attr_index():
+    # Until loaded, long-tail attr.<key> filters are evaluated in SQL.
+    try:
+        attr_index.load(_attr_rows())
+    except Exception as e:
+        logging.warning(f"Attribute index not loaded: {e}")
+    attr_index.start_reconciler(_attr_rows)
+
+
+@app.on_event("shutdown")
+def _stop_index_reconcilers():
+    search_index.stop_reconciler()
+    attr_index.stop_reconciler()
+
+
+def _facet_rows():
+    return stream_rows("SELECT id, category, brand, status, rent_price_cents FROM catalog_items")
+
+
+@app.on_event("startup")
+def _load_facets():
+    # /catalog/facets answers 503 until loaded; the reconciler retries anyway.
+    try:
+        facet_index.load(_facet_rows())
+    except Exception as e:
+        logging.warning(f"Facet counts not loaded: {e}")
+    facet_index.start_reconciler(_facet_rows)
+
+
+@app.on_event("shutdown")
+def _stop_facet_reconciler():
+    facet_index.stop_reconciler()
+
+
+def _index_item(row: Dict) -> None:
+    """A catalog_items row was written: update the in-process indexes."""
+    previous = facet_index.group_of(row["id"])
+    search_index.upsert(row)
+    facet_index.upsert(row)
+    attr_index.upsert(row)
+    # Bumped only once the indexes hold the write: a total computed from
+    # them before this point is stamped with the old generation and dropped.
+    if previous and previous != (row["category"], row["brand"]):
+        count_cache.bump(*previous)
+    count_cache.bump(row["category"], row["brand"])
+
+
+def _unindex_item(item_id: str) -> None:
+    previous = facet_index.group_of(item_id)
+    search_index.remove(item_id)
+    facet_index.remove(item_id)
+    attr_index.remove(item_id)
+    count_cache.bump(*(previous or ()))
+
+
+def _fetch_items(ids: List[str]) -> List[Dict]:
+    with database.on_primary():
+        return query_all(
+            f"SELECT * FROM catalog_items WHERE id IN ({', '.join(['%s'] * len(ids))})", ids
+        )
+
+
+def _reindex_item(item_id: str, row: Optional[Dict]) -> None:
+    if row:
+        _index_item(row)
+    else:
+        _unindex_item(item_id)
+
+
+reindexer = Reindexer(_fetch_items, _reindex_item)
+
+
+def _on_catalog_event(event_type: str, payload: Dict) -> None:
+    """
+    Catalog writes on other instances: drop our cached copy, re-index.
+    Raises if the item could not be re-read, so the event is redelivered.
+    """
+    if event_type in RESERVATION_EVENTS:
+        availability_index.apply_event(payload)
+        return
+    item_id = payload.get("itemId")
+    if not item_id:
+        return
+    item_cache.invalidate(item_id)
+    if event_type == "CatalogItemDeleted":
+        _unindex_item(item_id)
+    elif event_type in ("CatalogItemCreated", "CatalogItemUpdated"):
+        # Payloads lack the description the search index needs, and may
+        # arrive out of order: read the row as committed, batched with the
+        # other callbacks' reads.
+        reindexer.reindex(item_id)
+
+
+@app.on_event("startup")
+def _subscribe_catalog_events():
+    reindexer.start()
+    try:
+        subscribe_events(_on_catalog_event)
+    except Exception as e:
+        logging.warning(f"Catalog event subscription failed; relying on cache TTL: {e}")
+
+
+@app.on_event("shutdown")
+def _unsubscribe_catalog_events():
+    unsubscribe_events()
+    reindexer.stop()
 
 # ---------------------------------------------------------------------------
 # Helper functions
 # ---------------------------------------------------------------------------
 
 
-def _encode_token(last_id: Optional[str]) -> Optional[str]:
-    if not last_id:
-        return None
-    return base64.urlsafe_b64encode(last_id.encode("utf-8")).decode("ascii")
+# sort option -> (column, descending).  Ties break on id in the same
+# direction, so (column, id) is a strict total order the cursor can resume
+# from; schema.sql has a (filter, column, id) index for each option.
+SORT_OPTIONS: Dict[str, Tuple[str, bool]] = {
+    "id": ("id", False),
+    "price_asc": ("rent_price_cents", False),
+    "price_desc": ("rent_price_cents", True),
+    "newest": ("created_at", True),
+    "brand": ("brand", False),
+}
+SortOption = Literal["id", "price_asc", "price_desc", "newest", "brand"]
 
 
-def _decode_token(token: Optional[str]) -> Optional[str]:
+def _encode_token(last_id: Optional[str], sort: str = "id", last_value=None,
+                  page: Optional[int] = None) -> Optional[str]:
+    """Cursor for the row after (last_value, last_id) in ``sort`` order;
+    ``page`` is the number of the page it leads to."""
+    if not last_id:
+        return None
+    if sort == "id" and page is None:
+        # The original token format: the bare last id.
+        raw = last_id
+    else:
+        data = {"s": sort, "k": [last_value, last_id]}
+        if page is not None:
+            data["p"] = page
+        raw = json.dumps(data, default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_token(token: Optional[str]) -> Optional[Tuple[str, object, str, Optional[int]]]:
+    """``(sort, last_value, last_id, page)``, or None for a missing/garbled
+    token.  ``page`` is None for tokens issued before page numbers."""
     if not token:
         return None
     try:
-        return base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8")
+        raw = base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8")
+        if not raw.startswith("{"):
+            return "id", None, raw, None
+        data = json.loads(raw)
+        last_value, last_id = data["k"]
+        page = data.get("p")
+        return data["s"], last_value, last_id, page if isinstance(page, int) and page > 1 else None
     except Exception:
         return None
 
 
+def _sort_order(sort: str) -> str:
+    column, desc = SORT_OPTIONS[sort]
+    direction = " DESC" if desc else ""
+    if column == "id":
+        return f"ORDER BY id{direction}"
+    return f"ORDER BY {column}{direction}, id{direction}"
+
+
+def _keyset_clause(sort: str, last_value, last_id: str) -> Tuple[str, List]:
+    """
+    WHERE clause for rows strictly after the cursor.  A row comparison
+    ``(col, id) > (v, x)`` is a single seek into the (col, id) index, even
+    when many rows share v (a brand sort has a handful of distinct values).
+    """
+    column, desc = SORT_OPTIONS[sort]
+    op = "<" if desc else ">"
+    if column == "id":
+        return f"id {op} %s", [last_id]
+    if column == "created_at" and isinstance(last_value, str):
+        last_value = datetime.fromisoformat(last_value)
+    return f"({column}, id) {op} (%s, %s)", [last_value, last_id]
+
+
+def _attr_clauses(request: Request) -> Tuple[Dict[str, str], List[str], List]:
+    """
+    ``attr.<key>=<value>`` query parameters -> (filters, WHERE clauses,
+    params).  Hot keys hit their indexed generated column; the rest are
+    resolved to primary keys through the posting lists, or evaluated on
+    the JSON column if they match too many items to list.
+    """
+    filters = {k[len("attr."):]: v for k, v in request.query_params.items() if k.startswith("attr.")}
+    clauses: List[str] = []
+    params: List = []
+    tail = {}
+    for key, value in filters.items():
+        if not ATTR_KEY.match(key):
+            raise HTTPException(status_code=400, detail=f"Invalid attribute name '{key}'")
+        if key in INDEXED_ATTRS:
+            clauses.append(f"attr_{key} = %s")
+            params.append(value.lower())
+        else:
+            tail[key] = value
+    if tail:
+        ids = attr_index.candidates(tail)
+        if ids is None:
+            for key, value in tail.items():
+                # key is validated above; JSON paths cannot be parameters.
+                # Quoted, since a member starting with a digit ("1size")
+                # is not a valid bare path member on MySQL.
+                clauses.append(f"LOWER(attrs_json->>'$.\"{key}\"') = %s")
+                params.append(value.lower())
+        elif not ids:
+            clauses.append("1 = 0")
+        else:
+            clauses.append(f"id IN ({','.join(['%s'] * len(ids))})")
+            params.extend(ids)
+    return filters, clauses, params
+
+
+async def _catalog_total(
+    category: Optional[str],
+    brand: Optional[str],
+    status: Optional[str],
+    min_price: Optional[int],
+    max_price: Optional[int],
+    attr_filters: Dict[str, str],
+    base_where: List[str],
+    base_params: List,
+    attr_where: List[str],
+    attr_params: List,
+) -> Tuple[Optional[int], bool]:
+    """
+    (total, approximate) for a list filter set, through ``count_cache``.
+
+    Without attribute filters the facet index counts exactly, in memory.
+    With them, up to COUNT_EXACT_LIMIT rows matching the other filters are
+    scanned in SQL, counting those that also match the attributes: exact
+    if that was all of them, else the facet count scaled by the match rate
+    of the scanned rows (approximate).  None when neither is possible.
+    """
+    key = (category, brand, status, min_price, max_price,
+           tuple(sorted((k, v.lower()) for k, v in attr_filters.items())))
+    cached = count_cache.get(key)
+    if cached is not None:
+        return cached
+    scope = scope_of(category, brand)
+    generation = count_cache.generation(scope)
+
+    if not attr_filters and facet_index.loaded:
+        result = facet_index.count(category, brand, status, min_price, max_price), False
+    else:
+        columns = ", ".join(["id", "attrs_json"] + [f"attr_{k}" for k in INDEXED_ATTRS])
+        where_sql = "WHERE " + " AND ".join(base_where) if base_where else ""
+        with database.read_after(count_cache.written_at(scope)):
+            row = await async_database.query_one(
+                "SELECT COUNT(*) AS scanned, "
+                f"COALESCE(SUM(CASE WHEN {' AND '.join(attr_where) or '1 = 1'} THEN 1 ELSE 0 END), 0) AS matched "
+                f"FROM (SELECT {columns} FROM catalog_items {where_sql} LIMIT %s) AS s",
+                list(attr_params) + list(base_params) + [COUNT_EXACT_LIMIT],
+            )
+        scanned, matched = int(row["scanned"]), int(row["matched"])
+        if scanned < COUNT_EXACT_LIMIT:
+            result = matched, False
+        elif facet_index.loaded:
+            base_total = facet_index.count(category, brand, status, min_price, max_price)
+            result = round(base_total * matched / scanned), True
+        else:
+            result = None, False
+    count_cache.put(key, scope, generation, *result)
+    return result
+
+
+def _db_now() -> datetime:
+    """Timestamp written explicitly by write paths, at TIMESTAMP precision, so
+    the response can be built without reading the row back."""
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def _etag(id: str, row: Dict) -> str:
+    """Weak ETag from the row's last modification (or creation) time."""
+    updated = row.get("updated_at") or row.get("created_at")
+    ts = int(updated.timestamp()) if isinstance(updated, datetime) else 0
+    return f'W/"{id}-{ts}"'
+
+
+def _page_etag(filters: Dict, rows: List[Dict], has_more: bool) -> str:
+    """
+    Weak ETag for a list page: the filter set and cursor, plus the ids and
+    newest modification time of the rows on the page.  Only needs the
+    id/updated_at/created_at columns, so it can come from a version query.
+    """
+    newest = 0
+    for r in rows:
+        updated = r.get("updated_at") or r.get("created_at")
+        if isinstance(updated, datetime):
+            newest = max(newest, int(updated.timestamp()))
+    key = json.dumps(
+        [filters, [r["id"] for r in rows], newest, has_more],
+        sort_keys=True,
+        default=str,
+    )
+    return f'W/"p-{hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]}"'
+
+
+def _purge_tombstones() -> None:
+    """Drop delete tombstones older than the change feed's retention."""
+    cutoff = _db_now() - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    with transaction() as cur:
+        cur.execute("DELETE FROM catalog_item_tombstones WHERE deleted_at < %s", (cutoff,))
+
+
+outbox_relay = OutboxRelay(publish_message, housekeeping=_purge_tombstones)
+reservation_service.notify = outbox_relay.notify
+
+
+@app.on_event("startup")
+def _start_outbox_relay():
+    outbox_relay.start()
+
+
+@app.on_event("shutdown")
+def _stop_outbox_relay():
+    outbox_relay.stop()
+
+
+_INSERT_ITEM_COLUMNS = (
+    "id", "sku", "name", "brand", "category", "description", "photos_json",
+    "rent_price_cents", "deposit_cents", "attrs_json", "status", "created_at",
+)
+_INSERT_ITEM_SQL = (
+    "INSERT INTO catalog_items "
+    "(id, sku, name, brand, category, description, "
+    " photos_json, rent_price_cents, deposit_cents, attrs_json, status, created_at) "
+    "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
+)
+
+
+def _new_item_row(body: ItemCreate, now: datetime) -> Dict:
+    """DB row for a new item, with a fresh id; same shape as SELECT *."""
+    return {
+        "id": f"it-{os.urandom(4).hex()}",
+        "sku": body.sku,
+        "name": body.name,
+        "brand": body.brand,
+        "category": body.category,
+        "description": body.description,
+        "photos_json": json.dumps(body.photos or []),
+        "rent_price_cents": body.rent_price_cents,
+        "deposit_cents": body.deposit_cents,
+        "attrs_json": json.dumps(body.attrs or {}),
+        "status": "active",
+        "created_at": now,
+        "updated_at": None,
+    }
+
+
+def _item_payload(row: Dict) -> Dict:
+    """
+    Event payload for a created/updated item: its state as committed, so
+    consumers (gcf-catalog-events) can project it without reading MySQL.
+    """
+    attrs = row.get("attrs_json")
+    return {
+        "itemId": row["id"],
+        "sku": row["sku"],
+        "name": row["name"],
+        "brand": row["brand"],
+        "category": row["category"],
+        "status": row.get("status") or "active",
+        "rent_price_cents": row["rent_price_cents"],
+        "deposit_cents": row["deposit_cents"],
+        "attrs": json.loads(attrs) if isinstance(attrs, str) and attrs else (attrs or {}),
+    }
+
+
 def _row_to_item(row: Dict) -> Item:
     """Convert a DB row (dict) into an Item model."""
     photos = json.loads(row["photos_json"]) if row.get("photos_json") else []
@@ -92,13 +591,121 @@ def _row_to_item(row: Dict) -> Item:
         created_at=row.get("created_at"),
         updated_at=row.get("updated_at"),
     )
-    item.links = {
-        "self": f"/catalog/items/{item.id}",
-        "rentals": f"/orders?itemId={item.id}",
-    }
+    item.links = _item_links(item.id)
     return item
 
 
+def _item_document(row: Dict) -> Dict:
+    """
+    The JSON document of ``_row_to_item(row)`` as a plain dict, in Item
+    field order with the ``_links`` alias, for rows read from catalog_items
+    (every column already went through ItemCreate/ItemUpdate on the way in).
+    Skips building and validating a model per row; untrusted input
+    (imports) must keep using ``_row_to_item``.
+    """
+    id = row["id"]
+    return {
+        "sku": row["sku"],
+        "name": row["name"],
+        "brand": row["brand"],
+        "category": row["category"],
+        "description": row.get("description"),
+        "photos": json.loads(row["photos_json"]) if row.get("photos_json") else [],
+        "rent_price_cents": row["rent_price_cents"],
+        "deposit_cents": row["deposit_cents"],
+        "attrs": json.loads(row["attrs_json"]) if row.get("attrs_json") else {},
+        "id": id,
+        "status": row["status"],
+        "created_at": row.get("created_at"),
+        "updated_at": row.get("updated_at"),
+        "_links": _item_links(id),
+    }
+
+
+def _json_response(content, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Render a response model, or a dict already shaped like one, straight to
+    JSON bytes with pydantic-core, skipping FastAPI's dump / re-validate /
+    json.dumps pass through ``response_model``.  Output is byte-identical
+    to that path (benchmarks/bench_serialization.py checks it).
+    """
+    if isinstance(content, BaseModel):
+        body = content.model_dump_json(by_alias=True)
+    else:
+        body = pydantic_core.to_json(content)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _item_links(id: str) -> Dict[str, str]:
+    return {
+        "self": f"/catalog/items/{id}",
+        "rentals": f"/orders?itemId={id}",
+    }
+
+
+# API field -> catalog_items column it is read from, for ?fields=.
+_ITEM_FIELD_COLUMNS = {
+    "id": "id",
+    "sku": "sku",
+    "name": "name",
+    "brand": "brand",
+    "category": "category",
+    "description": "description",
+    "photos": "photos_json",
+    "rent_price_cents": "rent_price_cents",
+    "deposit_cents": "deposit_cents",
+    "attrs": "attrs_json",
+    "status": "status",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "_links": "id",
+}
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """``?fields=id,name,photos`` -> field names, or None for the full Item."""
+    if not fields:
+        return None
+    names = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [n for n in names if n not in _ITEM_FIELD_COLUMNS]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields {unknown}; choose from {sorted(_ITEM_FIELD_COLUMNS)}",
+        )
+    return names
+
+
+def _select_list(fields: Optional[Tuple[str, ...]], *always: str) -> str:
+    """Column list for ``fields`` plus the columns the handler itself needs."""
+    if fields is None:
+        return "*"
+    columns = dict.fromkeys((*always, *(_ITEM_FIELD_COLUMNS[f] for f in fields)))
+    return ", ".join(columns)
+
+
+def _row_to_fields(row: Dict, fields: Tuple[str, ...]) -> Dict:
+    """
+    Sparse Item (``models.item.ItemFields``) from a narrowed row, with only
+    the requested keys; JSON columns are decoded only if asked for.
+    """
+    values = {}
+    for f in fields:
+        if f == "photos":
+            values[f] = json.loads(row["photos_json"]) if row.get("photos_json") else []
+        elif f == "attrs":
+            values[f] = json.loads(row["attrs_json"]) if row.get("attrs_json") else {}
+        elif f == "_links":
+            values[f] = _item_links(row["id"])
+        else:
+            values[f] = row[f]
+    return values
+
+
+def _item_to_fields(item: Item, fields: Tuple[str, ...]) -> Dict:
+    return {f: getattr(item, "links" if f == "_links" else f) for f in fields}
+
+
 # ---------------------------------------------------------------------------
 # Catalog API – /catalog/items
 # ---------------------------------------------------------------------------
@@ -114,29 +721,13 @@ def create_catalog_item(body: ItemCreate, response: Response):
     * Location header = /catalog/items/{id}
     * body = Item（带 _links）
     """
-    new_id = f"it-{os.urandom(4).hex()}"
-
-    sql = (
-        "INSERT INTO catalog_items "
-        "(id, sku, name, brand, category, description, "
-        " photos_json, rent_price_cents, deposit_cents, attrs_json, status) "
-        "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
-    )
-    params = (
-        new_id,
-        body.sku,
-        body.name,
-        body.brand,
-        body.category,
-        body.description,
-        json.dumps(body.photos or []),
-        body.rent_price_cents,
-        body.deposit_cents,
-        json.dumps(body.attrs or {}),
-        "active",
-    )
+    row = _new_item_row(body, _db_now())
+    params = tuple(row[c] for c in _INSERT_ITEM_COLUMNS)
     try:
-        execute(sql, params)
+        # The event commits with the row (transactional outbox).
+        with transaction() as cur:
+            cur.execute(_INSERT_ITEM_SQL, params)
+            enqueue(cur, [("CatalogItemCreated", _item_payload(row))])
     except mysql.connector.errors.IntegrityError as e:
         # Check if it's a duplicate key error (SKU already exists)
         if "Duplicate entry" in str(e) and "sku" in str(e).lower():
@@ -150,35 +741,368 @@ def create_catalog_item(body: ItemCreate, response: Response):
             detail=f"Database constraint violation: {str(e)}"
         )
 
-    row = query_one("SELECT * FROM catalog_items WHERE id=%s", (new_id,))
-    if not row:
-        raise HTTPException(status_code=500, detail="Failed to load created item")
-
+    # No read-back: the response is built from what was just written.
     item = _row_to_item(row)
     response.headers["Location"] = f"/catalog/items/{item.id}"
-    try:
-        publish_event(
-            event_type="CatalogItemCreated",
-            payload={
-                "itemId": item.id,
-                "sku": item.sku,
-                "name": item.name,
-                "brand": item.brand,
-                "category": item.category,
-                "rent_price_cents": item.rent_price_cents,
-                "deposit_cents": item.deposit_cents,
-            },
-        )
-    except Exception as e:
-        print(f"[WARN] Failed to publish CatalogItemCreated event: {e}")
-    
+    _index_item(row)
+    outbox_relay.notify()
+
     return item
 
 
-@app.get("/catalog/items", response_model=PagedItems, tags=["catalog"])
-def list_catalog_items(
+@app.post("/catalog/items/bulk", response_model=BulkItemsResponse, tags=["catalog"])
+def bulk_write_catalog_items(body: BulkItemsRequest):
+    """
+    Create (or upsert) many catalog items in one call.
+
+    Rows are written with executemany in transactions of BULK_CHUNK_SIZE.
+    A SKU that already exists (or repeats within the request) is reported
+    per row as a conflict in create mode and does not abort the batch; in
+    upsert mode existing SKUs are updated.  Each chunk's events are written
+    to the outbox in its transaction and relayed in batches.
+    """
+    if len(body.items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BULK_MAX_ITEMS} items per bulk request",
+        )
+
+    results: List[Optional[BulkItemResult]] = [None] * len(body.items)
+    # sku -> index of its first row in this request.
+    seen: Dict[str, int] = {}
+    pending: List[int] = []
+    for i, it in enumerate(body.items):
+        if it.sku in seen:
+            results[i] = BulkItemResult(
+                index=i, sku=it.sku, status="conflict",
+                detail=f"Duplicate of row {seen[it.sku]} in this request",
+            )
+            continue
+        seen[it.sku] = i
+        pending.append(i)
+
+    now = _db_now()
+    for start in range(0, len(pending), BULK_CHUNK_SIZE):
+        chunk = pending[start:start + BULK_CHUNK_SIZE]
+        for attempt in range(3):
+            rows = [_new_item_row(body.items[i], now) for i in chunk]
+            try:
+                outcomes = _bulk_write_rows(rows, body.mode == "upsert", now)
+                break
+            except mysql.connector.errors.IntegrityError:
+                # The chunk's SKUs are locked while it is written, so this is
+                # a random id colliding: retry the chunk with fresh ids.
+                if attempt == 2:
+                    raise
+
+        for i, (status, row, item_id) in zip(chunk, outcomes):
+            results[i] = BulkItemResult(
+                index=i, sku=row["sku"], status=status, id=item_id,
+                detail=f"SKU '{row['sku']}' already exists" if status == "conflict" else None,
+            )
+        _apply_outcomes(outcomes)
+    outbox_relay.notify()
+
+    return BulkItemsResponse(
+        created=sum(1 for r in results if r.status == "created"),
+        updated=sum(1 for r in results if r.status == "updated"),
+        conflicts=sum(1 for r in results if r.status == "conflict"),
+        results=results,
+    )
+
+
+_UPSERT_ITEM_COLUMNS = (
+    "name", "brand", "category", "description", "photos_json",
+    "rent_price_cents", "deposit_cents", "attrs_json",
+)
+
+
+def _bulk_write_rows(rows: List[Dict], upsert: bool, now: datetime,
+                     update_status: bool = False) -> List[Tuple[str, Dict, str]]:
+    """
+    Write rows shaped like ``_new_item_row`` in one transaction, keyed by SKU.
+
+    Returns ``(status, row, item id)`` per row: "created", "updated" (upsert
+    onto the existing id) or "conflict" (SKU exists and not upserting).
+    For "updated" the row is as stored: the existing id, and the existing
+    status unless ``update_status``.
+
+    A transaction aborted by a deadlock or lock wait timeout is run again
+    up to BULK_LOCK_RETRIES times, after a short random backoff; then the
+    request fails with 503 and Retry-After.
+    """
+    for attempt in range(BULK_LOCK_RETRIES + 1):
+        try:
+            return _bulk_write_txn(rows, upsert, now, update_status)
+        except mysql.connector.errors.DatabaseError as e:
+            if e.errno not in _LOCK_ERRNOS:
+                raise
+            if attempt == BULK_LOCK_RETRIES:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Catalog rows are locked by a concurrent write, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+
+
+def _bulk_write_txn(rows: List[Dict], upsert: bool, now: datetime,
+                    update_status: bool) -> List[Tuple[str, Dict, str]]:
+    skus = [row["sku"] for row in rows]
+    outcomes: List[Tuple[str, Dict, str]] = []
+    with transaction() as cur:
+        # Locking read: also gap-locks SKUs that do not exist yet, so a
+        # concurrent insert cannot slip in before ours.
+        cur.execute(
+            "SELECT id, sku, status FROM catalog_items "
+            f"WHERE sku IN ({','.join(['%s'] * len(skus))}) FOR UPDATE",
+            skus,
+        )
+        existing = {r["sku"]: r for r in cur.fetchall()}
+
+        inserts, updates = [], []
+        for row in rows:
+            if row["sku"] not in existing:
+                inserts.append(row)
+                outcomes.append(("created", row, row["id"]))
+            elif upsert:
+                current = existing[row["sku"]]
+                stored = dict(row, id=current["id"], updated_at=now)
+                if not update_status:
+                    stored["status"] = current["status"]
+                updates.append((current["id"], row))
+                outcomes.append(("updated", stored, current["id"]))
+            else:
+                outcomes.append(("conflict", row, existing[row["sku"]]["id"]))
+
+        if inserts:
+            cur.executemany(
+                _INSERT_ITEM_SQL,
+                [tuple(row[c] for c in _INSERT_ITEM_COLUMNS) for row in inserts],
+            )
+        if updates:
+            columns = _UPSERT_ITEM_COLUMNS + (("status",) if update_status else ())
+            cur.executemany(
+                "UPDATE catalog_items SET "
+                + ", ".join(f"{c}=%s" for c in columns)
+                + ", updated_at=%s WHERE id=%s",
+                [tuple(row[c] for c in columns) + (now, item_id) for item_id, row in updates],
+            )
+        enqueue(cur, _outcome_events(outcomes))
+    return outcomes
+
+
+def _outcome_events(outcomes: List[Tuple[str, Dict, str]]) -> List[Tuple[str, Dict]]:
+    events = []
+    for status, row, item_id in outcomes:
+        if status == "created":
+            events.append(("CatalogItemCreated", _item_payload(row)))
+        elif status == "updated":
+            events.append(("CatalogItemUpdated", _item_payload(row)))
+    return events
+
+
+def _apply_outcomes(outcomes: List[Tuple[str, Dict, str]]) -> None:
+    """After commit: invalidate cached copies of updated items, re-index written items."""
+    for status, row, item_id in outcomes:
+        if status == "updated":
+            item_cache.invalidate(item_id)
+        if status != "conflict":
+            _index_item(row)
+
+
+@app.get("/catalog/items/export", tags=["catalog"])
+def export_catalog_items(
+    use_gzip: bool = Query(False, alias="gzip", description="gzip-compress the stream"),
+):
+    """
+    Stream the whole catalog as NDJSON, one Item per line.
+
+    Rows are read in keyset pages of EXPORT_CHUNK_ITEMS and serialized as
+    the client reads, so memory stays flat whatever the catalog size, and
+    each page holds a pool connection only for its own query, not while a
+    slow client drains the stream.  The output is accepted as-is by
+    POST /catalog/items/import.
+    """
+    def lines():
+        after = ""
+        while True:
+            # The primary key walks the clustered index: no filesort.
+            rows = query_all(
+                "SELECT * FROM catalog_items WHERE id > %s ORDER BY id LIMIT %s",
+                (after, EXPORT_CHUNK_ITEMS),
+            )
+            if not rows:
+                return
+            yield b"\n".join(pydantic_core.to_json(_item_document(row)) for row in rows) + b"\n"
+            if len(rows) < EXPORT_CHUNK_ITEMS:
+                return
+            after = rows[-1]["id"]
+
+    headers = {"Content-Disposition": 'attachment; filename="catalog_items.ndjson"'}
+    body = lines()
+    if use_gzip:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type="application/x-ndjson", headers=headers)
+
+
+def _import_row(obj: Dict, now: datetime) -> Dict:
+    """
+    Row for ``_bulk_write_rows`` from one import line.  Accepts an exported
+    Item (``photos``/``attrs``) or a raw DB row (``photos_json``/``attrs_json``);
+    both are validated through ``_row_to_item``.
+    """
+    if not isinstance(obj, dict):
+        raise ValueError("line is not a JSON object")
+    row = dict(obj)
+    for column, field, empty in (("photos_json", "photos", []), ("attrs_json", "attrs", {})):
+        value = row.get(column, row.get(field))
+        row[column] = value if isinstance(value, str) else json.dumps(value or empty)
+    row["id"] = row.get("id") or f"it-{os.urandom(4).hex()}"
+    row["status"] = row.get("status") or "active"
+
+    item = _row_to_item(row)
+    created_at = item.created_at or now
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return {
+        "id": item.id,
+        "sku": item.sku,
+        "name": item.name,
+        "brand": item.brand,
+        "category": item.category,
+        "description": item.description,
+        "photos_json": json.dumps(item.photos),
+        "rent_price_cents": item.rent_price_cents,
+        "deposit_cents": item.deposit_cents,
+        "attrs_json": json.dumps(item.attrs),
+        "status": item.status,
+        "created_at": created_at,
+        "updated_at": None,
+    }
+
+
+@app.post("/catalog/items/import", response_model=ItemImportResponse, tags=["catalog"])
+async def import_catalog_items(
+    request: Request,
+    mode: Literal["create", "upsert"] = Query(
+        "upsert", description="create: existing SKUs are conflicts; upsert: they are updated",
+    ),
+):
+    """
+    Ingest an NDJSON body (optionally ``Content-Encoding: gzip``) of items.
+
+    The body is read as a stream and written BULK_CHUNK_SIZE lines at a
+    time through the bulk write path, so memory is bounded by one chunk
+    plus the duplicate check, which remembers the last IMPORT_DEDUPE_SKUS
+    distinct SKUs.  A repeat of an SKU older than that is written again
+    (an update in upsert mode, a conflict in create mode).  Bad lines are
+    reported and skipped; they do not abort the import.  Imported rows
+    keep their id when the line has one.
+    """
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    upsert = mode == "upsert"
+    now = _db_now()
+    counts = {"created": 0, "updated": 0, "conflict": 0, "invalid": 0}
+    problems: List[ImportProblem] = []
+
+    def problem(line: int, sku: Optional[str], detail: str) -> None:
+        if len(problems) < IMPORT_MAX_PROBLEMS:
+            problems.append(ImportProblem(line=line, sku=sku, detail=detail))
+
+    async def flush(chunk: List[Tuple[int, Dict]]) -> None:
+        if not chunk:
+            return
+        rows = [row for _, row in chunk]
+        try:
+            outcomes = await run_in_threadpool(_bulk_write_rows, rows, upsert, now, True)
+        except mysql.connector.errors.IntegrityError as e:
+            # An id in the chunk is taken by a different SKU.
+            counts["invalid"] += len(chunk)
+            for line, row in chunk:
+                problem(line, row["sku"], f"Chunk rejected: {e}")
+            return
+        for (line, row), (status, _, item_id) in zip(chunk, outcomes):
+            counts[status] += 1
+            if status == "conflict":
+                problem(line, row["sku"], f"SKU '{row['sku']}' already exists as {item_id}")
+        _apply_outcomes(outcomes)
+        outbox_relay.notify()
+
+    chunk: List[Tuple[int, Dict]] = []
+    # sku -> line, oldest first; bounded by IMPORT_DEDUPE_SKUS.
+    seen: "OrderedDict[str, int]" = OrderedDict()
+    line_no = 0
+
+    async def body_lines():
+        # Only a body that cannot be read fails the whole import; errors in
+        # a line are reported and skipped below, never caught here.
+        try:
+            async for raw in iter_lines(request.stream(), gzipped):
+                yield raw
+        except (ValueError, zlib.error) as e:
+            # Undecodable body or an over-long line.  Chunks already flushed
+            # stay written; re-running the import in upsert mode is idempotent.
+            raise HTTPException(
+                status_code=400, detail=f"Unreadable NDJSON body at line {line_no + 1}: {e}"
+            )
+
+    async for raw in body_lines():
+        line_no += 1
+        if not raw.strip():
+            continue
+        sku = None
+        try:
+            obj = json.loads(raw)
+            if isinstance(obj, dict) and obj.get("sku") is not None:
+                # Reported as text even when the line has the wrong type.
+                sku = str(obj["sku"])
+            row = _import_row(obj, now)
+        except ValidationError as e:
+            counts["invalid"] += 1
+            problem(line_no, sku, "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+            ))
+            continue
+        except KeyError as e:
+            counts["invalid"] += 1
+            problem(line_no, sku, f"Missing field {e}")
+            continue
+        except (ValueError, TypeError) as e:
+            counts["invalid"] += 1
+            problem(line_no, sku, f"{type(e).__name__}: {e}")
+            continue
+        if row["sku"] in seen:
+            counts["conflict"] += 1
+            problem(line_no, row["sku"], f"Duplicate of line {seen[row['sku']]}")
+            continue
+        seen[row["sku"]] = line_no
+        if len(seen) > IMPORT_DEDUPE_SKUS:
+            seen.popitem(last=False)
+        chunk.append((line_no, row))
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await flush(chunk)
+            chunk = []
+    await flush(chunk)
+
+    return ItemImportResponse(
+        created=counts["created"],
+        updated=counts["updated"],
+        conflicts=counts["conflict"],
+        invalid=counts["invalid"],
+        problems=problems,
+        problems_truncated=len(problems) >= IMPORT_MAX_PROBLEMS,
+    )
+
+
+@app.get("/catalog/items", response_model=Union[PagedItems, PagedItemFields], tags=["catalog"])
+async def list_catalog_items(
     next_page_token: Optional[str] = Query(None, alias="nextPageToken"),
     page_size: int = Query(10, ge=1, le=100, alias="pageSize"),
+    sort: SortOption = Query(
+        "id", description="id | price_asc | price_desc | newest | brand"
+    ),
     category: Optional[str] = Query(None),
     brand: Optional[str] = Query(None),
     min_price: Optional[int] = Query(None, alias="minPrice", ge=0),
@@ -188,12 +1112,38 @@ def list_catalog_items(
         alias="availableOn",
         description="active ",
     ),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated Item fields to return, e.g. id,name,brand,rent_price_cents,photos"
+    ),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    request: Request = None,
 ):
     """
     List catalog items with filters + cursor pagination.
 
+    ``attr.<key>=<value>`` parameters (e.g. ``attr.color=black``) filter on
+    item attributes, case-insensitively; see ``_attr_clauses``.
+
+    With ``fields`` only those columns are selected and decoded, and items
+    come back with only those keys (``models.item.PagedItemFields``).
+
+    ``nextPageToken`` carries the full sort key of the last row, so every
+    page is an index range scan of page_size rows at any depth.
+
+    Pages carry an ETag; a revalidation with If-None-Match runs a version-only
+    query (id/updated_at) and answers 304 before any row is decoded.
+
+    ``total`` counts the items matching the filters (``_catalog_total``;
+    cached per filter set, ``total_approximate`` when estimated) and
+    ``page`` numbers the page, carried forward in ``nextPageToken``.
     """
-    last_id = _decode_token(next_page_token)
+    projection = _parse_fields(fields)
+    cursor = _decode_token(next_page_token)
+    if cursor and cursor[0] != sort:
+        raise HTTPException(
+            status_code=400,
+            detail=f"nextPageToken was issued for sort={cursor[0]}, not sort={sort}",
+        )
 
     where_clauses: List[str] = []
     params: List = []
@@ -213,122 +1163,473 @@ def list_catalog_items(
     if available_on:
     
         where_clauses.append("status = 'active'")
+    base_where, base_params = list(where_clauses), list(params)
+    attr_filters, attr_where, attr_params = _attr_clauses(request)
+    where_clauses.extend(attr_where)
+    params.extend(attr_params)
+    total, total_approximate = await _catalog_total(
+        category, brand, "active" if available_on else None, min_price, max_price,
+        attr_filters, base_where, base_params, attr_where, attr_params,
+    )
+    # Tokens from before page numbers were added lead to at least page 2.
+    page_number = (cursor[3] or 2) if cursor else 1
 
-    if last_id:
-       
-        where_clauses.append("id > %s")
-        params.append(last_id)
+    if cursor:
+        clause, clause_params = _keyset_clause(sort, cursor[1], cursor[2])
+        where_clauses.append(clause)
+        params.extend(clause_params)
 
     where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    params.append(page_size + 1)  
+
+    filters = {
+        "token": next_page_token,
+        "pageSize": page_size,
+        "sort": sort,
+        "category": category,
+        "brand": brand,
+        "minPrice": min_price,
+        "maxPrice": max_price,
+        "availableOn": available_on,
+        "fields": projection,
+        "attrs": attr_filters,
+        "total": [total, total_approximate],
+    }
+    if if_none_match:
+        versions = await async_database.query_all(
+            "SELECT id, updated_at, created_at FROM catalog_items "
+            f"{where_sql} {_sort_order(sort)} LIMIT %s",
+            params,
+        )
+        etag_value = _page_etag(filters, versions[:page_size], len(versions) > page_size)
+        if if_none_match == etag_value:
+            return Response(status_code=304, headers={"ETag": etag_value})
+
+    sort_column = SORT_OPTIONS[sort][0]
+    columns = _select_list(projection, "id", "updated_at", "created_at", sort_column)
     sql = (
-        "SELECT * FROM catalog_items "
+        f"SELECT {columns} FROM catalog_items "
         f"{where_sql} "
-        "ORDER BY id "
+        f"{_sort_order(sort)} "
         "LIMIT %s"
     )
-    params.append(page_size + 1)  
-
-    rows = query_all(sql, params)
+    rows = await async_database.query_all(sql, params)
 
     has_more = len(rows) > page_size
     rows = rows[:page_size]
+    etag_value = _page_etag(filters, rows, has_more)
+
+    next_token = None
+    if has_more:
+        last = rows[-1]
+        next_token = _encode_token(last["id"], sort, last[sort_column], page_number + 1)
+
+    if projection is not None:
+        page = {
+            "items": [_row_to_fields(r, projection) for r in rows],
+            "nextPageToken": next_token,
+            "page": page_number,
+            "page_size": page_size,
+            "total": total,
+            "total_approximate": total_approximate,
+        }
+        return _json_response(page, {"ETag": etag_value})
+
+    # Same keys, order and values as PagedItems(items=[_row_to_item(r) ...]).
+    page = {
+        "items": [_item_document(r) for r in rows],
+        "nextPageToken": next_token,
+        "page": page_number,
+        "page_size": page_size,
+        "total": total,
+        "total_approximate": total_approximate,
+    }
+    return _json_response(page, {"ETag": etag_value})
 
-    items: List[Item] = []
-    last_seen_id: Optional[str] = None
-    for r in rows:
-        last_seen_id = r["id"]
-        items.append(_row_to_item(r))
 
-    next_token = _encode_token(last_seen_id) if has_more else None
+@app.get("/catalog/search", response_model=SearchResults, tags=["catalog"])
+async def search_catalog_items(
+    q: str = Query(..., min_length=1, max_length=200, description="Search text"),
+    page_size: int = Query(10, ge=1, le=100, alias="pageSize"),
+    next_page_token: Optional[str] = Query(None, alias="nextPageToken"),
+    prefix: bool = Query(True, description="Match the last word as a prefix"),
+    category: Optional[str] = Query(None),
+    brand: Optional[str] = Query(None),
+    min_price: Optional[int] = Query(None, alias="minPrice", ge=0),
+    max_price: Optional[int] = Query(None, alias="maxPrice", ge=0),
+):
+    """
+    Full-text search over name, brand, category, description and attribute
+    values, best match first (BM25).  Every word must match; the last one
+    also matches as a prefix unless ``prefix=false``.
+
+    Matching and ranking run on the in-process index; MySQL is only asked
+    for the rows of the page being returned.
+    """
+    if not search_index.loaded:
+        raise HTTPException(status_code=503, detail="Search index not loaded")
+    offset = 0
+    if next_page_token:
+        try:
+            offset = int(base64.urlsafe_b64decode(next_page_token.encode("ascii")).decode("ascii"))
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid nextPageToken")
+
+    def accept(doc) -> bool:
+        return (
+            (category is None or doc.category == category)
+            and (brand is None or doc.brand == brand)
+            and (min_price is None or doc.price >= min_price)
+            and (max_price is None or doc.price <= max_price)
+        )
+
+    filtered = any(v is not None for v in (category, brand, min_price, max_price))
+    total, hits = search_index.search(
+        q, page_size, offset, prefix=prefix, accept=accept if filtered else None
+    )
 
-    return PagedItems(
-        items=items,
-        nextPageToken=next_token,
-        page_size=page_size,
-        page=1,      
-        total=None,  
+    rows = {}
+    if hits:
+        ids = [item_id for item_id, _ in hits]
+        rows = {
+            r["id"]: r
+            for r in await async_database.query_all(
+                f"SELECT * FROM catalog_items WHERE id IN ({','.join(['%s'] * len(ids))})", ids
+            )
+        }
+    items = []
+    for item_id, score in hits:
+        # A row deleted since it was indexed is simply left out.
+        if item_id in rows:
+            items.append(dict(_item_document(rows[item_id]), score=round(score, 4)))
+
+    more = offset + page_size < total
+    token = base64.urlsafe_b64encode(str(offset + page_size).encode("ascii")).decode("ascii")
+    return _json_response({
+        "items": items,
+        "total": total,
+        "nextPageToken": token if more else None,
+        "page_size": page_size,
+    })
+
+
+@app.get("/catalog/facets", response_model=CatalogFacets, tags=["catalog"])
+def get_catalog_facets(
+    category: Optional[str] = Query(None),
+    brand: Optional[str] = Query(None),
+    min_price: Optional[int] = Query(None, alias="minPrice", ge=0),
+    max_price: Optional[int] = Query(None, alias="maxPrice", ge=0),
+    available_on: Optional[date] = Query(None, alias="availableOn"),
+):
+    """
+    Per-category, per-brand and per-price-bucket counts for the same filters
+    as GET /catalog/items, from in-memory counts (no query to MySQL).  Each
+    facet ignores its own filter so the sidebar can offer alternatives.
+    """
+    if not facet_index.loaded:
+        raise HTTPException(status_code=503, detail="Facet counts not loaded")
+    return facet_index.facets(
+        category=category,
+        brand=brand,
+        # Same meaning as in list_catalog_items: availableOn keeps active items.
+        status="active" if available_on else None,
+        min_price=min_price,
+        max_price=max_price,
     )
 
 
-@app.get("/catalog/items/{id}", response_model=Item, tags=["catalog"])
-def get_catalog_item(
+async def _rows_by(column: str, keys: List[str]) -> Tuple[List[Dict], float]:
+    """
+    SELECT * for ``column IN keys``, one query per BATCH_GET_CHUNK_SIZE keys.
+    Also returns the oldest read position (``database.last_read_position``).
+    """
+    rows: List[Dict] = []
+    as_of = float("inf")
+    for start in range(0, len(keys), BATCH_GET_CHUNK_SIZE):
+        chunk = keys[start:start + BATCH_GET_CHUNK_SIZE]
+        rows.extend(await async_database.query_all(
+            f"SELECT * FROM catalog_items WHERE {column} IN ({','.join(['%s'] * len(chunk))})",
+            chunk,
+        ))
+        as_of = min(as_of, database.last_read_position())
+    return rows, as_of
+
+
+@app.post("/catalog/items/batch-get", response_model=ItemBatchGetResponse, tags=["catalog"])
+async def batch_get_catalog_items(body: ItemBatchGetRequest):
+    """
+    Resolve many items in one call, by ``ids`` and/or ``skus`` (up to 1000
+    of each).  Items come back in request order, each once; keys that
+    match nothing are listed in ``missing_ids`` / ``missing_skus``.
+
+    Ids are served from the item cache where possible; the rest (and all
+    SKUs) are read with chunked ``IN (...)`` queries, and what is read
+    fills the cache like GET /catalog/items/{id}.
+    """
+    if not body.ids and not body.skus:
+        raise HTTPException(status_code=400, detail="Pass ids, skus, or both")
+    ids = list(dict.fromkeys(body.ids))
+    skus = list(dict.fromkeys(body.skus))
+    skus_set = set(skus)
+
+    generation = item_cache.generation()
+    by_id: Dict[str, Item] = {}
+    misses = []
+    for id in ids:
+        cached = item_cache.get(id)
+        if cached is not None:
+            by_id[id] = cached[0]
+        else:
+            misses.append(id)
+    misses_set = set(misses)
+    rows, as_of = await _rows_by("id", misses) if misses else ([], float("inf"))
+    sku_rows, sku_as_of = await _rows_by("sku", skus) if skus else ([], float("inf"))
+    as_of = min(as_of, sku_as_of)
+    by_sku: Dict[str, Item] = {}
+    for row in rows + sku_rows:
+        item = _row_to_item(row)
+        item_cache.put(item.id, item, _etag(item.id, row), generation, as_of)
+        if item.id in misses_set:
+            by_id[item.id] = item
+        if row["sku"] in skus_set:
+            by_sku[row["sku"]] = item
+
+    # An item asked for by both its id and its SKU is returned once, at
+    # its first position.
+    items: Dict[str, Item] = {}
+    for item in [by_id[i] for i in ids if i in by_id] + [by_sku[s] for s in skus if s in by_sku]:
+        items.setdefault(item.id, item)
+
+    return _json_response(ItemBatchGetResponse(
+        items=list(items.values()),
+        missing_ids=[i for i in ids if i not in by_id],
+        missing_skus=[s for s in skus if s not in by_sku],
+    ))
+
+
+def _encode_change_cursor(changed_at: datetime, id: str) -> str:
+    raw = json.dumps([changed_at.isoformat(sep=" "), id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_change_cursor(token: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8")
+        changed_at, id = json.loads(raw)
+        return datetime.fromisoformat(changed_at), id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid since cursor")
+
+
+def _as_datetime(value) -> datetime:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+@app.get("/catalog/changes", response_model=CatalogChanges, tags=["catalog"])
+async def list_catalog_changes(
+    since: Optional[str] = Query(
+        None, description="nextCursor of the previous page; omit to start from the beginning"
+    ),
+    page_size: int = Query(100, ge=1, le=CHANGES_MAX_PAGE_SIZE, alias="pageSize"),
+):
+    """
+    Items created, updated or deleted after ``since``, oldest first, for
+    incremental sync.  Each item appears once per page at its latest state;
+    deletes appear as tombstones (kept CATALOG_TOMBSTONE_RETENTION_DAYS).
+
+    Both sources are keyset scans of a (changed_at, id) index, so a poll
+    costs O(changes), not O(catalog).  Store ``nextCursor`` and pass it
+    back; it is returned even when the page is empty.  Changes show up
+    CATALOG_CHANGES_SETTLE_SECONDS after they are made.  A cursor older
+    than the tombstone retention gets 410: re-sync from the start.
+    """
+    now = _db_now()
+    after = _decode_change_cursor(since) if since else None
+    if after and after[0] < now - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+        raise HTTPException(
+            status_code=410,
+            detail="Cursor is older than the tombstone retention; re-sync from the start",
+        )
+
+    def window(column: str) -> Tuple[str, List]:
+        clause = f"{column} < %s"
+        params: List = [now - timedelta(seconds=CHANGES_SETTLE_SECONDS)]
+        if after:
+            clause += f" AND ({column}, id) > (%s, %s)"
+            params.extend(after)
+        return clause, params + [page_size + 1]
+
+    # The window ends CHANGES_SETTLE_SECONDS back; a replica must have
+    # applied everything up to there or the cursor would skip rows.
+    with database.read_after(time.time() - CHANGES_SETTLE_SECONDS):
+        where, params = window("changed_at")
+        rows = await async_database.query_all(
+            f"SELECT * FROM catalog_items WHERE {where} ORDER BY changed_at, id LIMIT %s", params
+        )
+        where, params = window("deleted_at")
+        tombstones = await async_database.query_all(
+            "SELECT id, sku, deleted_at FROM catalog_item_tombstones "
+            f"WHERE {where} ORDER BY deleted_at, id LIMIT %s",
+            params,
+        )
+
+    merged = sorted(
+        [(_as_datetime(r["changed_at"]), r["id"], "upsert", r) for r in rows]
+        + [(_as_datetime(t["deleted_at"]), t["id"], "delete", t) for t in tombstones],
+        key=lambda c: (c[0], c[1]),
+    )
+    page = merged[:page_size]
+    changes = [
+        {
+            "op": op,
+            "id": id,
+            "sku": row["sku"],
+            "changed_at": changed_at,
+            "item": _item_document(row) if op == "upsert" else None,
+        }
+        for changed_at, id, op, row in page
+    ]
+    return _json_response({
+        "changes": changes,
+        "nextCursor": _encode_change_cursor(page[-1][0], page[-1][1]) if page else since,
+        "hasMore": len(merged) > page_size,
+    })
+
+
+@app.get("/catalog/items/{id}", response_model=Union[Item, ItemFields], tags=["catalog"])
+async def get_catalog_item(
     id: str = Path(..., description="Catalog item ID (string)"),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated Item fields to return (sparse ItemFields)"
+    ),
     if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
-    response: Response = None,
 ):
     """
     Get a single catalog item.
 
+    Served from the in-process item cache when possible; a matching
+    If-None-Match on a cached item is answered without touching MySQL.
+    With ``fields`` a cache miss selects only those columns and does not
+    fill the cache.
     """
-    row = query_one("SELECT * FROM catalog_items WHERE id=%s", (id,))
-    if not row:
-        raise HTTPException(status_code=404, detail="Item not found")
+    projection = _parse_fields(fields)
+    cached = item_cache.get(id)
+    if cached is None and projection is not None:
+        row = await async_database.query_one(
+            f"SELECT {_select_list(projection, 'id', 'updated_at', 'created_at')} "
+            "FROM catalog_items WHERE id=%s",
+            (id,),
+        )
+        if not row:
+            raise HTTPException(status_code=404, detail="Item not found")
+        etag_value = _etag(id, row)
+        if if_none_match == etag_value:
+            return Response(status_code=304, headers={"ETag": etag_value})
+        return _json_response(_row_to_fields(row, projection), {"ETag": etag_value})
+
+    if cached is not None:
+        item, etag_value = cached
+    else:
+        if if_none_match:
+            # Version-only lookup (covered by idx_catalog_items_version): a
+            # revalidation that still matches never loads the JSON columns.
+            version = await async_database.query_one(
+                "SELECT id, updated_at, created_at FROM catalog_items WHERE id=%s", (id,)
+            )
+            if not version:
+                raise HTTPException(status_code=404, detail="Item not found")
+            etag_value = _etag(id, version)
+            if if_none_match == etag_value:
+                return Response(status_code=304, headers={"ETag": etag_value})
 
-    item = _row_to_item(row)
+        generation = item_cache.generation()
+        row = await async_database.query_one("SELECT * FROM catalog_items WHERE id=%s", (id,))
+        if not row:
+            raise HTTPException(status_code=404, detail="Item not found")
+        item = _row_to_item(row)
+        etag_value = _etag(id, row)
+        item_cache.put(id, item, etag_value, generation, database.last_read_position())
 
-    updated = row.get("updated_at") or row.get("created_at")
-    if updated:
-        if isinstance(updated, datetime):
-            ts = int(updated.timestamp())
-        else:
-            ts = 0
-        etag_value = f'W/"{id}-{ts}"'
-        if if_none_match == etag_value:
-            response.status_code = 304
-            return
-        response.headers["ETag"] = etag_value
+    if if_none_match == etag_value:
+        return Response(status_code=304, headers={"ETag": etag_value})
+    if projection is not None:
+        return _json_response(_item_to_fields(item, projection), {"ETag": etag_value})
 
-    return item
+    return _json_response(item, {"ETag": etag_value})
 
 
 @app.put("/catalog/items/{id}", response_model=Item, tags=["catalog"])
 def update_catalog_item(id: str, body: ItemUpdate):
     """
     Full update for a catalog item.
-    """
-    row = query_one("SELECT * FROM catalog_items WHERE id=%s", (id,))
-    if not row:
-        raise HTTPException(status_code=404, detail="Item not found")
 
-    existing = _row_to_item(row)
+    Read-modify-write in one transaction on one connection, with the event
+    in the outbox; the response is the merged item, not a second read.
+    """
     data = body.model_dump(exclude_unset=True)
-    for k, v in data.items():
-        setattr(existing, k, v)
-
-    sql = (
-        "UPDATE catalog_items SET "
-        "name=%s, brand=%s, category=%s, description=%s, "
-        "photos_json=%s, rent_price_cents=%s, deposit_cents=%s, attrs_json=%s, status=%s "
-        "WHERE id=%s"
-    )
-    params = (
-        existing.name,
-        existing.brand,
-        existing.category,
-        existing.description,
-        json.dumps(existing.photos or []),
-        existing.rent_price_cents,
-        existing.deposit_cents,
-        json.dumps(existing.attrs or {}),
-        existing.status,
-        id,
-    )
-    execute(sql, params)
+    now = _db_now()
+
+    with transaction() as cur:
+        cur.execute("SELECT * FROM catalog_items WHERE id=%s FOR UPDATE", (id,))
+        row = cur.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Item not found")
+
+        existing = _row_to_item(row)
+        for k, v in data.items():
+            setattr(existing, k, v)
+
+        # Every column the UPDATE writes; ``stored`` is built from the same
+        # values so the event and the indexes see exactly the stored row.
+        values = {
+            "name": existing.name,
+            "brand": existing.brand,
+            "category": existing.category,
+            "description": existing.description,
+            "photos_json": json.dumps(existing.photos or []),
+            "rent_price_cents": existing.rent_price_cents,
+            "deposit_cents": existing.deposit_cents,
+            "attrs_json": json.dumps(existing.attrs or {}),
+            "status": existing.status,
+            "updated_at": now,
+        }
+        sql = (
+            "UPDATE catalog_items SET "
+            + ", ".join(f"{column}=%s" for column in values)
+            + " WHERE id=%s"
+        )
+        cur.execute(sql, (*values.values(), id))
+        stored = dict(row, **values)
+        enqueue(cur, [("CatalogItemUpdated", _item_payload(stored))])
 
-    row = query_one("SELECT * FROM catalog_items WHERE id=%s", (id,))
-    return _row_to_item(row)
+    existing.updated_at = now
+    item_cache.invalidate(id)
+    _index_item(stored)
+    outbox_relay.notify()
+    return existing
 
 
 @app.delete("/catalog/items/{id}", status_code=204, tags=["catalog"])
 def delete_catalog_item(id: str):
     """
-    Delete a catalog item. 
+    Delete a catalog item. Idempotent: 204 whether or not it existed.
+
+    Leaves a tombstone for GET /catalog/changes in the same transaction.
     """
-    row = query_one("SELECT * FROM catalog_items WHERE id=%s", (id,))
-    if not row:
-        return
+    with transaction() as cur:
+        cur.execute(
+            "REPLACE INTO catalog_item_tombstones (id, sku, deleted_at) "
+            "SELECT id, sku, %s FROM catalog_items WHERE id=%s",
+            (_db_now(), id),
+        )
+        if cur.rowcount == 0:
+            return
+        cur.execute("DELETE FROM catalog_items WHERE id=%s", (id,))
+        enqueue(cur, [("CatalogItemDeleted", {"itemId": id})])
 
-    execute("DELETE FROM catalog_items WHERE id=%s", (id,))
+    item_cache.invalidate(id)
+    _unindex_item(id)
+    outbox_relay.notify()
     return
 
 
@@ -342,18 +1643,93 @@ def list_physical_items():
     raise NOT_IMPL
 
 
+def _check_window(start_date: date, end_date: date, earliest: date = EPOCH, sku: Optional[str] = None) -> None:
+    """400 unless start_date..end_date is a non-empty window from ``earliest`` on."""
+    suffix = f" (sku {sku})" if sku is not None else ""
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail=f"end_date must not be before start_date{suffix}")
+    if start_date < earliest:
+        raise HTTPException(
+            status_code=400, detail=f"start_date must not be before {earliest.isoformat()}{suffix}"
+        )
+
+
 @app.get("/availability", response_model=Availability, tags=["inventory"])
 def get_availability(
     sku: str = Query(..., description="SKU to check availability for"),
     start_date: date = Query(...),
-    end_date: date = Query(...),
+    end_date: date = Query(..., description="Last rental day (inclusive)"),
 ):
-    raise NOT_IMPL
+    """
+    Number of in-service physical units of ``sku`` that are free on every day
+    from start_date through end_date. Served from the in-memory index.
+    """
+    _check_window(start_date, end_date)
+    if not availability_index.loaded:
+        raise HTTPException(status_code=503, detail="Availability index not loaded")
+
+    return Availability(
+        sku=sku,
+        start_date=start_date,
+        end_date=end_date,
+        available_count=availability_index.available_count(sku, start_date, end_date),
+    )
+
+
+@app.post("/availability/batch", response_model=List[Availability], tags=["inventory"])
+def get_availability_batch(body: AvailabilityBatchRequest):
+    """
+    Availability for many (sku, start_date, end_date) windows in one call,
+    returned in request order.
+    """
+    for q in body.queries:
+        _check_window(q.start_date, q.end_date, sku=q.sku)
+    if not availability_index.loaded:
+        raise HTTPException(status_code=503, detail="Availability index not loaded")
+
+    try:
+        counts = availability_index.available_counts(
+            [(q.sku, q.start_date, q.end_date) for q in body.queries]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return [
+        Availability(
+            sku=q.sku,
+            start_date=q.start_date,
+            end_date=q.end_date,
+            available_count=n,
+        )
+        for q, n in zip(body.queries, counts)
+    ]
 
 
 @app.post("/reservations", response_model=Reservation, status_code=201, tags=["reservations"])
-def create_reservation(body: ReservationRequest):
-    raise NOT_IMPL
+def create_reservation(body: ReservationRequest, response: Response):
+    """
+    Hold one free physical unit of the SKU for start_date..end_date.
+    The hold expires unless it is allocated via PATCH /reservations/{id}.
+    """
+    _check_window(body.start_date, body.end_date, max(date.today(), EPOCH))
+    if not availability_index.loaded:
+        raise HTTPException(status_code=503, detail="Availability index not loaded")
+
+    try:
+        reservation = reservation_service.hold(body)
+    except NoUnitAvailable:
+        raise HTTPException(
+            status_code=409,
+            detail=f"No unit of SKU '{body.sku}' is available for the requested dates",
+        )
+    except ReservationConflict:
+        raise HTTPException(
+            status_code=409,
+            detail="Too many concurrent reservations for this SKU, please retry",
+        )
+
+    response.headers["Location"] = f"/reservations/{reservation.id}"
+    return reservation
 
 
 @app.get("/reservations", response_model=PagedReservations, tags=["reservations"])
@@ -366,7 +1742,151 @@ def transition_reservation(
     id: str = Path(..., description="Reservation id"),
     body: ReservationAction = ...,
 ):
-    raise NOT_IMPL
+    """
+    allocate: turn a live hold into a confirmed booking.
+    release:  give the unit's days back (idempotent).
+    """
+    try:
+        return reservation_service.transition(id, body.action)
+    except ReservationNotFound:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    except ReservationConflict as e:
+        raise HTTPException(status_code=409, detail=f"Cannot {body.action}: {e}")
+
+
+@app.post("/admin/reservations/repack", tags=["admin"])
+def repack_reservations(sku: str = Query(..., description="SKU whose live holds to re-pack")):
+    """
+    Offline re-packing: re-assign the SKU's held (not yet allocated)
+    reservations to physical units with best fit.
+    """
+    if not availability_index.loaded:
+        raise HTTPException(status_code=503, detail="Availability index not loaded")
+    try:
+        moved = reservation_service.repack(sku)
+    except ReservationConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"sku": sku, "moved": moved}
+
+
+@app.post("/admin/facets/reconcile", tags=["admin"])
+def reconcile_facets():
+    """Rebuild facet counts from MySQL now instead of waiting for the timer."""
+    drift = facet_index.load(_facet_rows())
+    return {"corrected": drift, **facet_index.stats()}
+
+
+@app.get("/admin/outbox", tags=["admin"])
+def outbox_metrics():
+    """Relay throughput, in-flight messages and outbox backlog / lag."""
+    return outbox_relay.metrics()
+
+
+@app.get("/admin/replicas", tags=["admin"])
+def replica_status():
+    """Read replicas: health, lag, the commit time each has caught up to, reads routed."""
+    return {**database.replicas.status(), "pools": async_database.replica_pool_metrics()}
+
+
+@app.get("/admin/slow-queries", tags=["admin"])
+def slow_queries(
+    flagged: bool = Query(False, description="Only shapes whose plan has a full scan, filesort or temp table"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    Statements slower than DB_SLOW_QUERY_MS, grouped by normalized shape
+    (worst total time first), with the EXPLAIN plan captured the first time
+    each shape was slow and a candidate composite index for flagged SELECTs.
+    """
+    entries = slow_query_log.entries()
+    if flagged:
+        entries = [e for e in entries if e["flags"]]
+    return {
+        "threshold_ms": slow_query_log.threshold * 1000,
+        "sample_rate": slow_query_log.sample_rate,
+        "shapes": len(entries),
+        "dropped": slow_query_log.dropped,
+        "queries": entries[:limit],
+    }
+
+
+@app.delete("/admin/slow-queries", status_code=204, tags=["admin"])
+def reset_slow_queries():
+    """Forget recorded shapes, e.g. after adding an index; they are re-EXPLAINed when next slow."""
+    slow_query_log.reset()
+    return
+
+
+@REGISTRY.collector
+def _cache_metrics():
+    stats = item_cache.stats()
+    counts = count_cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    return [
+        ("item_cache_hits_total", "counter", "Item cache hits", [({}, stats["hits"])]),
+        ("item_cache_misses_total", "counter", "Item cache misses", [({}, stats["misses"])]),
+        ("item_cache_evictions_total", "counter", "Item cache LRU evictions", [({}, stats["evictions"])]),
+        ("item_cache_size", "gauge", "Items in the item cache", [({}, stats["size"])]),
+        ("item_cache_hit_ratio", "gauge", "Hits / lookups since start",
+         [({}, stats["hits"] / lookups if lookups else 0.0)]),
+        ("count_cache_hits_total", "counter", "Listing totals served from the count cache",
+         [({}, counts["hits"])]),
+        ("count_cache_misses_total", "counter", "Listing totals computed", [({}, counts["misses"])]),
+    ]
+
+
+@REGISTRY.collector
+def _pool_metrics():
+    pool = async_database.pool_metrics()
+    return [
+        ("db_pool_size", "gauge", "Connections the pool may hold",
+         [({"pool": "sync"}, database.DB_SYNC_POOL_SIZE), ({"pool": "async"}, pool["size"])]),
+        ("db_pool_in_use", "gauge", "Connections checked out",
+         [({"pool": "sync"}, database.in_use), ({"pool": "async"}, pool["in_use"])]),
+        ("db_pool_idle", "gauge", "Idle pooled connections", [({"pool": "async"}, pool["idle"])]),
+        ("db_pool_waiting", "gauge", "Callers waiting for a connection", [({"pool": "async"}, pool["waiting"])]),
+        ("db_pool_timeouts_total", "counter", "Checkouts that timed out", [({"pool": "async"}, pool["timeouts"])]),
+        ("db_pool_rejected_total", "counter", "Checkouts rejected with the wait queue full",
+         [({"pool": "async"}, pool["rejected"])]),
+    ]
+
+
+@REGISTRY.collector
+def _outbox_metrics():
+    m = outbox_relay.metrics()
+    return [
+        ("outbox_pending", "gauge", "Outbox events not yet published", [({}, m["pending"])]),
+        ("outbox_oldest_age_seconds", "gauge", "Age of the oldest unpublished event",
+         [({}, m["oldest_age_seconds"])]),
+        ("outbox_in_flight", "gauge", "Events published but not yet acked", [({}, m["in_flight"])]),
+        ("outbox_published_total", "counter", "Events relayed to Pub/Sub", [({}, m["published"])]),
+        ("outbox_failed_total", "counter", "Relay publish attempts that failed", [({}, m["failed"])]),
+    ]
+
+
+@REGISTRY.collector
+def _replica_metrics():
+    status = database.replicas.status()
+    replicas = status["replicas"]
+    return [
+        ("db_replica_healthy", "gauge", "1 if the replica gets reads",
+         [({"replica": r["name"]}, 1 if r["healthy"] else 0) for r in replicas]),
+        ("db_replica_lag_seconds", "gauge", "Seconds_Behind_Source at the last check",
+         [({"replica": r["name"]}, r["lag_seconds"]) for r in replicas if r["lag_seconds"] is not None]),
+        ("db_replica_reads_total", "counter", "Reads routed to each replica",
+         [({"replica": r["name"]}, r["reads"]) for r in replicas]),
+        ("db_replica_primary_reads_total", "counter",
+         "Reads sent to the primary because no replica was caught up",
+         [({}, status["primary_reads"])]),
+        ("db_replica_failovers_total", "counter", "Replica reads retried on the primary",
+         [({}, status["failovers"])]),
+    ]
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of the middleware.metrics registry."""
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/")
@@ -0,0 +1,44 @@
+"""
+Read-your-writes across requests (see ``database``).
+
+A request carrying ``X-Consistency-Token`` only reads from replicas that
+have applied the commit the token stands for, else from the primary.  A
+request that commits gets a fresh token in the same header; clients send
+back the latest one they hold.
+"""
+from __future__ import annotations
+
+import database
+
+_HEADER = database.CONSISTENCY_HEADER.lower().encode()
+
+
+class ConsistencyMiddleware:
+    """
+    Pure ASGI middleware.  The token goes out with the response headers, so
+    commits made while a streaming body is being sent are not covered.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = None
+        for name, value in scope["headers"]:
+            if name == _HEADER:
+                token = value.decode("latin-1")
+                break
+        writes = database.begin_request(token)
+
+        async def send_with_token(message):
+            if message["type"] == "http.response.start" and writes[0]:
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (_HEADER, database.encode_token(writes[0]).encode())
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_token)
@@ -0,0 +1,241 @@
+"""
+In-process Prometheus metrics, rendered at ``GET /metrics``.
+
+Hot-path instruments are plain counters and fixed-bucket histograms
+behind one lock each: an observation is a bisect and three additions.
+Components that already keep their own counters (item cache, async pool,
+outbox relay) are read through ``collector`` callbacks at scrape time
+only, so they cost nothing per request.
+
+``MetricsMiddleware`` times every HTTP request by route template;
+``database`` / ``async_database`` time every statement by normalized SQL
+(``normalize_sql``) and every pool checkout; ``utils.pubsub_client``
+times publishes.
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Seconds; request and statement latencies sit between a few hundred
+# microseconds and a few seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Distinct statement shapes tracked before the rest are folded into "other".
+MAX_STATEMENTS = 500
+
+Sample = Tuple[Dict[str, str], float]
+Family = Tuple[str, str, str, List[Sample]]  # name, type, help, samples
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Tuple[str, ...] = ()) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(k, list(v)) for k, v in self._series.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, values in series:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets + (float("inf"),), values):
+                cumulative += n
+                le = 'le="%s"' % _number(bound)
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {_number(cumulative)}"
+                )
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {_number(cumulative)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[Family]]) -> Callable[[], Iterable[Family]]:
+        """Register ``fn`` (usable as a decorator) to report families at scrape time."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for fn in self._collectors:
+            try:
+                families = list(fn())
+            except Exception as e:
+                # One broken source (e.g. the DB for the outbox backlog)
+                # must not take the whole scrape down.
+                logging.warning(f"Metrics collector {fn.__name__} failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [
+                    f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}"
+                    for labels, value in samples
+                ]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+DB_STATEMENT_SECONDS = REGISTRY.histogram(
+    "db_statement_duration_seconds", "Database statement latency by normalized SQL",
+    ("pool", "statement"),
+)
+DB_STATEMENT_ERRORS = REGISTRY.counter(
+    "db_statement_errors_total", "Database statements that raised, by normalized SQL",
+    ("pool", "statement"),
+)
+DB_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "db_pool_wait_seconds", "Time to check a connection out of the pool", ("pool",),
+)
+PUBSUB_PUBLISH_SECONDS = REGISTRY.histogram(
+    "pubsub_publish_duration_seconds", "Pub/Sub publish latency, call to ack", ("event_type",),
+)
+PUBSUB_PUBLISH_FAILURES = REGISTRY.counter(
+    "pubsub_publish_failures_total", "Pub/Sub publishes that failed", ("event_type",),
+)
+
+
+_WS = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*%s\s*,)*\s*%s\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+\b")
+_statements: Dict[str, None] = {}
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql: str) -> str:
+    """
+    Statement shape for labels: whitespace collapsed, IN lists and
+    multi-row VALUES folded, literals replaced by ``?``.  After
+    MAX_STATEMENTS distinct shapes, new ones report as "other".
+    """
+    shape = _WS.sub(" ", sql).strip()
+    shape = _IN_LIST.sub("IN (?)", shape)
+    shape = _VALUES_LIST.sub(r"VALUES \1", shape)
+    shape = _LITERAL.sub("?", shape).replace("%s", "?")
+    if shape not in _statements:
+        if len(_statements) >= MAX_STATEMENTS:
+            return "other"
+        _statements[shape] = None
+    return shape
+
+
+def observe_statement(pool: str, sql: str, started: float, failed: bool = False) -> float:
+    """Record one statement; returns its elapsed seconds."""
+    elapsed = time.perf_counter() - started
+    labels = (pool, normalize_sql(sql))
+    DB_STATEMENT_SECONDS.observe(elapsed, labels)
+    if failed:
+        DB_STATEMENT_ERRORS.inc(labels)
+    return elapsed
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task per request): times
+    each HTTP request to the end of its response body and labels it with
+    the matched route's path template, so /catalog/items/{id} is one series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                (scope["method"], getattr(route, "path", None) or "unmatched", str(status)),
+            )
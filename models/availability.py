@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from datetime import date
+from typing import List
 from pydantic import BaseModel, Field
 
 class Availability(BaseModel):
@@ -8,3 +9,11 @@ class Availability(BaseModel):
     start_date: date
     end_date: date
     available_count: int = Field(..., ge=0)
+
+class AvailabilityQuery(BaseModel):
+    sku: str
+    start_date: date
+    end_date: date = Field(..., description="Last rental day (inclusive)")
+
+class AvailabilityBatchRequest(BaseModel):
+    queries: List[AvailabilityQuery] = Field(..., min_length=1, max_length=200)
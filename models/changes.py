@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+from models.item import Item
+
+
+class ItemChange(BaseModel):
+    op: Literal["upsert", "delete"] = Field(..., description="upsert: created or updated; delete: tombstone")
+    id: str
+    sku: str
+    changed_at: datetime
+    item: Optional[Item] = Field(None, description="The item as of changed_at; null for deletes")
+
+
+class CatalogChanges(BaseModel):
+    """A page of GET /catalog/changes, in (changed_at, id) order."""
+
+    changes: List[ItemChange]
+    nextCursor: Optional[str] = Field(
+        None, description="Pass as since= to resume after this page; also when it is empty"
+    )
+    hasMore: bool = Field(..., description="More changes are ready now; poll again without waiting")
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class PriceBucketCount(BaseModel):
+    min: int = Field(..., description="Lowest rent_price_cents in the bucket")
+    max: Optional[int] = Field(None, description="Highest rent_price_cents; null for the last bucket")
+    count: int
+
+
+class CatalogFacets(BaseModel):
+    """Counts for GET /catalog/facets.  Each facet ignores its own filter."""
+
+    total: int = Field(..., description="Items matching every filter")
+    category: Dict[str, int]
+    brand: Dict[str, int]
+    price: List[PriceBucketCount]
@@ -77,12 +77,125 @@ class PagedItems(BaseModel):
     )
     #for frontend
     page: int = Field(
-        default=1, ge=1, description="Current page number (for UI; not part of cursor)"
+        default=1, ge=1, description="Current page number (for UI; carried in nextPageToken)"
     )
     page_size: int = Field(
         ..., ge=1, description="Number of items returned in this page"
     )
     total: Optional[int] = Field(
         default=None,
-        description="Optional total number of items; can be None if not computed.",
+        description="Number of items matching the filters; can be None if not computed.",
     )
+    total_approximate: bool = Field(
+        default=False,
+        description="True when total is an estimate (e.g. show 'about 12,000 results').",
+    )
+
+
+class ItemFields(BaseModel):
+    """Sparse Item for ``?fields=``: only the requested fields are present."""
+
+    id: Optional[str] = None
+    sku: Optional[str] = None
+    name: Optional[str] = None
+    brand: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    photos: Optional[List[str]] = None
+    rent_price_cents: Optional[int] = None
+    deposit_cents: Optional[int] = None
+    attrs: Optional[Dict[str, str]] = None
+    status: Optional[Literal["active", "inactive"]] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    links: Optional[Dict[str, str]] = Field(default=None, alias="_links")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class PagedItemFields(BaseModel):
+    """GET /catalog/items?fields=...: PagedItems with sparse items."""
+
+    items: List[ItemFields]
+    nextPageToken: Optional[str] = None
+    page: int = 1
+    page_size: int
+    total: Optional[int] = None
+    total_approximate: bool = False
+
+
+class BulkItemsRequest(BaseModel):
+    """Request body for POST /catalog/items/bulk."""
+
+    items: List[ItemCreate] = Field(..., min_length=1)
+    mode: Literal["create", "upsert"] = Field(
+        default="create",
+        description="create: existing SKUs are reported as conflicts; upsert: they are updated",
+    )
+
+
+class BulkItemResult(BaseModel):
+    """Outcome of one row of a bulk write, in request order."""
+
+    index: int
+    sku: str
+    status: Literal["created", "updated", "conflict"]
+    id: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class BulkItemsResponse(BaseModel):
+    created: int
+    updated: int
+    conflicts: int
+    results: List[BulkItemResult]
+
+
+class ItemBatchGetRequest(BaseModel):
+    """Request body for POST /catalog/items/batch-get: ids, SKUs, or both."""
+
+    ids: List[str] = Field(default_factory=list, max_length=1000)
+    skus: List[str] = Field(default_factory=list, max_length=1000)
+
+
+class ItemBatchGetResponse(BaseModel):
+    items: List[Item] = Field(
+        ..., description="Found items in request order: by ids first, then by skus"
+    )
+    missing_ids: List[str] = Field(default_factory=list)
+    missing_skus: List[str] = Field(default_factory=list)
+
+
+class ImportProblem(BaseModel):
+    """A line of an NDJSON import that was not written."""
+
+    line: int
+    sku: Optional[str] = None
+    detail: str
+
+
+class ItemImportResponse(BaseModel):
+    """Summary of POST /catalog/items/import."""
+
+    created: int
+    updated: int
+    conflicts: int
+    invalid: int
+    problems: List[ImportProblem] = Field(
+        default_factory=list,
+        description="Conflicting or invalid lines; capped, see problems_truncated",
+    )
+    problems_truncated: bool = False
+
+
+class SearchHit(Item):
+    """An Item returned by GET /catalog/search, with its relevance."""
+
+    score: float = Field(..., description="BM25 relevance score; higher is better")
+
+
+class SearchResults(BaseModel):
+    items: List[SearchHit]
+    total: int = Field(..., description="Number of items matching the query and filters")
+    nextPageToken: Optional[str] = None
+    page_size: int
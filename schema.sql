@@ -15,7 +15,16 @@ CREATE TABLE IF NOT EXISTS catalog_items (
   status          ENUM('active','inactive') NOT NULL DEFAULT 'active',
   created_at      TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
   updated_at      TIMESTAMP    NULL     DEFAULT NULL
-                               ON UPDATE CURRENT_TIMESTAMP
+                               ON UPDATE CURRENT_TIMESTAMP,
+  -- Change feed position (GET /catalog/changes): updated_at, or created_at
+  -- for rows never updated.
+  changed_at      TIMESTAMP    GENERATED ALWAYS AS (COALESCE(updated_at, created_at)) STORED,
+  -- Hot attrs keys as indexed generated columns for attr.<key>=<value>
+  -- filters; keep in sync with CATALOG_INDEXED_ATTRS.  Other keys are
+  -- served by the in-process posting lists (services/attr_index.py).
+  attr_color      VARCHAR(64)  GENERATED ALWAYS AS (LOWER(attrs_json->>'$.color')) VIRTUAL,
+  attr_material   VARCHAR(64)  GENERATED ALWAYS AS (LOWER(attrs_json->>'$.material')) VIRTUAL,
+  attr_size       VARCHAR(64)  GENERATED ALWAYS AS (LOWER(attrs_json->>'$.size')) VIRTUAL
 );
 
 CREATE INDEX idx_catalog_items_brand
@@ -29,3 +38,146 @@ CREATE INDEX idx_catalog_items_price
 
 CREATE INDEX idx_catalog_items_status
   ON catalog_items (status);
+
+-- Covers the version-only lookups behind ETag revalidation (single item and
+-- unfiltered list pages) without reading description/photos/attrs.
+CREATE INDEX idx_catalog_items_version
+  ON catalog_items (id, updated_at, created_at);
+
+-- Keyset pagination for GET /catalog/items?sort=...  Each sort option walks
+-- (sort column, id); with a category or brand filter the equality column
+-- leads.  InnoDB appends the primary key to every secondary index, so the
+-- single-column brand / price indexes above already serve (brand, id) and
+-- (rent_price_cents, id) for unfiltered brand and price sorts.
+CREATE INDEX idx_catalog_items_created
+  ON catalog_items (created_at, id);
+
+CREATE INDEX idx_catalog_items_category_price
+  ON catalog_items (category, rent_price_cents, id);
+
+CREATE INDEX idx_catalog_items_category_created
+  ON catalog_items (category, created_at, id);
+
+CREATE INDEX idx_catalog_items_category_brand
+  ON catalog_items (category, brand, id);
+
+CREATE INDEX idx_catalog_items_brand_price
+  ON catalog_items (brand, rent_price_cents, id);
+
+CREATE INDEX idx_catalog_items_brand_created
+  ON catalog_items (brand, created_at, id);
+
+CREATE INDEX idx_catalog_items_changed
+  ON catalog_items (changed_at, id);
+
+CREATE INDEX idx_catalog_items_attr_color
+  ON catalog_items (attr_color, id);
+
+CREATE INDEX idx_catalog_items_attr_material
+  ON catalog_items (attr_material, id);
+
+CREATE INDEX idx_catalog_items_attr_size
+  ON catalog_items (attr_size, id);
+
+-- Deleted catalog items, for GET /catalog/changes.  Written by
+-- delete_catalog_item in the delete's transaction; purged after
+-- CATALOG_TOMBSTONE_RETENTION_DAYS.
+
+CREATE TABLE IF NOT EXISTS catalog_item_tombstones (
+  id              VARCHAR(32)  NOT NULL PRIMARY KEY,
+  sku             VARCHAR(64)  NOT NULL,
+  deleted_at      TIMESTAMP    NOT NULL
+);
+
+CREATE INDEX idx_catalog_item_tombstones_deleted
+  ON catalog_item_tombstones (deleted_at, id);
+
+-- Physical units – maps to models.physical_item.PhysicalItem
+
+CREATE TABLE IF NOT EXISTS physical_items (
+  id              VARCHAR(32)  NOT NULL PRIMARY KEY,
+  sku             VARCHAR(64)  NOT NULL,
+  size            VARCHAR(16)  NOT NULL,
+  `condition`     VARCHAR(8)   NOT NULL,
+  status          ENUM('available','held','allocated','cleaning','repair','lost','retired')
+                               NOT NULL DEFAULT 'available',
+  -- Bumped by every booking on the unit; reservation holds use it as an
+  -- optimistic compare-and-set so two instances can never double-book.
+  version         INT          NOT NULL DEFAULT 0,
+  created_at      TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_physical_items_sku
+  ON physical_items (sku);
+
+-- Reservations – maps to models.reservation.Reservation
+-- end_date is inclusive: the unit is blocked from start_date through end_date.
+
+CREATE TABLE IF NOT EXISTS reservations (
+  id              VARCHAR(32)  NOT NULL PRIMARY KEY,
+  sku             VARCHAR(64)  NOT NULL,
+  item_id         VARCHAR(32)  NOT NULL,
+  start_date      DATE         NOT NULL,
+  end_date        DATE         NOT NULL,
+  status          ENUM('held','allocated','released','expired') NOT NULL DEFAULT 'held',
+  expires_at      TIMESTAMP    NULL     DEFAULT NULL,
+  note            VARCHAR(255) NULL,
+  created_at      TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Startup load of the availability index: active bookings that have not ended.
+CREATE INDEX idx_reservations_status_end
+  ON reservations (status, end_date);
+
+CREATE INDEX idx_reservations_item_dates
+  ON reservations (item_id, start_date);
+
+-- Transactional outbox: catalog events are inserted in the same
+-- transaction as the change they describe and relayed to Pub/Sub by
+-- services/outbox.py.  event_id is sent with the message for dedupe.
+
+CREATE TABLE IF NOT EXISTS catalog_outbox (
+  -- Sent as the event "version": every write holds the item's row lock
+  -- while it enqueues, so ids increase with each change to an item.
+  id              BIGINT       NOT NULL AUTO_INCREMENT PRIMARY KEY,
+  event_id        CHAR(32)     NOT NULL UNIQUE,
+  event_type      VARCHAR(64)  NOT NULL,
+  payload_json    JSON         NOT NULL,
+  -- Instance that made the change; it skips its own events on receipt.
+  origin          VARCHAR(32)  NULL,
+  created_at      TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  -- Not claimable before this: lease of the relay that claimed it, or
+  -- retry backoff after a failed publish.
+  available_at    TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  attempts        INT          NOT NULL DEFAULT 0,
+  last_error      VARCHAR(255) NULL,
+  published_at    TIMESTAMP    NULL     DEFAULT NULL
+);
+
+-- Relay claim (published_at IS NULL ... ORDER BY id) and retention cleanup.
+CREATE INDEX idx_catalog_outbox_pending
+  ON catalog_outbox (published_at, id);
+
+-- Read model maintained by gcf-catalog-events from catalog events.
+-- One row per item at the newest version seen; deletes leave a tombstone
+-- so a late, older event cannot bring the item back.
+
+CREATE TABLE IF NOT EXISTS catalog_read_items (
+  item_id         VARCHAR(32)  NOT NULL PRIMARY KEY,
+  version         BIGINT       NOT NULL,
+  deleted         TINYINT(1)   NOT NULL DEFAULT 0,
+  brand           VARCHAR(128) NULL,
+  category        VARCHAR(128) NULL,
+  status          VARCHAR(16)  NULL,
+  doc_json        JSON         NULL,
+  projected_at    TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Per brand/category snapshot of the read model.
+CREATE TABLE IF NOT EXISTS catalog_read_counts (
+  brand           VARCHAR(128) NOT NULL,
+  category        VARCHAR(128) NOT NULL,
+  items           INT          NOT NULL DEFAULT 0,
+  active          INT          NOT NULL DEFAULT 0,
+  PRIMARY KEY (brand, category)
+);
@@ -0,0 +1,89 @@
+"""
+Physical unit selection for reservations.
+
+A unit's day-bitmap calendar (see ``services.availability``) is an ordered
+set of booked days, so the bookings right before and after a window are one
+bit scan away: ``bit_length`` of the bits below the window gives the
+predecessor, the lowest set bit above it gives the successor.
+
+Best fit puts a window on the unit where it leaves the smallest idle gap
+around it, so long free stretches stay intact for long rentals instead of
+being chipped away by whichever unit happens to be listed first.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+# Idle days charged for an open-ended gap (no later booking on the unit).
+OPEN_GAP = 3660
+
+
+def neighbours(bits: int, lo: int, hi: int) -> Tuple[int, Optional[int]]:
+    """(last booked day before ``lo`` or -1, first booked day after ``hi`` or None)."""
+    prev_end = (bits & ((1 << lo) - 1)).bit_length() - 1
+    after = bits >> (hi + 1)
+    if not after:
+        return prev_end, None
+    return prev_end, hi + (after & -after).bit_length()
+
+
+def fit_score(bits: int, lo: int, hi: int, floor: int = 0) -> Tuple[int, int]:
+    """
+    Idle days a booking of days ``lo..hi`` would leave around itself; lower is
+    tighter.  ``floor`` is the first bookable day (today).  Ties prefer the
+    unit whose previous booking ends closest to ``lo``.
+    """
+    prev_end, next_start = neighbours(bits, lo, hi)
+    before = lo - max(prev_end + 1, floor, 0)
+    after = OPEN_GAP if next_start is None else next_start - hi - 1
+    return before + after, before
+
+
+def _fits(bits: int, lo: int, hi: int) -> bool:
+    if lo < 0 or hi < lo:
+        return False
+    return not bits & (((1 << (hi - lo + 1)) - 1) << lo)
+
+
+def best_fit(units: Iterable[Tuple[str, int]], lo: int, hi: int, floor: int = 0) -> Optional[str]:
+    """Id of the free unit with the tightest fit, or None if none is free."""
+    if lo < 0 or hi < lo:
+        return None
+    best, best_score = None, None
+    for unit_id, bits in units:
+        if not _fits(bits, lo, hi):
+            continue
+        score = fit_score(bits, lo, hi, floor)
+        if best_score is None or score < best_score:
+            best, best_score = unit_id, score
+    return best
+
+
+def first_fit(units: Iterable[Tuple[str, int]], lo: int, hi: int, floor: int = 0) -> Optional[str]:
+    if lo < 0 or hi < lo:
+        return None
+    for unit_id, bits in units:
+        if _fits(bits, lo, hi):
+            return unit_id
+    return None
+
+
+def repack(fixed: Dict[str, int], requests: Sequence[Tuple[str, int, int]],
+           floor: int = 0) -> Optional[Dict[str, str]]:
+    """
+    Offline assignment of movable bookings (``(id, lo, hi)``) onto units whose
+    calendars already hold the ``fixed`` bookings.
+
+    Bookings are placed by start day, longest first on ties, each with best
+    fit.  Returns ``{booking id: unit id}``, or None if some booking could
+    not be placed (the caller keeps its current assignment then).
+    """
+    calendars = dict(fixed)
+    plan: Dict[str, str] = {}
+    for rid, lo, hi in sorted(requests, key=lambda r: (r[1], r[1] - r[2])):
+        unit_id = best_fit(calendars.items(), lo, hi, floor)
+        if unit_id is None:
+            return None
+        calendars[unit_id] |= ((1 << (hi - lo + 1)) - 1) << lo
+        plan[rid] = unit_id
+    return plan
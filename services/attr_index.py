@@ -0,0 +1,170 @@
+"""
+Posting lists over ``attrs_json`` for ``attr.<key>=<value>`` filters.
+
+Hot keys (``CATALOG_INDEXED_ATTRS``) are MySQL generated columns
+``attr_<key>`` with secondary indexes (see schema.sql) and are filtered in
+SQL.  Every other key is served from here: (key, value) -> item ids, kept
+current by the catalog write paths like the search index.  A filter on a
+long-tail key becomes ``id IN (...)`` on the primary key, so it composes
+with the other filters and keyset pagination in the same query.
+
+Values compare case-insensitively everywhere (generated columns store
+``LOWER(...)``, posting lists are keyed on lower-cased values).
+
+Like the search index it is rebuilt periodically from a scan, replaying
+writes that raced with it, so drift is bounded by
+``ATTR_INDEX_RECONCILE_SECONDS``.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+INDEXED_ATTRS = tuple(
+    k.strip() for k in os.getenv("CATALOG_INDEXED_ATTRS", "color,material,size").split(",") if k.strip()
+)
+# Above this many candidate ids an ``id IN (...)`` list stops being cheap;
+# the filter falls back to evaluating the JSON column row by row.
+MAX_IN_LIST = int(os.getenv("CATALOG_ATTR_MAX_IN_LIST", "5000"))
+ATTR_INDEX_RECONCILE_SECONDS = float(os.getenv("ATTR_INDEX_RECONCILE_SECONDS", "300"))
+
+ATTR_KEY = re.compile(r"^[A-Za-z0-9_]{1,64}$")
+
+
+def _attrs(row: Dict) -> Dict[str, str]:
+    attrs = row.get("attrs_json")
+    if isinstance(attrs, str):
+        attrs = json.loads(attrs) if attrs else {}
+    return attrs or {}
+
+
+class AttrIndex:
+    def __init__(self):
+        self._postings: Dict[Tuple[str, str], Set[str]] = {}
+        self._items: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+        self._lock = threading.Lock()
+        # Writes seen while a reload scan is running (see load).
+        self._replay: Optional[List[Tuple[str, object]]] = None
+        self.loaded = False
+        self.reconciliations = 0
+        self.last_drift = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def load(self, rows: Iterable[Dict]) -> int:
+        with self._lock:
+            self._replay = []
+        try:
+            fresh = AttrIndex()
+            for row in rows:
+                fresh._upsert(row)
+        except BaseException:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            for op, arg in self._replay:
+                getattr(fresh, op)(arg)
+            self._replay = None
+            drift = sum(1 for i, p in fresh._items.items() if self._items.get(i) != p)
+            drift += sum(1 for i in self._items if i not in fresh._items)
+            self._postings = fresh._postings
+            self._items = fresh._items
+            self.last_drift = drift if self.loaded else 0
+            self.loaded = True
+            self.reconciliations += 1
+        return len(self._items)
+
+    def start_reconciler(self, scan: Callable[[], Iterable[Dict]],
+                         interval: float = ATTR_INDEX_RECONCILE_SECONDS) -> None:
+        """Re-``load`` from ``scan()`` every ``interval`` seconds on a daemon thread."""
+        if self._thread is not None or interval <= 0:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.load(scan())
+                    if self.last_drift:
+                        logging.warning(f"Attribute index reconciliation corrected {self.last_drift} items")
+                except Exception as e:
+                    logging.warning(f"Attribute index reconciliation failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="attr-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop_reconciler(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def upsert(self, row: Dict) -> None:
+        with self._lock:
+            self._upsert(row)
+            if self._replay is not None:
+                self._replay.append(("_upsert", row))
+
+    def remove(self, item_id: str) -> None:
+        with self._lock:
+            self._remove(item_id)
+            if self._replay is not None:
+                self._replay.append(("_remove", item_id))
+
+    def _upsert(self, row: Dict) -> None:
+        item_id = row["id"]
+        self._remove(item_id)
+        pairs = tuple(
+            (k, str(v).lower()) for k, v in _attrs(row).items() if k not in INDEXED_ATTRS
+        )
+        for pair in pairs:
+            self._postings.setdefault(pair, set()).add(item_id)
+        if pairs:
+            self._items[item_id] = pairs
+
+    def _remove(self, item_id: str) -> None:
+        for pair in self._items.pop(item_id, ()):
+            ids = self._postings[pair]
+            ids.discard(item_id)
+            if not ids:
+                del self._postings[pair]
+
+    def candidates(self, filters: Dict[str, str]) -> Optional[List[str]]:
+        """
+        Sorted ids having every (key, value) in ``filters``, or None when
+        the index cannot answer cheaply (not loaded, or more than
+        MAX_IN_LIST matches) and the caller should filter in SQL.
+        """
+        if not self.loaded:
+            return None
+        with self._lock:
+            sets = sorted(
+                (self._postings.get((k, v.lower()), set()) for k, v in filters.items()), key=len
+            )
+            if not sets:
+                return None
+            ids = set(sets[0])
+            for s in sets[1:]:
+                ids &= s
+                if not ids:
+                    break
+        if len(ids) > MAX_IN_LIST:
+            return None
+        return sorted(ids)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "items": len(self._items),
+                "pairs": len(self._postings),
+                "loaded": self.loaded,
+                "reconciliations": self.reconciliations,
+                "last_drift": self.last_drift,
+            }
+
+
+attr_index = AttrIndex()
@@ -0,0 +1,495 @@
+"""
+In-process availability index for physical units.
+
+Every physical unit keeps a day-bitmap calendar: one Python int whose bit
+``i`` is set when the unit is booked on ``EPOCH + i`` days.  A
+``start_date``/``end_date`` window (both inclusive) becomes one mask, and a
+unit is free for the window when ``calendar & mask == 0``.  Answering
+``available_count`` is therefore one AND per unit of the SKU and never
+touches the reservations table.
+
+For ``available_counts`` the calendars are mirrored into a NumPy
+occupancy matrix: one row per unit, ``MIRROR_WORDS`` 64-day words starting
+with the word that holds the load date, plus per-row prefix sums of booked
+days per word.  Both are updated with the calendar on every booking change,
+and the rows of each SKU are kept as one CSR array, so a batch does no
+per-unit Python work: it gathers two words and two prefix sums per
+(query, unit) pair.
+
+The index is loaded from MySQL at startup and kept current by the
+reservation write path of this instance (``book`` / ``release``) and by the
+reservation events of other instances (``apply_event``).  Holds carry their
+expiry, and lapsed ones are released before the next query reads the
+calendars.  A periodic reconciliation reloads everything and swaps it in,
+replaying changes that raced with the scan, so drift from a lost event is
+bounded by ``AVAILABILITY_RECONCILE_SECONDS``.
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+EPOCH = date(2020, 1, 1)
+
+# Reservation statuses that block a unit's calendar.
+BLOCKING_STATUSES = ("held", "allocated")
+
+# Physical unit statuses that take a unit out of the rentable pool entirely.
+OUT_OF_SERVICE_STATUSES = ("repair", "lost", "retired")
+
+# Widest date range (first start to last end) a single batch may cover.
+MAX_BATCH_SPAN_DAYS = 3660
+
+# Words of the occupancy matrix; days past them are answered from the
+# calendars instead.
+MIRROR_WORDS = MAX_BATCH_SPAN_DAYS // 64 + 2
+
+
+AVAILABILITY_RECONCILE_SECONDS = float(os.getenv("AVAILABILITY_RECONCILE_SECONDS", "60"))
+
+# Ended reservations remembered by ``apply_event``.
+RELEASED_MEMORY = 100_000
+
+
+def utcnow() -> datetime:
+    """Naive UTC timestamp, matching how TIMESTAMP columns come back."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+_EPOCH_ORDINAL = EPOCH.toordinal()
+
+
+def day_index(d: date) -> int:
+    """Bit position of ``d`` in a unit calendar."""
+    return (d - EPOCH).days
+
+
+def window_mask(start: date, end: date) -> int:
+    """Bitmask covering ``start`` through ``end`` inclusive."""
+    lo = max(day_index(start), 0)
+    hi = day_index(end)
+    if hi < lo:
+        return 0
+    return ((1 << (hi - lo + 1)) - 1) << lo
+
+
+def epoch_seconds(value: Any) -> Optional[float]:
+    """A naive-UTC TIMESTAMP (datetime or ISO string) as epoch seconds."""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value))
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _words(bits: int, base: int, n_words: int) -> bytes:
+    """``n_words`` 64-day words of a calendar from word ``base`` on."""
+    return ((bits >> (base * 64)) & ((1 << (n_words * 64)) - 1)).to_bytes(n_words * 8, "little")
+
+
+class _Unit:
+    __slots__ = ("id", "sku", "bits", "in_service", "row")
+
+    def __init__(self, unit_id: str, sku: str, in_service: bool = True, row: int = 0):
+        self.id = unit_id
+        self.sku = sku
+        self.bits = 0
+        self.in_service = in_service
+        self.row = row
+
+
+class _Calendars:
+    """One generation of the index; ``load`` builds a new one and swaps it in."""
+
+    def __init__(self, base: int = 0):
+        self.skus: Dict[str, Dict[str, _Unit]] = {}
+        self.units: Dict[str, _Unit] = {}
+        # reservation id -> (unit id, mask)
+        self.bookings: Dict[str, Tuple[str, int]] = {}
+        # held reservation id -> expiry (epoch seconds), and a heap of
+        # (expiry, id) to find the lapsed ones; entries whose expiry has
+        # since changed are skipped.
+        self.expires: Dict[str, float] = {}
+        self.expiry: List[Tuple[float, str]] = []
+        # Occupancy matrix (see module docstring): word ``base`` of the
+        # calendars on; ``occ[unit.row]`` and ``prefix[unit.row, k]``
+        # (booked days in words before ``k``).  Rows past the last unit are
+        # spare capacity.
+        self.base = base
+        self.occ = np.zeros((0, MIRROR_WORDS), dtype=np.uint64)
+        self.prefix = np.zeros((0, MIRROR_WORDS + 1), dtype=np.int32)
+        # Matrix rows of each SKU's in-service units, as CSR: SKU ``k`` of
+        # ``sku_ids`` owns ``sku_rows[sku_start[k]:sku_start[k + 1]]``.
+        # Rebuilt on demand after a unit changes (None until then).
+        self.sku_ids: Optional[Dict[str, int]] = None
+        self.sku_start = np.zeros(1, dtype=np.int64)
+        self.sku_rows = np.zeros(0, dtype=np.int64)
+
+    def add_unit(self, unit_id: str, sku: str, status: str) -> None:
+        unit = self.units.get(unit_id)
+        if unit is None:
+            unit = _Unit(unit_id, sku, row=len(self.units))
+            self.units[unit_id] = unit
+            self.skus.setdefault(sku, {})[unit_id] = unit
+            if unit.row >= len(self.occ):
+                grow = max(len(self.occ), 64)
+                self.occ = np.concatenate(
+                    [self.occ, np.zeros((grow, MIRROR_WORDS), dtype=np.uint64)])
+                self.prefix = np.concatenate(
+                    [self.prefix, np.zeros((grow, MIRROR_WORDS + 1), dtype=np.int32)])
+        unit.in_service = status not in OUT_OF_SERVICE_STATUSES
+        self.sku_ids = None
+
+    def book(self, reservation_id: str, unit_id: str, mask: int,
+             expires: Optional[float]) -> bool:
+        if self.bookings.get(reservation_id) == (unit_id, mask):
+            # Already booked (a replayed or repeated change): new expiry only.
+            self._set_expiry(reservation_id, expires)
+            return True
+        unit = self.units.get(unit_id)
+        if unit is None or unit.bits & mask or reservation_id in self.bookings:
+            return False
+        unit.bits |= mask
+        self.bookings[reservation_id] = (unit_id, mask)
+        self._set_expiry(reservation_id, expires)
+        self.mirror(unit)
+        return True
+
+    def release(self, reservation_id: str) -> None:
+        self.expires.pop(reservation_id, None)
+        booking = self.bookings.pop(reservation_id, None)
+        if booking is None:
+            return
+        unit = self.units.get(booking[0])
+        if unit is not None:
+            unit.bits &= ~booking[1]
+            self.mirror(unit)
+
+    def _set_expiry(self, reservation_id: str, expires: Optional[float]) -> None:
+        if expires is None:
+            self.expires.pop(reservation_id, None)
+        elif self.expires.get(reservation_id) != expires:
+            self.expires[reservation_id] = expires
+            heapq.heappush(self.expiry, (expires, reservation_id))
+
+    def expire(self, now: float) -> int:
+        """Release holds that lapsed by ``now``; returns how many."""
+        released = 0
+        while self.expiry and self.expiry[0][0] <= now:
+            expires, reservation_id = heapq.heappop(self.expiry)
+            if self.expires.get(reservation_id) == expires:
+                self.release(reservation_id)
+                released += 1
+        return released
+
+    def pack(self) -> None:
+        """Build the occupancy matrix of every unit at once."""
+        units = self.units.values()
+        self.occ = np.zeros((len(units), MIRROR_WORDS), dtype=np.uint64)
+        if units:
+            self.occ[:] = np.frombuffer(
+                b"".join(_words(u.bits, self.base, MIRROR_WORDS) for u in units), dtype="<u8"
+            ).reshape(len(units), MIRROR_WORDS)
+        self.prefix = np.zeros((len(units), MIRROR_WORDS + 1), dtype=np.int32)
+        np.cumsum(np.bitwise_count(self.occ), axis=1, out=self.prefix[:, 1:])
+        self.sku_ids = None
+
+    def mirror(self, unit: _Unit) -> None:
+        """Copy ``unit``'s calendar into the occupancy matrix."""
+        row = np.frombuffer(_words(unit.bits, self.base, MIRROR_WORDS), dtype="<u8")
+        self.occ[unit.row] = row
+        np.cumsum(np.bitwise_count(row), out=self.prefix[unit.row, 1:])
+
+    def sku_index(self) -> Dict[str, int]:
+        """``sku_ids``, rebuilding the CSR rows if a unit changed.  Id 0 is
+        reserved for SKUs without units."""
+        if self.sku_ids is None:
+            ids: Dict[str, int] = {}
+            rows: List[int] = []
+            start = [0, 0]
+            for sku, units in self.skus.items():
+                ids[sku] = len(start) - 1
+                rows.extend(u.row for u in units.values() if u.in_service)
+                start.append(len(rows))
+            self.sku_start = np.array(start, dtype=np.int64)
+            self.sku_rows = np.array(rows, dtype=np.int64)
+            self.sku_ids = ids
+        return self.sku_ids
+
+
+class AvailabilityIndex:
+    """Per-SKU calendars of physical units, keyed by SKU then unit id."""
+
+    def __init__(self):
+        self._cal = _Calendars()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # Changes made while a reload scan is running, replayed onto the
+        # rebuilt calendars before they replace the live ones.
+        self._replay: Optional[List[Tuple[str, tuple]]] = None
+        self._released: "OrderedDict[str, None]" = OrderedDict()
+        self.loaded = False
+        self.reconciliations = 0
+        self.last_drift = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- loading -----------------------------------------------------------
+
+    def load(self, query_all: Callable[..., List[Dict[str, Any]]],
+             today: Optional[date] = None) -> int:
+        """
+        (Re)build the index from ``physical_items`` and live reservations
+        and swap it in; returns the bookings that differed from the live
+        index (drift).
+        """
+        today = today or date.today()
+        with self._load_lock:
+            with self._lock:
+                self._replay = []
+            try:
+                fresh = self._scan(query_all, today)
+            except BaseException:
+                with self._lock:
+                    self._replay = None
+                raise
+            with self._lock:
+                for op, args in self._replay:
+                    getattr(fresh, op)(*args)
+                self._replay = None
+                now = time.time()
+                self._cal.expire(now)
+                fresh.expire(now)
+                live = self._cal.bookings
+                drift = sum(1 for r, b in fresh.bookings.items() if live.get(r) != b)
+                drift += sum(1 for r in live if r not in fresh.bookings)
+                self._cal = fresh
+                self.last_drift = drift if self.loaded else 0
+                self.loaded = True
+                self.reconciliations += 1
+        logging.info(
+            f"Availability index loaded: {len(fresh.units)} units, {len(fresh.bookings)} bookings"
+        )
+        return self.last_drift
+
+    def _scan(self, query_all: Callable[..., List[Dict[str, Any]]], today: date) -> _Calendars:
+        units = query_all("SELECT id, sku, status FROM physical_items")
+        bookings = query_all(
+            "SELECT id, item_id, start_date, end_date, status, expires_at FROM reservations "
+            "WHERE end_date >= %s AND (status = 'allocated' OR "
+            "(status = 'held' AND (expires_at IS NULL OR expires_at > %s)))",
+            (today, utcnow()),
+        )
+
+        fresh = _Calendars(day_index(today) // 64)
+        for row in units:
+            unit = _Unit(row["id"], row["sku"],
+                         row["status"] not in OUT_OF_SERVICE_STATUSES, len(fresh.units))
+            fresh.skus.setdefault(unit.sku, {})[unit.id] = unit
+            fresh.units[unit.id] = unit
+
+        for row in bookings:
+            unit = fresh.units.get(row["item_id"])
+            if unit is None:
+                continue
+            mask = window_mask(as_date(row["start_date"]), as_date(row["end_date"]))
+            unit.bits |= mask
+            fresh.bookings[row["id"]] = (unit.id, mask)
+            if row["status"] == "held" and row.get("expires_at") is not None:
+                fresh._set_expiry(row["id"], epoch_seconds(row["expires_at"]))
+        fresh.pack()
+        return fresh
+
+    def start_reconciler(self, query_all: Callable[..., List[Dict[str, Any]]],
+                         interval: float = AVAILABILITY_RECONCILE_SECONDS) -> None:
+        """Re-``load`` every ``interval`` seconds on a daemon thread."""
+        if self._thread is not None or interval <= 0:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    drift = self.load(query_all)
+                    if drift:
+                        logging.warning(f"Availability reconciliation corrected {drift} bookings")
+                except Exception as e:
+                    logging.warning(f"Availability reconciliation failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="availability-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop_reconciler(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    # -- maintenance -------------------------------------------------------
+
+    def _apply(self, op: str, *args):
+        """Run a ``_Calendars`` change on the live index (lock held)."""
+        result = getattr(self._cal, op)(*args)
+        if self._replay is not None:
+            self._replay.append((op, args))
+        return result
+
+    def add_unit(self, unit_id: str, sku: str, status: str = "available") -> None:
+        with self._lock:
+            self._apply("add_unit", unit_id, sku, status)
+
+    def book(self, reservation_id: str, unit_id: str, start: date, end: date,
+             expires_at: Optional[datetime] = None) -> bool:
+        """
+        Block ``unit_id`` for the window, until ``expires_at`` (naive UTC)
+        for a hold.  Returns False (and changes nothing) if the unit is
+        unknown or already booked on any of the days.  Booking a
+        reservation again on the same unit and days only updates its
+        expiry (None: confirmed, never expires).
+        """
+        mask = window_mask(start, end)
+        with self._lock:
+            return self._apply("book", reservation_id, unit_id, mask, epoch_seconds(expires_at))
+
+    def release(self, reservation_id: str) -> None:
+        with self._lock:
+            self._apply("release", reservation_id)
+
+    def apply_event(self, payload: Dict[str, Any]) -> None:
+        """
+        A reservation changed on another instance; ``payload`` is its state
+        as ``services.reservations`` publishes it.  Ended reservations are
+        remembered, so a late event from before the end cannot book their
+        days again.
+        """
+        reservation_id = payload["reservationId"]
+        mask = window_mask(as_date(payload["startDate"]), as_date(payload["endDate"]))
+        expires = epoch_seconds(payload.get("expiresAt"))
+        with self._lock:
+            if payload["status"] not in BLOCKING_STATUSES:
+                self._apply("release", reservation_id)
+                self._released[reservation_id] = None
+                while len(self._released) > RELEASED_MEMORY:
+                    self._released.popitem(last=False)
+                return
+            if reservation_id in self._released or (expires is not None and expires <= time.time()):
+                return
+            if self._cal.bookings.get(reservation_id, (payload["itemId"], mask)) != (payload["itemId"], mask):
+                # Moved to another unit (re-packing).
+                self._apply("release", reservation_id)
+            if not self._apply("book", reservation_id, payload["itemId"], mask, expires):
+                logging.warning(
+                    f"Reservation {reservation_id} clashes with the local index; "
+                    "left to reconciliation"
+                )
+
+    def _expire_due(self) -> _Calendars:
+        """The live calendars, after releasing holds that have lapsed."""
+        cal = self._cal
+        if cal.expiry and cal.expiry[0][0] <= time.time():
+            with self._lock:
+                cal = self._cal
+                cal.expire(time.time())
+        return cal
+
+    # -- queries -----------------------------------------------------------
+
+    def units_for(self, sku: str) -> Iterable[_Unit]:
+        return self._expire_due().skus.get(sku, {}).values()
+
+    def calendars(self, sku: str) -> List[Tuple[str, int]]:
+        """(unit id, calendar bits) for every in-service unit of ``sku``."""
+        return [(u.id, u.bits) for u in list(self.units_for(sku)) if u.in_service]
+
+    def free_units(self, sku: str, start: date, end: date) -> List[str]:
+        mask = window_mask(start, end)
+        return [
+            u.id for u in list(self.units_for(sku))
+            if u.in_service and not u.bits & mask
+        ]
+
+    def available_count(self, sku: str, start: date, end: date) -> int:
+        mask = window_mask(start, end)
+        count = 0
+        for u in list(self.units_for(sku)):
+            if u.in_service and not u.bits & mask:
+                count += 1
+        return count
+
+    def available_counts(self, queries: Sequence[Tuple[str, date, date]]) -> List[int]:
+        """
+        ``available_count`` for many (sku, start, end) windows in one pass.
+
+        Every (query, unit) pair is answered from the occupancy matrix in
+        O(1) whatever the window length: its first and last words are
+        masked and the words in between are one prefix-sum difference.
+        Free units are summed per query with ``bincount``.  Windows outside
+        the matrix (before its first word or past ``MIRROR_WORDS``) fall
+        back to ``available_count``.
+        """
+        nq = len(queries)
+        if nq == 0:
+            return []
+
+        # fromiter over plain lists: several times cheaper than np.array
+        # over per-query tuples, which dominated small batches.
+        starts = np.maximum(
+            np.fromiter([q[1].toordinal() for q in queries], np.int64, nq) - _EPOCH_ORDINAL, 0)
+        ends = np.fromiter([q[2].toordinal() for q in queries], np.int64, nq) - _EPOCH_ORDINAL
+        if int(ends.max()) - int(starts.min()) + 1 > MAX_BATCH_SPAN_DAYS:
+            raise ValueError(f"batch spans more than {MAX_BATCH_SPAN_DAYS} days")
+
+        self._expire_due()
+        with self._lock:
+            cal = self._cal
+            sku_ids = cal.sku_index()
+            lo = cal.base * 64
+            # Non-empty windows inside the matrix; the rest are answered by
+            # available_count below.
+            mirrored = (starts >= lo) & (ends < lo + MIRROR_WORDS * 64) & (ends >= starts)
+            sku = np.fromiter([sku_ids.get(q[0], 0) for q in queries], np.int64, nq)
+            sku[~mirrored] = 0
+            first = cal.sku_start[sku]
+            n_rows = cal.sku_start[sku + 1] - first
+            # One (query, unit row) pair per in-service unit of the query's SKU.
+            q_idx = np.repeat(np.arange(nq), n_rows)
+            offset = np.cumsum(n_rows) - n_rows
+            row = cal.sku_rows[np.arange(len(q_idx)) + (first - offset)[q_idx]]
+
+            s = starts[q_idx] - lo
+            e = ends[q_idx] - lo
+            ws, we = s >> 6, e >> 6
+            ones = np.uint64(0xFFFF_FFFF_FFFF_FFFF)
+            head = ones << (s & 63).astype(np.uint64)
+            tail = ones >> (63 - (e & 63)).astype(np.uint64)
+            # All ones where the window ends in its first word: then the
+            # first word is masked at both ends and the last is ignored.
+            same = -(ws == we).astype(np.uint64)
+            clash = ((cal.occ[row, ws] & head & (tail | ~same))
+                     | (cal.occ[row, we] & tail & ~same))
+            # Booked days in the words strictly between (<= 0 when none).
+            between = cal.prefix[row, we] - cal.prefix[row, ws + 1]
+            free = (clash == 0) & (between <= 0)
+
+        counts = np.bincount(q_idx, weights=free, minlength=nq).astype(np.int64)
+        for i in np.flatnonzero(~mirrored):
+            counts[i] = self.available_count(*queries[i])
+        return counts.tolist()
+
+
+def as_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+availability_index = AvailabilityIndex()
@@ -0,0 +1,109 @@
+"""
+Cached totals for ``GET /catalog/items`` filter sets.
+
+Entries are keyed by the normalized filter set (sort, page size, cursor
+and projection do not change a total) and stamped with a write generation.
+Every catalog write bumps the global generation and those of the item's
+category and brand (old and new values), once the write has reached the
+in-memory indexes totals are computed from.  An entry is checked
+against the narrowest counter its filters allow (category, else brand,
+else global), so a write in "dress" leaves the cached totals of
+``category=handbag`` valid.  Entries also expire after
+``COUNT_CACHE_TTL_SECONDS``, which bounds drift from a missed event.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+
+COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE", "5000"))
+COUNT_CACHE_TTL_SECONDS = float(os.getenv("COUNT_CACHE_TTL_SECONDS", "300"))
+
+Scope = Tuple[str, ...]
+
+
+def scope_of(category: Optional[str], brand: Optional[str]) -> Scope:
+    """The generation counter a filter set depends on."""
+    if category is not None:
+        return ("category", category)
+    if brand is not None:
+        return ("brand", brand)
+    return ("*",)
+
+
+class CountCache:
+    def __init__(self, max_size: int = COUNT_CACHE_SIZE, ttl: float = COUNT_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (expires_at, scope, generation, total, approximate)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Scope, int, Optional[int], bool]]" = OrderedDict()
+        self._generations: Dict[Scope, int] = {}
+        # scope -> wall time of its last bump; counts read from a replica
+        # must be caught up to it (database.read_after).
+        self._written_at: Dict[Scope, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, scope: Scope) -> int:
+        return self._generations.get(scope, 0)
+
+    def written_at(self, scope: Scope) -> float:
+        return self._written_at.get(scope, 0.0)
+
+    def bump(self, category: Optional[str] = None, brand: Optional[str] = None) -> None:
+        """An item in ``category`` / ``brand`` was written (call for old and new values)."""
+        with self._lock:
+            scopes = [("*",)]
+            if category is not None:
+                scopes.append(("category", category))
+            if brand is not None:
+                scopes.append(("brand", brand))
+            now = time.time()
+            for scope in scopes:
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+                self._written_at[scope] = now
+
+    def get(self, key: Hashable) -> Optional[Tuple[Optional[int], bool]]:
+        """(total, approximate) if cached and still current."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, scope, generation, total, approximate = entry
+            if expires_at < time.monotonic() or self._generations.get(scope, 0) != generation:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return total, approximate
+
+    def put(self, key: Hashable, scope: Scope, generation: int,
+            total: Optional[int], approximate: bool) -> None:
+        """Store a total computed when ``scope`` was at ``generation`` (read it first)."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if self._generations.get(scope, 0) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, scope, generation, total, approximate)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+count_cache = CountCache()
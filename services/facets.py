@@ -0,0 +1,239 @@
+"""
+In-memory facet counts for the catalog filter sidebar (``GET /catalog/facets``).
+
+Items are grouped by (category, brand, status, price bucket); each group
+keeps the sorted prices of its items, so its count is ``len()`` and a
+``minPrice``/``maxPrice`` range that cuts through a bucket is answered with
+two bisects.  Any combination of the ``list_catalog_items`` filters is
+answered by walking the groups, never by a ``GROUP BY`` on MySQL.
+
+Counts are maintained by the catalog write paths and catalog events; a
+periodic reconciliation rebuilds them from a scan of ``catalog_items`` and
+swaps the result in, replaying writes that raced with the scan, so drift
+from a lost event is bounded by ``FACETS_RECONCILE_SECONDS``.
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+FACETS_RECONCILE_SECONDS = float(os.getenv("FACETS_RECONCILE_SECONDS", "300"))
+# Lower bounds (cents) of the price buckets; the last bucket is open-ended.
+PRICE_BUCKETS = (0, 5_000, 10_000, 20_000, 50_000, 100_000)
+
+_Key = Tuple[str, str, str, int]
+
+
+def price_bucket(price: int) -> int:
+    return max(bisect.bisect_right(PRICE_BUCKETS, price) - 1, 0)
+
+
+def bucket_bounds(bucket: int) -> Tuple[int, Optional[int]]:
+    """Inclusive (min, max) cents of a bucket; max is None for the last."""
+    upper = PRICE_BUCKETS[bucket + 1] - 1 if bucket + 1 < len(PRICE_BUCKETS) else None
+    return PRICE_BUCKETS[bucket], upper
+
+
+class _Counts:
+    def __init__(self):
+        self.groups: Dict[_Key, List[int]] = {}
+        # item id -> (group key, price), to move an item on update/delete.
+        self.items: Dict[str, Tuple[_Key, int]] = {}
+
+    def upsert(self, item_id: str, category: str, brand: str, status: str, price: int) -> None:
+        self.remove(item_id)
+        key = (category, brand, status, price_bucket(price))
+        bisect.insort(self.groups.setdefault(key, []), price)
+        self.items[item_id] = (key, price)
+
+    def remove(self, item_id: str) -> None:
+        entry = self.items.pop(item_id, None)
+        if entry is None:
+            return
+        key, price = entry
+        prices = self.groups[key]
+        del prices[bisect.bisect_left(prices, price)]
+        if not prices:
+            del self.groups[key]
+
+
+class FacetIndex:
+    def __init__(self):
+        self._counts = _Counts()
+        self._lock = threading.Lock()
+        # Writes seen while a reconciliation scan is running, replayed onto
+        # the rebuilt counts before they replace the live ones.
+        self._replay: Optional[List[Tuple[str, tuple]]] = None
+        self.loaded = False
+        self.reconciliations = 0
+        self.last_drift = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- maintenance ---------------------------------------------------------
+
+    def upsert(self, row: Dict) -> None:
+        """Count (or re-count) one catalog_items row."""
+        args = (row["id"], row["category"], row["brand"], row.get("status") or "active",
+                row["rent_price_cents"])
+        with self._lock:
+            self._counts.upsert(*args)
+            if self._replay is not None:
+                self._replay.append(("upsert", args))
+
+    def remove(self, item_id: str) -> None:
+        with self._lock:
+            self._counts.remove(item_id)
+            if self._replay is not None:
+                self._replay.append(("remove", (item_id,)))
+
+    def load(self, rows: Iterable[Dict]) -> int:
+        """Build from catalog_items rows and swap in; returns items whose
+        counted group differed from the live counts (drift)."""
+        with self._lock:
+            self._replay = []
+        try:
+            fresh = _Counts()
+            for r in rows:
+                fresh.upsert(r["id"], r["category"], r["brand"], r["status"], r["rent_price_cents"])
+        except BaseException:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            for op, args in self._replay:
+                getattr(fresh, op)(*args)
+            self._replay = None
+            live = self._counts.items
+            drift = sum(1 for i, e in fresh.items.items() if live.get(i) != e)
+            drift += sum(1 for i in live if i not in fresh.items)
+            self._counts = fresh
+            self.last_drift = drift if self.loaded else 0
+            self.loaded = True
+            self.reconciliations += 1
+        return self.last_drift
+
+    def start_reconciler(self, scan: Callable[[], Iterable[Dict]],
+                         interval: float = FACETS_RECONCILE_SECONDS) -> None:
+        """Re-``load`` from ``scan()`` every ``interval`` seconds on a daemon thread."""
+        if self._thread is not None or interval <= 0:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    drift = self.load(scan())
+                    if drift:
+                        logging.warning(f"Facet reconciliation corrected {drift} items")
+                except Exception as e:
+                    logging.warning(f"Facet reconciliation failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="facet-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop_reconciler(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    # -- queries -------------------------------------------------------------
+
+    def facets(
+        self,
+        category: Optional[str] = None,
+        brand: Optional[str] = None,
+        status: Optional[str] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+    ) -> Dict:
+        """
+        Counts for the filter set.  Each facet ignores its own filter, so
+        with ``brand=Prada`` the brand facet still counts the other brands
+        (what a sidebar of checkboxes needs); ``total`` applies them all.
+        """
+        lo = min_price if min_price is not None else 0
+        hi = max_price
+        by_category: Dict[str, int] = {}
+        by_brand: Dict[str, int] = {}
+        by_bucket = [0] * len(PRICE_BUCKETS)
+        total = 0
+        with self._lock:
+            for (g_category, g_brand, g_status, bucket), prices in self._counts.groups.items():
+                if status is not None and g_status != status:
+                    continue
+                b_lo, b_hi = bucket_bounds(bucket)
+                if b_lo >= lo and (hi is None or (b_hi is not None and b_hi <= hi)):
+                    in_range = len(prices)
+                elif (b_hi is not None and b_hi < lo) or (hi is not None and b_lo > hi):
+                    in_range = 0
+                else:
+                    end = len(prices) if hi is None else bisect.bisect_right(prices, hi)
+                    in_range = max(end - bisect.bisect_left(prices, lo), 0)
+
+                category_ok = category is None or g_category == category
+                brand_ok = brand is None or g_brand == brand
+                if brand_ok and in_range:
+                    by_category[g_category] = by_category.get(g_category, 0) + in_range
+                if category_ok and in_range:
+                    by_brand[g_brand] = by_brand.get(g_brand, 0) + in_range
+                if category_ok and brand_ok:
+                    by_bucket[bucket] += len(prices)
+                    total += in_range
+        return {
+            "total": total,
+            "category": dict(sorted(by_category.items(), key=lambda kv: (-kv[1], kv[0]))),
+            "brand": dict(sorted(by_brand.items(), key=lambda kv: (-kv[1], kv[0]))),
+            "price": [
+                {"min": bucket_bounds(b)[0], "max": bucket_bounds(b)[1], "count": by_bucket[b]}
+                for b in range(len(PRICE_BUCKETS))
+            ],
+        }
+
+    def count(
+        self,
+        category: Optional[str] = None,
+        brand: Optional[str] = None,
+        status: Optional[str] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+    ) -> int:
+        """``facets(...)["total"]`` without building the facets."""
+        lo = min_price if min_price is not None else 0
+        hi = max_price
+        total = 0
+        with self._lock:
+            for (g_category, g_brand, g_status, bucket), prices in self._counts.groups.items():
+                if ((category is not None and g_category != category)
+                        or (brand is not None and g_brand != brand)
+                        or (status is not None and g_status != status)):
+                    continue
+                b_lo, b_hi = bucket_bounds(bucket)
+                if b_lo >= lo and (hi is None or (b_hi is not None and b_hi <= hi)):
+                    total += len(prices)
+                elif not ((b_hi is not None and b_hi < lo) or (hi is not None and b_lo > hi)):
+                    end = len(prices) if hi is None else bisect.bisect_right(prices, hi)
+                    total += max(end - bisect.bisect_left(prices, lo), 0)
+        return total
+
+    def group_of(self, item_id: str) -> Optional[Tuple[str, str]]:
+        """(category, brand) the item is counted under, if it is."""
+        with self._lock:
+            entry = self._counts.items.get(item_id)
+        return entry[0][:2] if entry else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "items": len(self._counts.items),
+                "groups": len(self._counts.groups),
+                "loaded": self.loaded,
+                "reconciliations": self.reconciliations,
+                "last_drift": self.last_drift,
+            }
+
+
+facet_index = FacetIndex()
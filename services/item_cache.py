@@ -0,0 +1,110 @@
+"""
+Bounded LRU + TTL cache of rendered catalog ``Item`` objects.
+
+Entries carry the ETag they were rendered with, so conditional GETs can be
+answered from memory.  Local writes call ``invalidate``; writes on other
+instances arrive as catalog events from Pub/Sub (see
+``utils.pubsub_client.subscribe_events``).  The TTL bounds staleness if an
+event is ever lost.
+
+With read replicas a fill can come from a copy that has not applied the
+write that invalidated the item yet: ``put`` takes the read's position
+(``database.last_read_position``) and drops fills older than the item's
+last invalidation.
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from models.item import Item
+
+
+CACHE_SIZE = int(os.getenv("ITEM_CACHE_SIZE", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("ITEM_CACHE_TTL_SECONDS", "300"))
+# How long invalidation times are remembered; longer than any replica lag
+# reads are routed to (DB_REPLICA_MAX_LAG_SECONDS).
+INVALIDATION_WINDOW_SECONDS = 60.0
+
+
+class ItemCache:
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Item, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a reader that started before an
+        # invalidation must not put what it read afterwards.
+        self._generation = 0
+        # item id -> wall time of its last invalidation (oldest first).
+        self._invalidated: "OrderedDict[str, float]" = OrderedDict()
+        self._cleared_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, item_id: str) -> Optional[Tuple[Item, str]]:
+        """(item, etag) if cached and fresh."""
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(item_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[item_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(item_id)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, item_id: str, item: Item, etag: str, generation: Optional[int] = None,
+            as_of: float = math.inf) -> None:
+        """``as_of``: wall time up to which the read that produced ``item`` saw every commit."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if as_of < max(self._invalidated.get(item_id, 0.0), self._cleared_at):
+                return
+            self._entries[item_id] = (time.monotonic() + self.ttl, item, etag)
+            self._entries.move_to_end(item_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, item_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(item_id, None)
+            self._invalidated.pop(item_id, None)
+            self._invalidated[item_id] = now
+            while next(iter(self._invalidated.values())) < now - INVALIDATION_WINDOW_SECONDS:
+                self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._cleared_at = time.time()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+item_cache = ItemCache()
@@ -0,0 +1,325 @@
+"""
+Transactional outbox for catalog events.
+
+Write paths call ``enqueue(cur, events)`` on the cursor of the transaction
+that mutates ``catalog_items``, so an event exists if and only if its
+change committed.  ``OutboxRelay`` drains ``catalog_outbox`` on a
+background thread and publishes to Pub/Sub off the request path:
+
+* claims up to ``batch_size`` rows with ``FOR UPDATE SKIP LOCKED`` and a
+  lease, so several instances can relay side by side;
+* waits ``linger`` after a wake-up so a burst of writes goes out as one
+  batch;
+* keeps at most ``max_in_flight`` messages published but unconfirmed and
+  stops claiming while that many are outstanding (backpressure);
+* marks confirmed rows published, and schedules failed ones again with
+  exponential backoff.  A crash between publish and mark republishes once
+  the lease lapses; every message carries its ``eventId`` so consumers
+  drop duplicates.
+
+``publish`` is any callable returning a ``concurrent.futures.Future``-like
+object per message: ``utils.pubsub_client.publish_message`` (which honours
+``PUBSUB_EMULATOR_HOST``) or a fake in tests/benchmarks.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent import futures
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from database import on_primary, query_one, transaction
+from utils.pubsub_client import INSTANCE_ID
+
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_LINGER_SECONDS = float(os.getenv("OUTBOX_LINGER_MS", "20")) / 1000
+OUTBOX_MAX_IN_FLIGHT = int(os.getenv("OUTBOX_MAX_IN_FLIGHT", "2000"))
+# Idle poll, for rows written by other instances (local writes wake us).
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "300"))
+OUTBOX_PUBLISH_TIMEOUT = float(os.getenv("OUTBOX_PUBLISH_TIMEOUT", "30"))
+OUTBOX_RETENTION_HOURS = float(os.getenv("OUTBOX_RETENTION_HOURS", "24"))
+
+_INSERT_SQL = (
+    "INSERT INTO catalog_outbox (event_id, event_type, payload_json, origin, created_at, available_at) "
+    "VALUES (%s,%s,%s,%s,%s,%s)"
+)
+
+
+class OutboxMessage(NamedTuple):
+    id: int
+    event_id: str
+    event_type: str
+    payload: Dict[str, Any]
+    origin: Optional[str]
+    attempts: int
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def enqueue(cur, events: Sequence[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """Add events to the outbox inside the caller's transaction; returns their ids."""
+    if not events:
+        return []
+    now = utcnow()
+    ids = [uuid.uuid4().hex for _ in events]
+    cur.executemany(
+        _INSERT_SQL,
+        [
+            (event_id, event_type, json.dumps(payload, default=str), INSTANCE_ID, now, now)
+            for event_id, (event_type, payload) in zip(ids, events)
+        ],
+    )
+    return ids
+
+
+class OutboxRelay:
+    def __init__(
+        self,
+        publish: Callable[[OutboxMessage], Any],
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        linger: float = OUTBOX_LINGER_SECONDS,
+        max_in_flight: int = OUTBOX_MAX_IN_FLIGHT,
+        poll_interval: float = OUTBOX_POLL_SECONDS,
+        lease: float = OUTBOX_LEASE_SECONDS,
+        max_backoff: float = OUTBOX_MAX_BACKOFF_SECONDS,
+        publish_timeout: float = OUTBOX_PUBLISH_TIMEOUT,
+        housekeeping: Optional[Callable[[], None]] = None,
+    ):
+        self.publish = publish
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_in_flight = max(max_in_flight, batch_size)
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_backoff = max_backoff
+        self.publish_timeout = publish_timeout
+        # Other retention work run alongside the outbox cleanup.
+        self.housekeeping = housekeeping
+        # Claimed batches whose publishes have not all completed.
+        self._pending: Deque[Tuple[List[OutboxMessage], List[Any], float]] = deque()
+        self.in_flight = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_cleanup = 0.0
+        self.stats = {
+            "claimed": 0,
+            "published": 0,
+            "failed": 0,
+            "batches": 0,
+            "backpressure_waits": 0,
+            "errors": 0,
+            "publish_seconds_max": 0.0,
+        }
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop claiming, wait up to ``timeout`` for outstanding publishes."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify(self) -> None:
+        """A local write committed outbox rows: drain now rather than at the next poll."""
+        self._wake.set()
+
+    # -- relay loop ----------------------------------------------------------
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                # Database unavailable etc.: back off and keep going.
+                self.stats["errors"] += 1
+                logging.warning(f"Outbox relay error: {e}")
+                self._stop.wait(self.poll_interval)
+        try:
+            self._reap(wait=True)
+        except Exception as e:
+            logging.warning(f"Outbox relay could not confirm final batches: {e}")
+
+    def run_once(self) -> int:
+        """One step of the loop; returns the number of messages claimed."""
+        self._reap(wait=False)
+        room = self.max_in_flight - self.in_flight
+        if room < min(self.batch_size, self.max_in_flight):
+            # Backpressure: let Pub/Sub catch up before claiming more.
+            self.stats["backpressure_waits"] += 1
+            self._reap(wait=True)
+            return 0
+
+        batch = self._claim(min(self.batch_size, room))
+        if not batch:
+            if self._pending:
+                self._reap(wait=True)
+            else:
+                self._cleanup()
+                if self._wake.wait(self.poll_interval) and self.linger:
+                    # Woken by a write: give the rest of the burst a moment.
+                    self._stop.wait(self.linger)
+                self._wake.clear()
+            return 0
+
+        self.stats["batches"] += 1
+        self.stats["claimed"] += len(batch)
+        publishes = []
+        for message in batch:
+            try:
+                publishes.append(self.publish(message))
+            except Exception as e:
+                failed = futures.Future()
+                failed.set_exception(e)
+                publishes.append(failed)
+        self._pending.append((batch, publishes, time.monotonic()))
+        self.in_flight += len(batch)
+        return len(batch)
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Relay until nothing is claimable and nothing is in flight (tests,
+        shutdown).  Runs on the caller's thread; ``stop()`` the loop first."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.run_once() and not self._pending:
+                if self.backlog()["pending"] == 0:
+                    return True
+                time.sleep(0.01)
+        return False
+
+    def _claim(self, limit: int) -> List[OutboxMessage]:
+        now = utcnow()
+        with transaction() as cur:
+            cur.execute(
+                "SELECT id, event_id, event_type, payload_json, origin, attempts FROM catalog_outbox "
+                "WHERE published_at IS NULL AND available_at <= %s "
+                "ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED",
+                (now, limit),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                return []
+            ids = [r["id"] for r in rows]
+            cur.execute(
+                "UPDATE catalog_outbox SET available_at=%s, attempts=attempts+1 "
+                f"WHERE id IN ({','.join(['%s'] * len(ids))})",
+                [now + timedelta(seconds=self.lease)] + ids,
+            )
+        return [
+            OutboxMessage(
+                r["id"], r["event_id"], r["event_type"], json.loads(r["payload_json"]),
+                r["origin"], r["attempts"] + 1,
+            )
+            for r in rows
+        ]
+
+    def _reap(self, wait: bool) -> None:
+        """Record the outcome of completed batches (oldest first)."""
+        while self._pending:
+            batch, publishes, started = self._pending[0]
+            if wait:
+                futures.wait(publishes, timeout=self.publish_timeout)
+            if not all(f.done() for f in publishes):
+                if not wait:
+                    return
+                # Timed out: treat what is still running as failed; the
+                # lease keeps it from being re-claimed meanwhile.
+            self._pending.popleft()
+            self.in_flight -= len(batch)
+            self.stats["publish_seconds_max"] = max(
+                self.stats["publish_seconds_max"], time.monotonic() - started
+            )
+            ok, failed = [], []
+            for message, f in zip(batch, publishes):
+                error = f.exception(timeout=0) if f.done() else TimeoutError("publish timed out")
+                if error is None:
+                    ok.append(message)
+                else:
+                    failed.append((message, error))
+            self._settle(ok, failed)
+
+    def _settle(self, ok: List[OutboxMessage], failed: List[Tuple[OutboxMessage, BaseException]]) -> None:
+        now = utcnow()
+        with transaction() as cur:
+            if ok:
+                cur.execute(
+                    "UPDATE catalog_outbox SET published_at=%s, last_error=NULL "
+                    f"WHERE id IN ({','.join(['%s'] * len(ok))})",
+                    [now] + [m.id for m in ok],
+                )
+            if failed:
+                cur.executemany(
+                    "UPDATE catalog_outbox SET available_at=%s, last_error=%s WHERE id=%s",
+                    [
+                        (now + timedelta(seconds=self._backoff(m.attempts)), str(e)[:255], m.id)
+                        for m, e in failed
+                    ],
+                )
+        self.stats["published"] += len(ok)
+        self.stats["failed"] += len(failed)
+        if failed:
+            logging.warning(f"{len(failed)} outbox events failed to publish; will retry")
+
+    def _backoff(self, attempts: int) -> float:
+        return min(2.0 ** attempts, self.max_backoff)
+
+    def _cleanup(self) -> None:
+        """Drop published rows past retention (and run ``housekeeping``), at
+        most once a minute."""
+        if time.monotonic() - self._last_cleanup < 60:
+            return
+        self._last_cleanup = time.monotonic()
+        cutoff = utcnow() - timedelta(hours=OUTBOX_RETENTION_HOURS)
+        with transaction() as cur:
+            cur.execute(
+                "DELETE FROM catalog_outbox WHERE published_at IS NOT NULL AND published_at < %s",
+                (cutoff,),
+            )
+        if self.housekeeping is not None:
+            self.housekeeping()
+
+    # -- observability -------------------------------------------------------
+
+    def backlog(self) -> Dict[str, Any]:
+        with on_primary():
+            row = query_one(
+                "SELECT COUNT(*) AS pending, MIN(created_at) AS oldest "
+                "FROM catalog_outbox WHERE published_at IS NULL"
+            )
+        oldest = row["oldest"] if row else None
+        if isinstance(oldest, str):
+            oldest = datetime.fromisoformat(oldest)
+        return {
+            "pending": row["pending"] if row else 0,
+            "oldest_age_seconds": (utcnow() - oldest).total_seconds() if oldest else 0.0,
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "running": self._thread is not None,
+            "in_flight": self.in_flight,
+            "batch_size": self.batch_size,
+            "max_in_flight": self.max_in_flight,
+            **self.stats,
+            **self.backlog(),
+        }
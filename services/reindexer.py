@@ -0,0 +1,109 @@
+"""
+Batched re-indexing of catalog items changed on other instances.
+
+Catalog events arrive on up to ten Pub/Sub callback threads at once.  If
+each one read its item back with its own query, they would hold that many
+sync-pool connections and crowd out request handlers.  Instead
+``Reindexer.reindex`` queues the item id and waits.  One background
+thread reads every queued id with a single ``WHERE id IN (...)`` and
+applies the rows, so event handling holds at most one connection.  Reading
+the row as committed, rather than trusting the payload, makes
+out-of-order delivery harmless.
+
+A failed read (e.g. ``database.PoolError``) fails every waiting
+``reindex`` call.  The subscriber then nacks, and Pub/Sub redelivers.
+The index reconcilers bound drift if redelivery gives up too.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from concurrent import futures
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+
+REINDEX_BATCH_SIZE = int(os.getenv("REINDEX_BATCH_SIZE", "500"))
+# Below the subscription's 10 s ack deadline.
+REINDEX_TIMEOUT_SECONDS = float(os.getenv("REINDEX_TIMEOUT_SECONDS", "8"))
+
+
+class Reindexer:
+    def __init__(
+        self,
+        fetch: Callable[[Sequence[str]], Iterable[Dict]],
+        apply: Callable[[str, Optional[Dict]], None],
+        batch_size: int = REINDEX_BATCH_SIZE,
+        timeout: float = REINDEX_TIMEOUT_SECONDS,
+    ):
+        self.fetch = fetch
+        self.apply = apply
+        self.batch_size = batch_size
+        self.timeout = timeout
+        # item id -> callers waiting for it, in arrival order.
+        self._pending: Dict[str, List[futures.Future]] = {}
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"batches": 0, "items": 0, "failures": 0}
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="reindexer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def reindex(self, item_id: str) -> None:
+        """Re-read ``item_id`` and apply it; raises if that did not happen
+        within ``timeout`` (the caller should have the event redelivered)."""
+        future: futures.Future = futures.Future()
+        with self._cond:
+            self._pending.setdefault(item_id, []).append(future)
+            self._cond.notify()
+        future.result(self.timeout)
+
+    def _take(self) -> Optional[Dict[str, List[futures.Future]]]:
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            if self._stopping:
+                return None
+            ids = list(self._pending)[:self.batch_size]
+            return {item_id: self._pending.pop(item_id) for item_id in ids}
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take()
+            if batch is None:
+                break
+            try:
+                rows = {row["id"]: row for row in self.fetch(list(batch))}
+                for item_id in batch:
+                    self.apply(item_id, rows.get(item_id))
+            except Exception as e:
+                self.stats["failures"] += 1
+                logging.warning(f"Re-index of {len(batch)} items failed: {e}")
+                for waiting in batch.values():
+                    for future in waiting:
+                        future.set_exception(e)
+                continue
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            for waiting in batch.values():
+                for future in waiting:
+                    future.set_result(None)
+
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        for waiting in pending.values():
+            for future in waiting:
+                future.set_exception(RuntimeError("re-indexer stopped"))
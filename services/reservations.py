@@ -0,0 +1,373 @@
+"""
+Reservation hold / allocate / release.
+
+Two layers keep a physical unit from being double-booked:
+
+* Inside one process, holds for the same SKU are serialised by a striped
+  lock (``RESERVATION_LOCK_STRIPES`` locks, SKU hashed onto one of them), so
+  different SKUs never wait on each other and there is no table-wide lock.
+* Across Cloud Run instances, every booking bumps ``physical_items.version``
+  with a compare-and-set in the same transaction as the INSERT.  A hold that
+  read a stale version loses the CAS, rolls back and retries (bounded by
+  ``RESERVATION_MAX_RETRIES``).
+
+Which unit a hold lands on is decided by ``services.allocator`` (best fit);
+``repack`` re-assigns the live holds of a SKU offline.
+
+Every change is also written to the outbox in its transaction (one of
+``RESERVATION_EVENTS``, carrying the reservation's new state), so the
+availability indexes of the other instances apply it without reading
+MySQL (``AvailabilityIndex.apply_event``).
+"""
+from __future__ import annotations
+
+import os
+import threading
+import zlib
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import on_primary, query_all, query_one, transaction
+from models.reservation import Reservation, ReservationRequest
+from services import allocator
+from services.availability import (
+    AvailabilityIndex,
+    as_date,
+    availability_index,
+    day_index,
+    utcnow,
+)
+from services.outbox import enqueue
+
+
+LOCK_STRIPES = int(os.getenv("RESERVATION_LOCK_STRIPES", "64"))
+MAX_RETRIES = int(os.getenv("RESERVATION_MAX_RETRIES", "5"))
+HOLD_TTL = timedelta(minutes=int(os.getenv("RESERVATION_HOLD_MINUTES", "15")))
+
+RESERVATION_EVENTS = (
+    "ReservationHeld",
+    "ReservationMoved",
+    "ReservationAllocated",
+    "ReservationReleased",
+    "ReservationExpired",
+)
+
+
+class ReservationError(Exception):
+    """Base class; ``main`` maps subclasses onto HTTP status codes."""
+
+
+class ReservationNotFound(ReservationError):
+    pass
+
+
+class NoUnitAvailable(ReservationError):
+    pass
+
+
+class ReservationConflict(ReservationError):
+    pass
+
+
+class _VersionConflict(Exception):
+    pass
+
+
+_LIVE_BOOKING = (
+    "(status = 'allocated' OR (status = 'held' AND (expires_at IS NULL OR expires_at > %s)))"
+)
+
+
+def _row_to_reservation(row: Dict) -> Reservation:
+    return Reservation(
+        id=row["id"],
+        sku=row["sku"],
+        item_id=row["item_id"],
+        start_date=row["start_date"],
+        end_date=row["end_date"],
+        status=row["status"],
+        expires_at=row.get("expires_at"),
+    )
+
+
+def _event(event_type: str, reservation: Reservation) -> Tuple[str, Dict[str, Any]]:
+    return event_type, {
+        "reservationId": reservation.id,
+        "sku": reservation.sku,
+        "itemId": reservation.item_id,
+        "startDate": reservation.start_date.isoformat(),
+        "endDate": reservation.end_date.isoformat(),
+        "status": reservation.status,
+        "expiresAt": reservation.expires_at.isoformat() if reservation.expires_at else None,
+    }
+
+
+class ReservationService:
+    def __init__(self, index: AvailabilityIndex, stripes: int = LOCK_STRIPES,
+                 max_retries: int = MAX_RETRIES):
+        self.index = index
+        self.max_retries = max_retries
+        # Called after a transaction that wrote outbox events (``main``
+        # wakes the relay with it).
+        self.notify: Optional[Callable[[], None]] = None
+        self._stripes = [threading.Lock() for _ in range(max(1, stripes))]
+        self._stats_lock = threading.Lock()
+        self._stats = {"holds": 0, "conflicts": 0, "exhausted": 0}
+
+    def _stripe(self, sku: str) -> threading.Lock:
+        return self._stripes[zlib.crc32(sku.encode("utf-8")) % len(self._stripes)]
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _committed(self) -> None:
+        if self.notify is not None:
+            self.notify()
+
+    def _choose_unit(self, sku: str, candidates: List[str], start: date, end: date) -> str:
+        free = set(candidates)
+        unit_id = allocator.best_fit(
+            [(u, bits) for u, bits in self.index.calendars(sku) if u in free],
+            max(day_index(start), 0),
+            day_index(end),
+            day_index(date.today()),
+        )
+        return unit_id or candidates[0]
+
+    # -- hold --------------------------------------------------------------
+
+    def hold(self, req: ReservationRequest) -> Reservation:
+        """Place a hold on one free unit of ``req.sku`` for the window."""
+        # Version checks and clash reads must see the latest commits.
+        with self._stripe(req.sku), on_primary():
+            for _ in range(self.max_retries + 1):
+                candidates = self.index.free_units(req.sku, req.start_date, req.end_date)
+                if not candidates:
+                    self._expire_holds(req.sku)
+                    candidates = self.index.free_units(req.sku, req.start_date, req.end_date)
+                if not candidates:
+                    raise NoUnitAvailable(req.sku)
+
+                unit_id = self._choose_unit(req.sku, candidates, req.start_date, req.end_date)
+                try:
+                    reservation = self._try_hold(req, unit_id)
+                except _VersionConflict:
+                    self._count("conflicts")
+                    continue
+                if reservation is None:
+                    # Another instance booked the unit; the index now knows.
+                    self._count("conflicts")
+                    continue
+                self._count("holds")
+                return reservation
+
+        self._count("exhausted")
+        raise ReservationConflict(req.sku)
+
+    def _try_hold(self, req: ReservationRequest, unit_id: str) -> Optional[Reservation]:
+        now = utcnow()
+        row = query_one("SELECT version FROM physical_items WHERE id=%s", (unit_id,))
+        if row is None:
+            raise _VersionConflict(unit_id)
+        clashes = query_all(
+            "SELECT id, start_date, end_date, status, expires_at FROM reservations "
+            f"WHERE item_id=%s AND start_date <= %s AND end_date >= %s AND {_LIVE_BOOKING}",
+            (unit_id, req.end_date, req.start_date, now),
+        )
+        if clashes:
+            for c in clashes:
+                self.index.book(
+                    c["id"], unit_id, as_date(c["start_date"]), as_date(c["end_date"]),
+                    c["expires_at"] if c["status"] == "held" else None,
+                )
+            return None
+
+        reservation = Reservation(
+            id=f"r-{os.urandom(4).hex()}",
+            sku=req.sku,
+            item_id=unit_id,
+            start_date=req.start_date,
+            end_date=req.end_date,
+            status="held",
+            expires_at=now + HOLD_TTL,
+        )
+        with transaction() as cur:
+            cur.execute(
+                "UPDATE physical_items SET version = version + 1 WHERE id=%s AND version=%s",
+                (unit_id, row["version"]),
+            )
+            if cur.rowcount != 1:
+                raise _VersionConflict(unit_id)
+            cur.execute(
+                "INSERT INTO reservations "
+                "(id, sku, item_id, start_date, end_date, status, expires_at, note) "
+                "VALUES (%s,%s,%s,%s,%s,%s,%s,%s)",
+                (
+                    reservation.id,
+                    reservation.sku,
+                    reservation.item_id,
+                    reservation.start_date,
+                    reservation.end_date,
+                    reservation.status,
+                    reservation.expires_at,
+                    req.note,
+                ),
+            )
+            enqueue(cur, [_event("ReservationHeld", reservation)])
+        self._committed()
+        self.index.book(reservation.id, unit_id, req.start_date, req.end_date,
+                        reservation.expires_at)
+        return reservation
+
+    def _expire_holds(self, sku: str) -> None:
+        """Mark lapsed holds of ``sku`` expired and give their days back."""
+        now = utcnow()
+        rows = query_all(
+            "SELECT * FROM reservations WHERE sku=%s AND status='held' AND expires_at <= %s",
+            (sku, now),
+        )
+        if not rows:
+            return
+        with transaction() as cur:
+            expired = []
+            for r in rows:
+                cur.execute(
+                    "UPDATE reservations SET status='expired' "
+                    "WHERE id=%s AND status='held' AND expires_at <= %s",
+                    (r["id"], now),
+                )
+                if cur.rowcount == 1:
+                    r["status"] = "expired"
+                    expired.append(_event("ReservationExpired", _row_to_reservation(r)))
+            enqueue(cur, expired)
+        if expired:
+            self._committed()
+        for r in rows:
+            self.index.release(r["id"])
+
+    # -- offline re-packing --------------------------------------------------
+
+    def repack(self, sku: str) -> int:
+        """
+        Re-assign every live, not yet allocated hold of ``sku`` with best fit
+        around the allocated bookings, to close the gaps that holds placed
+        one by one leave behind.  Returns the number of holds moved.
+        """
+        with self._stripe(sku), on_primary():
+            now = utcnow()
+            holds = query_all(
+                "SELECT * FROM reservations "
+                "WHERE sku=%s AND status='held' AND expires_at > %s",
+                (sku, now),
+            )
+            if not holds:
+                return 0
+            for h in holds:
+                h["start_date"], h["end_date"] = as_date(h["start_date"]), as_date(h["end_date"])
+                self.index.release(h["id"])
+
+            plan = allocator.repack(
+                dict(self.index.calendars(sku)),
+                [(h["id"], max(day_index(h["start_date"]), 0), day_index(h["end_date"])) for h in holds],
+                day_index(date.today()),
+            )
+            moves = [h for h in holds if plan and plan[h["id"]] != h["item_id"]]
+            applied = False
+            try:
+                if moves:
+                    self._apply_moves(moves, plan, [h["id"] for h in holds], now)
+                    self._committed()
+                    applied = True
+            finally:
+                for h in holds:
+                    target = plan[h["id"]] if applied else h["item_id"]
+                    self.index.book(h["id"], target, h["start_date"], h["end_date"], h["expires_at"])
+            return len(moves)
+
+    def _apply_moves(self, moves: List[Dict], plan: Dict[str, str],
+                     movable_ids: List[str], now) -> None:
+        units = sorted({h["item_id"] for h in moves} | {plan[h["id"]] for h in moves})
+        placeholders = ",".join(["%s"] * len(movable_ids))
+        with transaction() as cur:
+            # Bumping the versions locks the units and fails any concurrent
+            # hold on them that read the old version.
+            for unit_id in units:
+                cur.execute(
+                    "UPDATE physical_items SET version = version + 1 WHERE id=%s", (unit_id,)
+                )
+            for h in moves:
+                target = plan[h["id"]]
+                cur.execute(
+                    "SELECT id FROM reservations "
+                    f"WHERE item_id=%s AND start_date <= %s AND end_date >= %s AND {_LIVE_BOOKING} "
+                    f"AND id NOT IN ({placeholders}) LIMIT 1",
+                    (target, h["end_date"], h["start_date"], now, *movable_ids),
+                )
+                if cur.fetchone() is not None:
+                    raise ReservationConflict(f"unit {target} was booked concurrently")
+                cur.execute(
+                    "UPDATE reservations SET item_id=%s WHERE id=%s AND status='held'",
+                    (target, h["id"]),
+                )
+            enqueue(cur, [
+                _event("ReservationMoved", _row_to_reservation({**h, "item_id": plan[h["id"]]}))
+                for h in moves
+            ])
+
+    # -- allocate / release --------------------------------------------------
+
+    def transition(self, reservation_id: str, action: str) -> Reservation:
+        with on_primary():
+            row = query_one("SELECT sku FROM reservations WHERE id=%s", (reservation_id,))
+        if row is None:
+            raise ReservationNotFound(reservation_id)
+
+        with self._stripe(row["sku"]):
+            with transaction() as cur:
+                cur.execute("SELECT * FROM reservations WHERE id=%s FOR UPDATE", (reservation_id,))
+                current = cur.fetchone()
+                status = current["status"]
+                expires_at = current.get("expires_at")
+                if status == "held" and expires_at is not None and expires_at <= utcnow():
+                    status = "expired"
+
+                if action == "allocate":
+                    if status == "allocated":
+                        return _row_to_reservation(current)
+                    if status != "held":
+                        raise ReservationConflict(f"reservation is {status}")
+                    new_status, new_expiry = "allocated", None
+                else:
+                    if status in ("released", "expired"):
+                        new_status, new_expiry = status, expires_at
+                    else:
+                        new_status, new_expiry = "released", None
+
+                cur.execute(
+                    "UPDATE reservations SET status=%s, expires_at=%s WHERE id=%s",
+                    (new_status, new_expiry, reservation_id),
+                )
+                changed = new_status != current["status"]
+                current.update(status=new_status, expires_at=new_expiry)
+                reservation = _row_to_reservation(current)
+                if changed:
+                    enqueue(cur, [_event(f"Reservation{new_status.capitalize()}", reservation)])
+            if changed:
+                self._committed()
+
+            if new_status in ("released", "expired"):
+                self.index.release(reservation_id)
+            else:
+                # Confirmed: the booking no longer expires.
+                self.index.book(reservation_id, reservation.item_id,
+                                reservation.start_date, reservation.end_date)
+
+        return reservation
+
+
+reservation_service = ReservationService(availability_index)
@@ -0,0 +1,286 @@
+"""
+In-process inverted index for ``GET /catalog/search``.
+
+Built once at startup from a streaming scan of ``catalog_items`` and kept
+current by the catalog write paths and catalog events from other instances;
+it is never rebuilt per request.  A periodic reconciliation rebuilds it from
+a fresh scan, replaying writes that raced with the scan, so drift from a
+lost event is bounded by ``SEARCH_RECONCILE_SECONDS``.  Items are indexed over name, brand,
+category, description and ``attrs`` values with per-field weights and
+ranked with BM25.  The last query term also matches as a prefix
+("pra" -> "prada"), which is what a search-as-you-type box sends.
+"""
+from __future__ import annotations
+
+import bisect
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+SEARCH_RECONCILE_SECONDS = float(os.getenv("SEARCH_RECONCILE_SECONDS", "300"))
+
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+# Term frequency weight per field: a hit in the name counts three times a
+# hit in the description.
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "brand": 2.0,
+    "category": 1.5,
+    "attrs": 1.0,
+    "description": 1.0,
+}
+# A prefix expands to at most this many indexed terms.
+PREFIX_MAX_TERMS = 64
+MIN_PREFIX_LEN = 2
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lower-cased, accent-folded word tokens ("Sac à Main" -> sac, a, main)."""
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", text)
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return _WORD.findall(folded.lower())
+
+
+class _Doc(NamedTuple):
+    terms: Tuple[str, ...]
+    length: float
+    category: str
+    brand: str
+    price: int
+
+
+class SearchIndex:
+    def __init__(self):
+        # term -> {item id: weighted term frequency}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # Sorted vocabulary, for prefix lookups.
+        self._terms: List[str] = []
+        self._docs: Dict[str, _Doc] = {}
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+        # Writes seen while a reload scan is running, replayed onto the
+        # rebuilt index before it replaces the live one.
+        self._replay: Optional[List[Tuple[str, object]]] = None
+        self.loaded = False
+        self.reconciliations = 0
+        self.last_drift = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def load(self, rows: Iterable[Dict]) -> int:
+        """(Re)build from catalog_items rows, e.g. ``database.stream_rows``."""
+        with self._lock:
+            self._replay = []
+        try:
+            fresh = SearchIndex()
+            for row in rows:
+                fresh._upsert(row)
+        except BaseException:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            for op, arg in self._replay:
+                getattr(fresh, op)(arg)
+            self._replay = None
+            drift = sum(1 for i, d in fresh._docs.items() if self._docs.get(i) != d)
+            drift += sum(1 for i in self._docs if i not in fresh._docs)
+            self._postings = fresh._postings
+            self._terms = fresh._terms
+            self._docs = fresh._docs
+            self._total_length = fresh._total_length
+            self.last_drift = drift if self.loaded else 0
+            self.loaded = True
+            self.reconciliations += 1
+        return len(self._docs)
+
+    def start_reconciler(self, scan: Callable[[], Iterable[Dict]],
+                         interval: float = SEARCH_RECONCILE_SECONDS) -> None:
+        """Re-``load`` from ``scan()`` every ``interval`` seconds on a daemon thread."""
+        if self._thread is not None or interval <= 0:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.load(scan())
+                    if self.last_drift:
+                        logging.warning(f"Search index reconciliation corrected {self.last_drift} items")
+                except Exception as e:
+                    logging.warning(f"Search index reconciliation failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="search-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop_reconciler(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def upsert(self, row: Dict) -> None:
+        """Index (or re-index) one catalog_items row (``attrs_json`` as stored)."""
+        with self._lock:
+            self._upsert(row)
+            if self._replay is not None:
+                self._replay.append(("_upsert", row))
+
+    def remove(self, item_id: str) -> None:
+        with self._lock:
+            self._remove(item_id)
+            if self._replay is not None:
+                self._replay.append(("_remove", item_id))
+
+    def _upsert(self, row: Dict) -> None:
+        item_id = row["id"]
+        self._remove(item_id)
+
+        attrs = row.get("attrs_json")
+        if isinstance(attrs, str):
+            attrs = json.loads(attrs) if attrs else {}
+        fields = {
+            "name": row.get("name"),
+            "brand": row.get("brand"),
+            "category": row.get("category"),
+            "description": row.get("description"),
+            "attrs": " ".join(str(v) for v in (attrs or {}).values()),
+        }
+        tf: Counter = Counter()
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                tf[token] += weight
+
+        for term, freq in tf.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[item_id] = freq
+        length = sum(tf.values())
+        self._docs[item_id] = _Doc(
+            tuple(tf), length, row.get("category"), row.get("brand"), row.get("rent_price_cents") or 0
+        )
+        self._total_length += length
+
+    def _remove(self, item_id: str) -> None:
+        doc = self._docs.pop(item_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc.length
+        for term in doc.terms:
+            postings = self._postings[term]
+            del postings[item_id]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def _expand(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._terms, prefix)
+        out = []
+        for term in self._terms[start:start + PREFIX_MAX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            out.append(term)
+        return out
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        offset: int = 0,
+        prefix: bool = True,
+        accept: Optional[Callable[[_Doc], bool]] = None,
+    ) -> Tuple[int, List[Tuple[str, float]]]:
+        """
+        Items matching every query term, best BM25 score first:
+        ``(total matches, [(item id, score)] for offset..offset+limit)``.
+        ``accept`` filters candidates (price range, category, ...).
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+        with self._lock:
+            n = len(self._docs)
+            if n == 0:
+                return 0, []
+            avg_length = self._total_length / n
+
+            # Each query term becomes a group of index terms: itself, or its
+            # expansions when it is the last term and prefix matching is on.
+            groups = []
+            for i, term in enumerate(terms):
+                if prefix and i == len(terms) - 1 and len(term) >= MIN_PREFIX_LEN:
+                    group = self._expand(term)
+                else:
+                    group = [term] if term in self._postings else []
+                if not group:
+                    return 0, []
+                groups.append(group)
+
+            # Intersect starting from the rarest group.
+            def group_size(group):
+                return sum(len(self._postings[t]) for t in group)
+
+            groups.sort(key=group_size)
+            candidates = set()
+            for t in groups[0]:
+                candidates.update(self._postings[t])
+            for group in groups[1:]:
+                matched = set()
+                for t in group:
+                    matched.update(candidates.intersection(self._postings[t]))
+                candidates = matched
+                if not candidates:
+                    return 0, []
+            if accept is not None:
+                candidates = {c for c in candidates if accept(self._docs[c])}
+
+            scores = dict.fromkeys(candidates, 0.0)
+            for group in groups:
+                best: Dict[str, float] = {}
+                for t in group:
+                    postings = self._postings[t]
+                    df = len(postings)
+                    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                    for item_id in candidates.intersection(postings):
+                        tf = postings[item_id]
+                        norm = K1 * (1 - B + B * self._docs[item_id].length / avg_length)
+                        score = idf * tf * (K1 + 1) / (tf + norm)
+                        if score > best.get(item_id, 0.0):
+                            best[item_id] = score
+                for item_id, score in best.items():
+                    scores[item_id] += score
+
+        ranked = heapq.nlargest(offset + limit, scores.items(), key=lambda kv: (kv[1], kv[0]))
+        return len(scores), ranked[offset:]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "items": len(self._docs),
+                "terms": len(self._terms),
+                "postings": sum(len(p) for p in self._postings.values()),
+                "loaded": self.loaded,
+                "reconciliations": self.reconciliations,
+                "last_drift": self.last_drift,
+            }
+
+
+search_index = SearchIndex()
@@ -0,0 +1,64 @@
+# utils/ndjson.py
+from __future__ import annotations
+
+import zlib
+from typing import AsyncIterator, Iterable, Iterator, List, Tuple
+
+# Longest single NDJSON line accepted on import; a line is one catalog item.
+MAX_LINE_BYTES = 1024 * 1024
+# Most decompressed bytes produced per step of a gzip body.
+INFLATE_CHUNK_BYTES = 64 * 1024
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream into one gzip member, chunk by chunk."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def _inflate(decompressor, data: bytes) -> Iterator[bytes]:
+    """Decompress ``data`` in pieces of at most INFLATE_CHUNK_BYTES, so a
+    small compressed chunk (a gzip bomb) never expands in one go."""
+    while True:
+        out = decompressor.decompress(data, INFLATE_CHUNK_BYTES)
+        if out:
+            yield out
+        data = decompressor.unconsumed_tail
+        if not data and len(out) < INFLATE_CHUNK_BYTES:
+            return
+
+
+def _split(pending: bytes, chunk: bytes) -> Tuple[List[bytes], bytes]:
+    lines = (pending + chunk).split(b"\n")
+    pending = lines.pop()
+    for line in lines + [pending]:
+        if len(line) > MAX_LINE_BYTES:
+            raise ValueError(f"NDJSON line longer than {MAX_LINE_BYTES} bytes")
+    return lines, pending
+
+
+async def iter_lines(stream: AsyncIterator[bytes], gzipped: bool = False) -> AsyncIterator[bytes]:
+    """
+    Split a (possibly gzip-compressed) request body into lines without
+    holding more than one partial line in memory.  Decompressed output is
+    produced at most INFLATE_CHUNK_BYTES at a time, and every line is checked
+    against MAX_LINE_BYTES.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    pending = b""
+    async for chunk in stream:
+        pieces = _inflate(decompressor, chunk) if decompressor is not None else (chunk,)
+        for piece in pieces:
+            lines, pending = _split(pending, piece)
+            for line in lines:
+                yield line
+    if decompressor is not None:
+        lines, pending = _split(pending, decompressor.flush())
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
@@ -4,49 +4,156 @@ from __future__ import annotations
 import json
 import logging
 import os
-from typing import Dict, Any
+import time
+import uuid
+from concurrent import futures
+from typing import Callable, Dict, Any
 
 from google.cloud import pubsub_v1
 
+from middleware.metrics import PUBSUB_PUBLISH_FAILURES, PUBSUB_PUBLISH_SECONDS
+
 
 PROJECT_ID = os.getenv("PUBSUB_PROJECT_ID")
 TOPIC_ID = os.getenv("PUBSUB_TOPIC_ID")
+# Each instance gets its own subscription "<prefix>-<random>" on the catalog
+# topic so every instance sees every event (cache invalidation fan-out).
+SUBSCRIPTION_PREFIX = os.getenv("PUBSUB_INSTANCE_SUBSCRIPTION_PREFIX")
+# Sent as the "origin" attribute of every event we publish, so this
+# instance can skip its own writes (it has already applied them locally).
+INSTANCE_ID = uuid.uuid4().hex[:12]
 
-_publisher: pubsub_v1.PublisherClient | None = None
+_batch_publisher: pubsub_v1.PublisherClient | None = None
+_subscriber: pubsub_v1.SubscriberClient | None = None
+_subscription_path: str | None = None
+_streaming_pull = None
 
 
-def _get_publisher() -> pubsub_v1.PublisherClient:
-    global _publisher
-    if _publisher is None:
-        _publisher = pubsub_v1.PublisherClient()
-    return _publisher
+def _get_batch_publisher() -> pubsub_v1.PublisherClient:
+    global _batch_publisher
+    if _batch_publisher is None:
+        _batch_publisher = pubsub_v1.PublisherClient(
+            batch_settings=pubsub_v1.types.BatchSettings(
+                max_messages=500, max_bytes=5 * 1024 * 1024, max_latency=0.05
+            )
+        )
+    return _batch_publisher
 
 
-def publish_event(event_type: str, payload: Dict[str, Any]) -> None:
+def publish_message(message) -> futures.Future:
     """
-    {
-      "eventType": "...",
-      "payload": {...}
-    }
+    Publish one outbox message (``services.outbox.OutboxMessage``) through
+    the batching publisher and return its future.  ``eventId`` goes in the
+    body and as an attribute for consumer-side dedupe; ``version`` is the
+    outbox sequence number, which increases with every change to an item,
+    so consumers can drop stale or out-of-order events.  ``origin`` is the
+    instance that made the change.  Unconfigured Pub/Sub resolves
+    immediately.
     """
     if not PROJECT_ID or not TOPIC_ID:
-        logging.warning(
-            "PUBSUB_PROJECT_ID or PUBSUB_TOPIC_ID not set; skip publishing event."
-        )
-        return
+        skipped: futures.Future = futures.Future()
+        skipped.set_result(None)
+        return skipped
 
-    publisher = _get_publisher()
+    publisher = _get_batch_publisher()
     topic_path = publisher.topic_path(PROJECT_ID, TOPIC_ID)
+    data = json.dumps(
+        {
+            "eventId": message.event_id,
+            "eventType": message.event_type,
+            "version": message.id,
+            "payload": message.payload,
+        }
+    ).encode("utf-8")
+    future = publisher.publish(
+        topic_path,
+        data=data,
+        eventId=message.event_id,
+        version=str(message.id),
+        origin=message.origin or INSTANCE_ID,
+    )
+    _observe_publish(future, message.event_type)
+    return future
+
+
+def _observe_publish(future: futures.Future, event_type: str) -> None:
+    """Record publish latency (call to ack) and failures for /metrics."""
+    started = time.perf_counter()
+
+    def done(f: futures.Future) -> None:
+        PUBSUB_PUBLISH_SECONDS.observe(time.perf_counter() - started, (event_type,))
+        error = f.exception()
+        if error is not None:
+            PUBSUB_PUBLISH_FAILURES.inc((event_type,))
+            logging.warning(f"Pub/Sub publish of {event_type} failed: {error}")
+
+    future.add_done_callback(done)
 
-    message = {
-        "eventType": event_type,
-        "payload": payload,
-    }
-    data = json.dumps(message).encode("utf-8")
 
-    future = publisher.publish(topic_path, data=data)
-    future.add_done_callback(
-        lambda f: logging.info(
-            f"Published Pub/Sub event {event_type}, message_id={f.result()}"
+def subscribe_events(callback: Callable[[str, Dict[str, Any]], None]) -> bool:
+    """
+    Start receiving catalog events on a per-instance subscription and call
+    ``callback(event_type, payload)`` for each (on a Pub/Sub worker thread).
+    Events this instance published itself are acked without a callback; an
+    event whose callback raises is nacked, so Pub/Sub redelivers it.
+    The subscription expires by itself if the instance dies without
+    ``unsubscribe_events``.  Returns False if Pub/Sub is not configured.
+    """
+    global _subscriber, _subscription_path, _streaming_pull
+    if not PROJECT_ID or not TOPIC_ID or not SUBSCRIPTION_PREFIX:
+        logging.warning(
+            "PUBSUB_PROJECT_ID, PUBSUB_TOPIC_ID or PUBSUB_INSTANCE_SUBSCRIPTION_PREFIX "
+            "not set; not subscribing to catalog events."
         )
+        return False
+
+    _subscriber = pubsub_v1.SubscriberClient()
+    topic_path = pubsub_v1.PublisherClient.topic_path(PROJECT_ID, TOPIC_ID)
+    _subscription_path = _subscriber.subscription_path(
+        PROJECT_ID, f"{SUBSCRIPTION_PREFIX}-{uuid.uuid4().hex[:12]}"
+    )
+    _subscriber.create_subscription(
+        request={
+            "name": _subscription_path,
+            "topic": topic_path,
+            "ack_deadline_seconds": 10,
+            "message_retention_duration": {"seconds": 600},
+            "expiration_policy": {"ttl": {"seconds": 86400}},
+        }
     )
+
+    def _on_message(message) -> None:
+        if message.attributes.get("origin") == INSTANCE_ID:
+            message.ack()
+            return
+        try:
+            event = json.loads(message.data.decode("utf-8"))
+        except ValueError as e:
+            # Redelivery cannot fix an undecodable message.
+            logging.error(f"Dropping undecodable Pub/Sub event: {e}")
+            message.ack()
+            return
+        try:
+            callback(event.get("eventType", ""), event.get("payload") or {})
+        except Exception as e:
+            logging.error(f"Failed to handle Pub/Sub event, will be redelivered: {e}")
+            message.nack()
+            return
+        message.ack()
+
+    _streaming_pull = _subscriber.subscribe(_subscription_path, callback=_on_message)
+    logging.info(f"Subscribed to catalog events on {_subscription_path}")
+    return True
+
+
+def unsubscribe_events() -> None:
+    global _streaming_pull, _subscription_path
+    if _streaming_pull is not None:
+        _streaming_pull.cancel()
+        _streaming_pull = None
+    if _subscriber is not None and _subscription_path is not None:
+        try:
+            _subscriber.delete_subscription(request={"subscription": _subscription_path})
+        except Exception as e:
+            logging.warning(f"Failed to delete subscription {_subscription_path}: {e}")
+        _subscription_path = None
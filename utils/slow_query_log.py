@@ -0,0 +1,194 @@
+"""
+Slow-query log with EXPLAIN capture.
+
+``database`` / ``async_database`` hand every statement slower than
+``DB_SLOW_QUERY_MS`` to ``slow_query_log.record`` (a fraction
+``DB_SLOW_QUERY_SAMPLE_RATE`` of them).  Statements are grouped by
+normalized shape (``middleware.metrics.normalize_sql``), so each filter
+combination of ``list_catalog_items`` is one entry with its count, total
+and worst time and the parameters of its latest slow run.
+
+The first time a shape is slow it is EXPLAINed once, on a background
+thread through the sync pool, and the plan is flagged for full table
+scans, full index scans, filesorts and temporary tables.  For flagged
+SELECTs a candidate composite index is derived from the shape: equality
+columns, then the ORDER BY (or first range) columns, then id.
+GET /admin/slow-queries lists the entries, worst total first.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import random
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from middleware.metrics import normalize_sql
+
+SLOW_QUERY_SECONDS = float(os.getenv("DB_SLOW_QUERY_MS", "100")) / 1000
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("DB_SLOW_QUERY_SAMPLE_RATE", "1"))
+SLOW_QUERY_MAX_SHAPES = int(os.getenv("DB_SLOW_QUERY_MAX_SHAPES", "200"))
+
+_EXPLAINABLE = ("SELECT", "UPDATE", "DELETE")
+_EQ_COLUMN = re.compile(r"\b(\w+) = \?")
+_RANGE_COLUMN = re.compile(r"\b(\w+) (?:<|>|<=|>=) \?")
+_ORDER_BY = re.compile(r"\bORDER BY (.+?)(?: LIMIT\b| FOR UPDATE\b|$)", re.IGNORECASE)
+
+
+def plan_flags(plan: Iterable[Dict[str, Any]]) -> List[str]:
+    """
+    Problems in an EXPLAIN result: MySQL's tabular EXPLAIN (type / key /
+    Extra), or SQLite's EXPLAIN QUERY PLAN (detail) on the local stand-in.
+    """
+    flags: List[str] = []
+
+    def add(flag: str) -> None:
+        if flag not in flags:
+            flags.append(flag)
+
+    for row in plan:
+        if "detail" in row:
+            detail = str(row["detail"])
+            if detail.startswith("SCAN ") and "USING" not in detail:
+                add("full_scan")
+            elif detail.startswith("SCAN "):
+                add("full_index_scan")
+            if "TEMP B-TREE" in detail:
+                add("filesort")
+            continue
+        access = row.get("type")
+        extra = str(row.get("Extra") or "")
+        if access == "ALL":
+            add("full_scan")
+        elif access == "index":
+            add("full_index_scan")
+        if "Using filesort" in extra:
+            add("filesort")
+        if "Using temporary" in extra:
+            add("temporary")
+    return flags
+
+
+def candidate_index(shape: str) -> Optional[List[str]]:
+    """(equality columns, ORDER BY or first range column, id) of a SELECT shape."""
+    if not shape.upper().startswith("SELECT") or " WHERE " not in shape.upper():
+        return None
+    where = re.split(r"\bORDER BY\b|\bLIMIT\b", shape.split(" WHERE ", 1)[1], flags=re.IGNORECASE)[0]
+    columns = [c for c in _EQ_COLUMN.findall(where) if c != "id"]
+    order = _ORDER_BY.search(shape)
+    if order:
+        columns += [c.split()[0] for c in order.group(1).split(",")]
+    else:
+        columns += _RANGE_COLUMN.findall(where)[:1]
+    columns = list(dict.fromkeys(c for c in columns if c != "id"))
+    return columns + ["id"] if columns else None
+
+
+def _short(params) -> Any:
+    """Parameters as logged: long IN lists cut, values truncated."""
+    if params is None:
+        return None
+    values = list(params)
+    out = [v if isinstance(v, (int, float)) or v is None else str(v)[:200] for v in values[:20]]
+    if len(values) > 20:
+        out.append(f"... {len(values) - 20} more")
+    return out
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold: float = SLOW_QUERY_SECONDS,
+        sample_rate: float = SLOW_QUERY_SAMPLE_RATE,
+        max_shapes: int = SLOW_QUERY_MAX_SHAPES,
+    ):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.max_shapes = max_shapes
+        # (sql, params) -> EXPLAIN rows; set by ``database`` on import.
+        self.explain: Optional[Callable[[str, Any], List[Dict[str, Any]]]] = None
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=100)
+        self._worker: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def record(self, sql: str, params, seconds: float) -> None:
+        """Called by the database layers for statements over ``threshold``."""
+        if sql.lstrip()[:7].upper() == "EXPLAIN":
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        shape = normalize_sql(sql)
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self._lock:
+            entry = self._entries.get(shape)
+            if entry is None:
+                if len(self._entries) >= self.max_shapes:
+                    self.dropped += 1
+                    return
+                entry = self._entries[shape] = {
+                    "shape": shape,
+                    "count": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "first_seen": now,
+                    "plan": None,
+                    "flags": [],
+                    "candidate_index": None,
+                    "explain": "pending",
+                }
+                self._enqueue(shape, sql, params)
+            entry["count"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["last_seconds"] = seconds
+            entry["last_seen"] = now
+            entry["last_params"] = _short(params)
+
+    def _enqueue(self, shape: str, sql: str, params) -> None:
+        if self.explain is None or not shape.upper().startswith(_EXPLAINABLE):
+            self._entries[shape]["explain"] = "skipped"
+            return
+        try:
+            self._queue.put_nowait((shape, sql, list(params) if params is not None else None))
+        except queue.Full:
+            self._entries[shape]["explain"] = "skipped"
+            return
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._explain_loop, name="slow-query-explain", daemon=True)
+            self._worker.start()
+
+    def _explain_loop(self) -> None:
+        while True:
+            shape, sql, params = self._queue.get()
+            try:
+                plan = [dict(r) for r in self.explain(sql, params)]
+                flags = plan_flags(plan)
+                status = "done"
+            except Exception as e:
+                logging.warning(f"EXPLAIN of slow query failed: {e}")
+                plan, flags, status = None, [], f"failed: {e}"[:200]
+            with self._lock:
+                entry = self._entries.get(shape)
+                if entry is not None:
+                    entry.update(plan=plan, flags=flags, explain=status,
+                                 candidate_index=candidate_index(shape) if flags else None)
+            if flags:
+                logging.warning(f"Slow query {flags}: {shape}")
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            out = [dict(e) for e in self._entries.values()]
+        return sorted(out, key=lambda e: e["total_seconds"], reverse=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.dropped = 0
+
+
+slow_query_log = SlowQueryLog()